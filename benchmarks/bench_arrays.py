@@ -0,0 +1,46 @@
+'''
+Numeric columns as RVectors of boxed numbers vs #f64 typed vectors.
+
+    python benchmarks/bench_arrays.py
+'''
+import sys
+import timeit
+
+from ripl.bases import Symbol
+from ripl.evaluators import Evaluator
+
+
+# label, RVector version, typed vector version
+CASES = [
+    ('elementwise +', '(drain (map + xs xs))', '(+ xs xs)'),
+    ('scale', '(drain (map (lambda (x) (* 2.5 x)) xs))', '(* 2.5 xs)'),
+    ('foldl +', '(foldl + 0 xs)', '(foldl + 0 xs)'),
+    ('product of take', '(product (take 10 xs))', '(product (take 10 xs))'),
+    ('map / vmap', '(drain (map (lambda (x) (if (> x 3) (* x x) 1)) xs))',
+     '(vmap (lambda (x) (if (> x 3) (* x x) 1)) xs)'),
+    ]
+
+
+def main(size=100000, number=5):
+    evaluator = Evaluator()
+    reader = evaluator.reader
+    scope = evaluator.global_scope
+
+    def run(string):
+        exp = next(reader.parse(reader.lex(string)))
+        return lambda: evaluator.eval(exp, scope)
+
+    values = ' '.join(str(float(n % 7 + 1)) for n in range(size))
+    columns = ['[{}]'.format(values), '#f64[{}]'.format(values)]
+    print('{:<20}{:>14}{:>14}'.format('', 'RVector (ms)', '#f64 (ms)'))
+    for label, *strings in CASES:
+        timings = []
+        for literal, string in zip(columns, strings):
+            scope[Symbol('xs')] = run(literal)()
+            best = min(timeit.repeat(run(string), repeat=3, number=number))
+            timings.append(best / number * 1e3)
+        print('{:<20}{:>14.3f}{:>14.3f}'.format(label, *timings))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
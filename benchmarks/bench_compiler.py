@@ -0,0 +1,40 @@
+'''
+Cost of calling a ripl Func from Python before and after promotion.
+
+    python benchmarks/bench_compiler.py
+'''
+import sys
+import timeit
+
+from ripl.evaluators import Evaluator
+
+
+DEFINITION = '(defn sq-inc (x) (+ (* x x) 1))'
+
+
+def make_func(hot_threshold):
+    evaluator = Evaluator(hot_threshold=hot_threshold)
+    for string in (DEFINITION, 'sq-inc'):
+        exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+        func = evaluator.eval(exp, evaluator.global_scope)
+    return func
+
+
+def main(number=20000):
+    def native(x):
+        return x * x + 1
+
+    cases = [('interpreted', make_func(None)),
+             ('promoted', make_func(1)),
+             ('python function', native)]
+    for label, func in cases:
+        func(1)
+        best = min(timeit.repeat(
+            lambda: list(map(func, range(100))), repeat=5,
+            number=number // 100))
+        print('{:<18}{:>10.3f}us per call'.format(
+            label, best / number * 1e6))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
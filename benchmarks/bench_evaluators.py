@@ -0,0 +1,63 @@
+'''
+Compare the recursive and explicit-stack (stackless) evaluators.
+
+    python benchmarks/bench_evaluators.py
+
+Each benchmark is run against a fresh evaluator of each kind and the best
+of several repeats is reported.
+'''
+import sys
+import timeit
+
+from ripl.evaluators import Evaluator
+
+
+SETUP = [
+    '(defn fib (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))',
+    '(defn count-down (n) (if (== n 0) 0 (count-down (- n 1))))',
+    '(defn even? (n) (if (== n 0) True (odd? (- n 1))))',
+    '(defn odd? (n) (if (== n 0) False (even? (- n 1))))',
+    '(defn sum-to (n) (if (== n 0) 0 (+ n (sum-to (- n 1)))))',
+    ]
+
+BENCHMARKS = [
+    ('fib 15', '(fib 15)'),
+    ('tail loop 5000', '(count-down 5000)'),
+    ('mutual tail calls 5000', '(even? 5000)'),
+    ('non-tail recursion 200', '(sum-to 200)'),
+    ('arithmetic', '(* (+ 2 (% 9 3) 5) (max 7 1 10))'),
+    ('literal heavy', '(+ (* 2 3) (- 10 4) (max 1 2 3 4 5 6 7 8 9) '
+                      '(+ 1 2 3 4 5 6 7 8 9 10) (min 9 8 7 6 5 4 3 2 1))'),
+    ]
+
+
+def make_runner(evaluator, string):
+    '''Parse once up front so that we only time evaluation'''
+    exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+    return lambda: evaluator.eval(exp, evaluator.global_scope)
+
+
+def main(repeat=5, number=3):
+    evaluators = [('recursive', Evaluator()),
+                  ('stackless', Evaluator(stackless=True))]
+    for _, evaluator in evaluators:
+        for definition in SETUP:
+            make_runner(evaluator, definition)()
+
+    print('{:<26}'.format('benchmark') +
+          ''.join('{:>12}'.format(name) for name, _ in evaluators))
+    for label, string in BENCHMARKS:
+        timings = []
+        for _, evaluator in evaluators:
+            runner = make_runner(evaluator, string)
+            best = min(timeit.repeat(runner, repeat=repeat, number=number))
+            timings.append(best / number * 1000)
+        print('{:<26}'.format(label) +
+              ''.join('{:>10.2f}ms'.format(t) for t in timings))
+
+    best = min(timeit.repeat(Evaluator, repeat=repeat, number=1000))
+    print('{:<26}{:>10.2f}us'.format('new evaluator', best / 1000 * 1e6))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
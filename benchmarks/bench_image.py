@@ -0,0 +1,45 @@
+'''
+Time to get a warm evaluator: reading and evaluating the source of a few
+hundred definitions vs loading them from an image.
+
+    python benchmarks/bench_image.py
+'''
+import os
+import sys
+import timeit
+import tempfile
+
+from ripl.evaluators import Evaluator
+from ripl.image import save_image, load_image
+
+
+def source(n):
+    return '\n'.join(
+        '(define k{0} {0})\n'
+        '(defn f{0} (xs) (sum (map (lambda (x) (+ (* x k{0}) 1)) xs)))'
+        .format(i) for i in range(n))
+
+
+def from_source(string):
+    evaluator = Evaluator()
+    reader = evaluator.reader
+    for exp in reader.parse(reader.lex(string)):
+        evaluator.eval(exp, evaluator.global_scope)
+    return evaluator
+
+
+def main(n=200):
+    string = source(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.img')
+        save_image(from_source(string), path)
+        print('{} definitions, image is {} bytes'.format(
+            2 * n, os.path.getsize(path)))
+        for label, func in [('source', lambda: from_source(string)),
+                            ('image', lambda: load_image(path))]:
+            best = min(timeit.repeat(func, repeat=5, number=1))
+            print('{:<10}{:>10.2f}ms'.format(label, best * 1e3))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
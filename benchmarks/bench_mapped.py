@@ -0,0 +1,53 @@
+'''
+Scanning a log file for matching lines: open() iteration vs mmap-lines.
+
+    python benchmarks/bench_mapped.py
+'''
+import os
+import sys
+import time
+import tempfile
+
+from ripl.mapped import mmap_lines
+
+
+def write_log(path, lines):
+    with open(path, 'w') as f:
+        for n in range(lines):
+            level = 'ERROR' if n % 1000 == 0 else 'INFO'
+            f.write('2017-01-01 12:00:{:02d} {} request {} handled\n'.format(
+                n % 60, level, n))
+
+
+def scan_open(path):
+    with open(path) as f:
+        return sum(1 for line in f if 'ERROR' in line)
+
+
+def scan_mmap(path):
+    return sum(1 for line in mmap_lines(path) if 'ERROR' in line)
+
+
+def scan_mmap_matching(path):
+    return sum(1 for line in mmap_lines(path, matching='ERROR'))
+
+
+def main(lines=1000000):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.log')
+    write_log(path, lines)
+    size = os.path.getsize(path) / 2**20
+    print('{} lines, {:.0f}MB'.format(lines, size))
+    cases = [('open()', scan_open),
+             ('mmap-lines', scan_mmap),
+             ('matching', scan_mmap_matching)]
+    for label, func in cases:
+        start = time.perf_counter()
+        found = func(path)
+        elapsed = time.perf_counter() - start
+        print('{:<14}{:>8.3f}s {:>8.0f}MB/s  ({} matches)'.format(
+            label, elapsed, size / elapsed, found))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
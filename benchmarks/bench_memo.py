@@ -0,0 +1,44 @@
+'''
+Naive recursive fib with and without defn/memo, and the overhead of a
+cache hit vs calling a cheap Func.
+
+    python benchmarks/bench_memo.py
+'''
+import sys
+import timeit
+
+from ripl.evaluators import Evaluator
+
+
+def define(source, name):
+    evaluator = Evaluator()
+    for string in (source, name):
+        exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+        func = evaluator.eval(exp, evaluator.global_scope)
+    return func
+
+
+def fib(defn):
+    return ('({} fib (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))'
+            .format(defn))
+
+
+def main(n=20):
+    plain, memo = define(fib('defn'), 'fib'), define(fib('defn/memo'), 'fib')
+    for label, func in [('defn', plain), ('defn/memo', memo)]:
+        # A fresh cache each time round
+        setup = getattr(func, 'clear', lambda: None)
+        best = min(timeit.repeat(lambda: (setup(), func(n)),
+                                 repeat=3, number=1))
+        print('{:<12}fib {} {:>10.4f}s'.format(label, n, best))
+
+    sq = define('(defn sq (x) (* x x))', 'sq')
+    cached = define('(defn/memo sq (x) (* x x))', 'sq')
+    cached(3)
+    for label, func in [('call', sq), ('cache hit', cached)]:
+        best = min(timeit.repeat(lambda: func(3), repeat=5, number=10000))
+        print('{:<12}{:>10.3f}us per call'.format(label, best / 10000 * 1e6))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+'''
+Method calls and attributes on Python objects: `(.upper s)` and `c.real`
+against going through the `getattr` builtin.
+
+    python benchmarks/bench_methods.py
+
+Each loop is a tail recursive Func run by the evaluator (so nothing gets
+compiled) against both kinds of evaluator. There was no way to call the
+bound method that `getattr` gives back in place so the baseline uses a
+`call` helper from Python.
+'''
+import sys
+import timeit
+
+from ripl.bases import Symbol
+from ripl.evaluators import Evaluator
+
+
+SETUP = [
+    '(define s "some words")',
+    '(define c (complex "3+4j"))',
+    '(defn upper-getattr (n x) '
+    '  (if (== n 0) x (upper-getattr (- n 1) (call (getattr s "upper")))))',
+    '(defn upper-method (n x) '
+    '  (if (== n 0) x (upper-method (- n 1) (.upper s))))',
+    '(defn real-getattr (n x) '
+    '  (if (== n 0) x (real-getattr (- n 1) (getattr c "real"))))',
+    '(defn real-attr (n x) '
+    '  (if (== n 0) x (real-attr (- n 1) c.real)))',
+    ]
+
+BENCHMARKS = [
+    ('s.upper() getattr', '(upper-getattr 5000 0)'),
+    ('s.upper() .upper', '(upper-method 5000 0)'),
+    ('c.real getattr', '(real-getattr 5000 0)'),
+    ('c.real attribute', '(real-attr 5000 0)'),
+    ]
+
+
+def make_runner(evaluator, string):
+    '''Parse once up front so that we only time evaluation'''
+    exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+    return lambda: evaluator.eval(exp, evaluator.global_scope)
+
+
+def main(repeat=5, number=3):
+    evaluators = [('recursive', Evaluator()),
+                  ('stackless', Evaluator(stackless=True))]
+    for _, evaluator in evaluators:
+        evaluator.global_scope[Symbol('call')] = lambda func: func()
+        for definition in SETUP:
+            make_runner(evaluator, definition)()
+
+    print('{:<26}'.format('benchmark') +
+          ''.join('{:>12}'.format(name) for name, _ in evaluators))
+    for label, string in BENCHMARKS:
+        timings = []
+        for _, evaluator in evaluators:
+            runner = make_runner(evaluator, string)
+            best = min(timeit.repeat(runner, repeat=repeat, number=number))
+            timings.append(best / number * 1000)
+        print('{:<26}'.format(label) +
+              ''.join('{:>10.2f}ms'.format(t) for t in timings))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
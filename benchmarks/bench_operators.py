@@ -0,0 +1,54 @@
+'''
+The variadic operators in ripl.operators against the old
+`reduce(op.add, ...)` / binary `operator` implementations.
+
+    python benchmarks/bench_operators.py
+'''
+import sys
+import timeit
+import functools
+import operator as op
+
+from ripl import operators
+from ripl.bases import RVector
+
+
+def old_add(*args):
+    return functools.reduce(op.add, args)
+
+
+def old_lt(*args):
+    return all(op.lt(a, b) for a, b in zip(args, args[1:]))
+
+
+def main(number=2000):
+    ints = tuple(range(1000))
+    floats = tuple(x / 7 for x in range(1000))
+    strings = tuple('x' * 10 for _ in range(1000))
+    lists = tuple([x] for x in range(1000))
+    vectors = tuple(RVector([x]) for x in range(1000))
+
+    cases = [
+        ('+ 2 ints', old_add, operators.add, (1, 2)),
+        ('+ 2 strings', old_add, operators.add, ('ab', 'cd')),
+        ('< 2 ints', op.lt, operators.lt, (1, 2)),
+        ('+ 1000 ints', old_add, operators.add, ints),
+        ('+ 1000 floats', old_add, operators.add, floats),
+        ('+ 1000 strings', old_add, operators.add, strings),
+        ('+ 1000 lists', old_add, operators.add, lists),
+        ('+ 1000 vectors', old_add, operators.add, vectors),
+        ('< 1000 ints', old_lt, operators.lt, ints),
+        ]
+
+    print('{:<18}{:>14}{:>14}'.format('', 'before (us)', 'after (us)'))
+    for label, before, after, args in cases:
+        timings = []
+        for func in (before, after):
+            best = min(timeit.repeat(
+                lambda: func(*args), repeat=5, number=number))
+            timings.append(best / number * 1e6)
+        print('{:<18}{:>14.3f}{:>14.3f}'.format(label, *timings))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+'''
+External sort / group / join: time and peak traced memory with a budget
+well below the size of the data vs everything in memory.
+
+    python benchmarks/bench_relational.py
+'''
+import sys
+import time
+import random
+import tracemalloc
+from collections import deque
+
+from ripl.relational import sort_by, group_by, join
+
+
+def rows(num, keys, seed):
+    rng = random.Random(seed)
+    return ((rng.randrange(keys), n, 'payload {}'.format(n))
+            for n in range(num))
+
+
+def first(row):
+    return row[0]
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(num=300000, budget=8 * 2**20):
+    cases = [
+        ('sort-by', lambda b: deque(
+            sort_by(first, rows(num, num, 1), budget=b), maxlen=0)),
+        ('group-by', lambda b: deque(
+            group_by(first, rows(num, 1000, 2), budget=b), maxlen=0)),
+        ('join', lambda b: deque(
+            join(rows(num, num, 3), rows(num, num, 4), first, budget=b),
+            maxlen=0)),
+        ]
+    print('{} rows, {}MB budget'.format(num, budget // 2**20))
+    print('{:<10}{:>14}{:>14}{:>14}{:>14}'.format(
+        '', 'memory (s)', 'peak (MB)', 'budget (s)', 'peak (MB)'))
+    for label, func in cases:
+        results = []
+        for b in (2**40, budget):
+            elapsed, peak = measure(lambda: func(b))
+            results += [elapsed, peak / 2**20]
+        print('{:<10}{:>14.2f}{:>14.1f}{:>14.2f}{:>14.1f}'.format(
+            label, *results))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
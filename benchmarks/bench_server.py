@@ -0,0 +1,54 @@
+'''
+Round trip time for a small expression sent to `ripl serve` vs evaluating
+it in process and starting a new interpreter with `ripl -s`.
+
+    python benchmarks/bench_server.py
+'''
+import os
+import sys
+import time
+import timeit
+import tempfile
+import subprocess
+
+from ripl.client import Client
+from ripl.server import Session
+
+CODE = '(+ 1 2)'
+
+
+def main(number=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        address = os.path.join(tmp, 'bench.sock')
+        # The server runs in its own process as it would for real
+        server = subprocess.Popen([
+            sys.executable, '-c',
+            'import ripl.cli; ripl.cli.main(["serve", "--socket", "{}"])'
+            .format(address)], stderr=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(address):
+                time.sleep(0.01)
+            with Client(address) as client:
+                best = min(timeit.repeat(lambda: client.eval(CODE),
+                                         repeat=5, number=number))
+                print('{:<16}{:>10.1f}us per request'.format(
+                    'ripl serve', best / number * 1e6))
+            session = Session()
+            best = min(timeit.repeat(
+                lambda: session.run(CODE, lambda result: None),
+                repeat=5, number=number))
+            print('{:<16}{:>10.1f}us per request'.format(
+                'in process', best / number * 1e6))
+        finally:
+            server.terminate()
+            server.wait()
+
+    cmd = [sys.executable, '-c',
+           'import ripl.cli; ripl.cli.main("-s {}")'.format(CODE)]
+    best = min(timeit.repeat(lambda: subprocess.run(
+        cmd, stdout=subprocess.DEVNULL), repeat=3, number=3)) / 3
+    print('{:<16}{:>10.1f}ms per run'.format('ripl -s', best * 1e3))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
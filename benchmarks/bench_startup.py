@@ -0,0 +1,37 @@
+'''
+Start up cost of ripl: wall clock time for a whole python process in
+script mode (`ripl -s`, including evaluating the script) and for importing
+the interactive REPL, against a bare interpreter.
+
+    python benchmarks/bench_startup.py
+'''
+import os
+import sys
+import time
+import subprocess
+
+
+def run_time(code):
+    ''' :: str -> float
+    Seconds taken by `python -c code`, start to exit
+    '''
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-c', code], check=True,
+        stdout=subprocess.DEVNULL, env=dict(os.environ))
+    return time.perf_counter() - start
+
+
+def main(repeat=5):
+    cases = [
+        ('python', 'pass'),
+        ('ripl -s', 'import ripl.cli; ripl.cli.main(["-s", "(+ 1 2)"])'),
+        ('repl', 'import ripl.repl'),
+        ]
+    for label, code in cases:
+        best = min(run_time(code) for _ in range(repeat))
+        print('{:<10}{:>10.1f}ms'.format(label, best * 1000))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+'''
+Loading a CSV as a Table vs a list of row dicts: time and peak memory.
+
+    python benchmarks/bench_table.py
+'''
+import os
+import csv
+import sys
+import time
+import tempfile
+import tracemalloc
+
+from ripl.table import read_csv
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'price', 'qty', 'name'])
+        for n in range(rows):
+            writer.writerow([n, n * 0.25, n % 17, 'item{}'.format(n % 100)])
+
+
+def row_dicts(path):
+    with open(path, newline='') as f:
+        return [{k: float(v) if k == 'price' else
+                 (int(v) if k != 'name' else v) for k, v in row.items()}
+                for row in csv.DictReader(f)]
+
+
+def measure(func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(path)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current, peak
+
+
+def main(rows=200000):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.csv')
+    write_csv(path, rows)
+    print('{} rows'.format(rows))
+    print('{:<12}{:>10}{:>14}{:>14}'.format('', 'load (s)', 'held (MB)',
+                                            'peak (MB)'))
+    for label, func in [('row dicts', row_dicts), ('Table', read_csv)]:
+        elapsed, current, peak = measure(func, path)
+        print('{:<12}{:>10.3f}{:>14.1f}{:>14.1f}'.format(
+            label, elapsed, current / 2**20, peak / 2**20))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
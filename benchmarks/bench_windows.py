@@ -0,0 +1,61 @@
+'''
+Sliding window aggregates: incremental updates vs re-scanning the window
+for every event.
+
+    python benchmarks/bench_windows.py
+'''
+import sys
+import time
+import random
+from collections import deque
+
+from ripl.windows import sliding_window, Sum, Mean, Max
+
+
+def events(num, seed=1):
+    rng = random.Random(seed)
+    return [(n, rng.random()) for n in range(num)]
+
+
+def ts(event):
+    return event[0]
+
+
+def val(event):
+    return event[1]
+
+
+def rescan(size, reducer, events):
+    '''The naive version: keep the window and reduce all of it each time'''
+    window = deque()
+    for event in events:
+        window.append(event)
+        while window[0][0] <= event[0] - size:
+            window.popleft()
+        yield event[0] - size, event[0], reducer([val(e) for e in window])
+
+
+def timed(func):
+    start = time.perf_counter()
+    deque(func(), maxlen=0)
+    return time.perf_counter() - start
+
+
+def main(num=100000, size=1000):
+    data = events(num)
+    cases = [
+        ('sum', Sum(val), sum),
+        ('mean', Mean(val), lambda xs: sum(xs) / len(xs)),
+        ('max', Max(val), max),
+        ]
+    print('{} events, window of {}'.format(num, size))
+    print('{:<8}{:>14}{:>14}'.format('', 'rescan (s)', 'windows (s)'))
+    for label, agg, reducer in cases:
+        print('{:<8}{:>14.2f}{:>14.2f}'.format(
+            label,
+            timed(lambda: rescan(size, reducer, data)),
+            timed(lambda: sliding_window(size, ts, agg, data))))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+'''
+Typed numeric vectors backed by NumPy.
+
+    #f64[1.0 2.5 3]  -->  numpy.array([1.0, 2.5, 3.0], dtype='float64')
+    #i64[1 2 3]      -->  numpy.array([1, 2, 3], dtype='int64')
+
+NumPy is optional: without it everything else in ripl works as normal but
+typed vector literals are a SyntaxError. Arrays are ordinary values once
+read so the std_ops operators work on them element-wise, and the prelude
+folds use the matching ufunc rather than looping in Python.
+
+NumPy is also slow to import, so it is only loaded when something first
+needs it (see `numpy`): a typed vector literal, vmap, a table...
+'''
+import sys
+import operator as op
+
+from . import operators
+
+_UNLOADED = object()
+_np = _UNLOADED
+_FOLDS = None
+
+
+# Literal prefix -> numpy dtype
+DTYPES = {
+    'f64': 'float64',
+    'f32': 'float32',
+    'i64': 'int64',
+    'i32': 'int32',
+    }
+_PREFIXES = {v: k for k, v in DTYPES.items()}
+
+
+def numpy():
+    ''' :: -> module | None
+    The numpy module, imported on first use (None if it isn't installed).
+    '''
+    global _np
+    if _np is _UNLOADED:
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        _np = np
+    return _np
+
+
+def is_array(obj):
+    ''' :: Any -> bool'''
+    # Nothing can be an ndarray until numpy has been imported (by us or by
+    # user code), so this never loads it
+    np = sys.modules.get('numpy')
+    return np is not None and isinstance(obj, np.ndarray)
+
+
+def typed_vector(prefix, items):
+    ''' :: str, List[Number] -> ndarray
+    Build the array for a typed vector literal.
+    '''
+    np = numpy()
+    if np is None:
+        raise SyntaxError(
+            'typed vector literals (#{}[...]) need numpy'.format(prefix))
+    for item in items:
+        if isinstance(item, bool) or not isinstance(item, (int, float)):
+            raise SyntaxError(
+                'typed vector literals can only hold numbers: {}'.format(item))
+    return np.array(items, dtype=DTYPES[prefix])
+
+
+def to_lisp_str(arr):
+    ''' :: ndarray -> str
+    Show a 1d array of one of our dtypes as its literal.
+    '''
+    prefix = _PREFIXES.get(arr.dtype.name)
+    if prefix is None or arr.ndim != 1:
+        return str(arr)
+    return '#{}[{}]'.format(prefix, ' '.join(str(x) for x in arr.tolist()))
+
+
+def fold_ufunc(func):
+    ''' :: f(a, a) -> a -> (ufunc, f(a, a) -> a) | None
+    For a binary function that folds the same way as a ufunc, return the
+    ufunc to reduce an array with and the function to combine the result
+    with the accumulator: foldl(-, acc, arr) == acc - add.reduce(arr).
+    '''
+    global _FOLDS
+    if _FOLDS is None:
+        # Only asked for once there is an array to fold
+        np = numpy()
+        if np is None:
+            return None
+        _FOLDS = {
+            operators.add: (np.add, operators.add),
+            op.add: (np.add, op.add),
+            operators.sub: (np.add, operators.sub),
+            op.sub: (np.add, op.sub),
+            operators.mul: (np.multiply, operators.mul),
+            op.mul: (np.multiply, op.mul),
+            operators.truediv: (np.multiply, operators.truediv),
+            op.truediv: (np.multiply, op.truediv),
+            max: (np.maximum, np.maximum),
+            min: (np.minimum, np.minimum),
+            }
+    try:
+        return _FOLDS.get(func)
+    except TypeError:
+        # Unhashable callable
+        return None
@@ -3,9 +3,10 @@ Classes that take unicode string input and run the
 conversion from sexp -> python usable code.
 '''
 import re
-from itertools import chain
 
 from .bases import Symbol, Keyword, EmptyList, RList, RDict, RVector, RString
+from .nodes import analyse
+from .arrays import typed_vector
 
 
 class Tag:
@@ -44,6 +45,7 @@ RIPL_TAGS = [
         # Tag(r'\(,.+\)',                             'TUPLE'),
         Tag(r'(\(\)|\s*None)',                      'NULL'),
         # () {} []
+        Tag(r'#(f64|f32|i64|i32)\[',                'TYPED_VECTOR'),
         Tag(r'\(',                                  'PAREN_OPEN'),
         Tag(r'\)',                                  'PAREN_CLOSE'),
         Tag(r'\[',                                  'BRACKET_OPEN'),
@@ -62,6 +64,9 @@ RIPL_TAGS = [
         Tag(r',',                                   'COMMA'),
         Tag(r'~@',                                  'UNQUOTE_SPLICE'),
         Tag(r'~',                                   'UNQUOTE'),
+        # .method at the head of a call
+        Tag(r'\.[^()[\]{}\s\#,\.\d][^()[\]{}\s\#,\.]*(?=[\)\]}\s])?',
+            'METHOD'),
         Tag(r'\.',                                  'DOT'),
         Tag(r'\n',                                  'NEWLINE'),
         Tag(r'\s+',                                 'WHITESPACE'),
@@ -69,7 +74,9 @@ RIPL_TAGS = [
         Tag(r'"""([^"]*)"""',                       'DOCSTRING'),
         Tag(r'"([^"]*)"',                           'STRING'),
         Tag(r':[^()[\]{}\s\#,\.]+(?=[\)\]}\s])?',   'KEYWORD'),
-        Tag(r'[^()[\]{}\s\#,\.]+(?=[\)\]}\s])?',    'SYMBOL'),
+        # Dotted symbols (np.mean) are looked up attribute by attribute
+        Tag(r'[^()[\]{}\s\#,\.]+(?:\.[^()[\]{}\s\#,\.]+)*(?=[\)\]}\s])?',
+            'SYMBOL'),
         Tag(r'.',                                   'SYNTAX_ERROR'),
         ]
 
@@ -84,7 +91,7 @@ def make_atom(token):
     NOTE: This means that RIPL considers any custom classes a Symbol
           --> It would be nice to havea  type system here...
     '''
-    if token.tag == 'SYMBOL':
+    if token.tag == 'SYMBOL' or token.tag == 'METHOD':
         return Symbol(token.val)
     elif token.tag == 'KEYWORD':
         return Keyword(token.val)
@@ -152,22 +159,23 @@ class Reader:
             if lex_tag == 'SYNTAX_ERROR':
                 # There was something that we didn't recognise
                 raise SyntaxError('Unable to parse: {}'.format(source_txt))
-            elif lex_tag is 'NEWLINE':
-                line_start = match.end()
-                line_num += 1
-            elif lex_tag in 'COMMENT COMMENT_SEXP WHITESPACE'.split():
-                pass
+            elif lex_tag in 'NEWLINE COMMENT COMMENT_SEXP WHITESPACE'.split():
+                # Dropped, but keep track of lines for the token positions
+                newlines = source_txt.count('\n')
+                if newlines:
+                    line_num += newlines
+                    line_start = match.start() + source_txt.rindex('\n') + 1
             elif lex_tag.startswith('QUOTED'):
-                sub = '(quote ' + source_txt[1:] + ')'
-                for token in self.lex(sub):
+                for token in self._relex('(quote ', source_txt, match.start(),
+                                         line_num, line_start):
                     yield token
             elif lex_tag == 'QUASI_QUOTED':
-                sub = '(quasiquote ' + source_txt[1:] + ')'
-                for token in self.lex(sub):
+                for token in self._relex('(quasiquote ', source_txt,
+                                         match.start(), line_num, line_start):
                     yield token
             elif lex_tag == 'CURRIED_SEXP':
-                sub = '(curry ' + source_txt[1:] + ')'
-                for token in self.lex(sub):
+                for token in self._relex('(curry ', source_txt, match.start(),
+                                         line_num, line_start):
                     yield token
             else:
                 # NOTE: We have something that we can convert to a value
@@ -187,16 +195,48 @@ class Reader:
                 column = match.start() - line_start
                 yield Token(lex_tag, val, line_num, column)
 
+    def _relex(self, prefix, source_txt, start, line_num, line_start):
+        ''' :: str, str, int, int, int -> gen(Token)
+        Lex a reader-macro expansion such as 'x -> (quote x), shifting
+        the token positions back to where they were in the original input.
+        '''
+        col = start - line_start
+        for token in self.lex(prefix + source_txt[1:] + ')'):
+            if token.line == 1:
+                # Expanded tokens point at the macro character
+                token.col = max(col, col + token.col - len(prefix) + 1)
+            token.line += line_num - 1
+            yield token
+
     def parse(self, tokens):
-        ''' :: gen(Token) -> List[Symbol|String|int|float]
+        ''' :: gen(Token) -> gen(Node)
+        ```````````````````````````````````````````````````````````````````````
+        Read each top level form from a stream of tokens and analyse it into
+        a syntax tree for evaluation (see ripl.nodes). Nodes carry the line
+        and column of the token that started them.
+        '''
+        for form, span in self.read_spans(tokens):
+            yield analyse(form, span)
+
+    def read(self, tokens):
+        ''' :: gen(Token) -> gen(List[Symbol|String|int|float])
         ```````````````````````````````````````````````````````````````````````
-        Converts a stream of tokens into a nested list of lists for evaluation.
+        Converts a stream of tokens into a nested list of lists: plain LISP
+        data with no analysis.
         Tokens are a simple class with tag, val, line and col properties.
             Numerics are given the appropriate value in the Lexer.
             All other tags have a string as their value.
 
         LISPy (func arg1 arg2) lists become Pythonic ['func', 'arg1', 'arg2']
         '''
+        for form, _ in self.read_spans(tokens):
+            yield form
+
+    def read_spans(self, tokens):
+        ''' :: gen(Token) -> gen((datum, Span))
+        As `read` but also yield the position information for each form:
+            Span = (line, col, [Span for each element] or None)
+        '''
         if not tokens:
             # Can't run an empty program!
             raise SyntaxError('unexpected EOF while reading input')
@@ -206,77 +246,85 @@ class Reader:
         ################################################
         # Something like:
         # token, tokens = self.apply_macros(token, tokens)
+        tokens = iter(tokens)
         for token in tokens:
-            if token.tag == 'PAREN_OPEN':
-                # Start of an s-expression, drop the intial paren
-                token = next(tokens)
-                sexp = []
-                if token.tag == 'PAREN_CLOSE':
-                    # Special case of the empty list
-                    yield []  # EmptyList()
-                else:
-                    # Read until the end of the current s-exp
-                    while token.tag != 'PAREN_CLOSE':
-                        tokens = chain([token], tokens)
-                        sexp.append(next(self.parse(tokens)))
-                        token = next(tokens)
-                    yield RList(sexp)
-            elif token.tag == 'BRACKET_OPEN':
-                # start of a vector literal, drop the initial bracket
-                list_literal, tokens = self._parse_vector(tokens)
-                yield list_literal
-            elif token.tag == 'BRACE_OPEN':
-                # start of a dict literal, drop the initial brace
-                dict_literal, tokens = self._parse_dict(tokens)
-                yield dict_literal
-
-            elif token.tag in 'PAREN_CLOSE BRACKET_CLOSE BRACE_CLOSE'.split():
-                warning = 'unexpected {} in input (line {} col {})'.format(
-                        token.val, token.line, token.col)
-                raise SyntaxError(warning)
+            yield self._read_form(token, tokens)
 
-            else:
-                yield make_atom(token)
-
-    def _parse_vector(self, tokens):
-        ''' :: gen(Token) -> List[], gen(Tokens)
-        Parse a vector literal all at once and return both the list and
-        remaining tokens from the input stream.
-            Note: This makes a list in memory and then passes it back to parse!
-        '''
-        tmp = []
-        token = next(tokens)
+    def _next(self, tokens, closer):
+        '''Pull the next token, failing if the input ends too soon'''
         try:
-            while token.tag != 'BRACKET_CLOSE':
-                tmp.append(token)
-                token = next(tokens)
-            # Drop the final bracket
-            parsed = RVector([v for v in self.parse(tmp)])
-            return parsed, tokens
+            return next(tokens)
         except StopIteration:
-            # If we hit here then there was an error in the input.
-            raise SyntaxError('missing closing ] in list literal.')
+            raise SyntaxError('missing closing {} in input.'.format(closer))
 
-    def _parse_dict(self, tokens):
-        ''' :: gen(token) -> Dict{}, gen(Tokens)
-        Parse a dict literal and return the dict and remaining tokens
+    def _read_form(self, token, tokens):
+        ''' :: Token, gen(Token) -> datum, Span
+        Read a single form starting at `token`, consuming any tokens that
+        make up the rest of it.
+        '''
+        if token.tag == 'PAREN_OPEN':
+            # Start of an s-expression, drop the intial paren
+            sexp, spans = self._read_until(tokens, 'PAREN_CLOSE', ')')
+            if not sexp:
+                # Special case of the empty list
+                return EmptyList(), (token.line, token.col, None)
+            return RList(sexp), (token.line, token.col, spans)
+        elif token.tag == 'BRACKET_OPEN':
+            # start of a vector literal, drop the initial bracket
+            return self._parse_vector(token, tokens)
+        elif token.tag == 'TYPED_VECTOR':
+            # start of a numpy array literal: #f64[...]
+            return self._parse_typed_vector(token, tokens)
+        elif token.tag == 'BRACE_OPEN':
+            # start of a dict literal, drop the initial brace
+            return self._parse_dict(token, tokens)
+        elif token.tag in 'PAREN_CLOSE BRACKET_CLOSE BRACE_CLOSE'.split():
+            warning = 'unexpected {} in input (line {} col {})'.format(
+                    token.val, token.line, token.col)
+            raise SyntaxError(warning)
+        else:
+            return make_atom(token), (token.line, token.col, None)
+
+    def _read_until(self, tokens, close_tag, closer, skip=()):
+        ''' :: gen(Token), str, str -> List[datum], List[Span]
+        Read forms until we hit the closing token for the current literal.
+        '''
+        forms, spans = [], []
+        token = self._next(tokens, closer)
+        while token.tag != close_tag:
+            if token.tag not in skip:
+                form, span = self._read_form(token, tokens)
+                forms.append(form)
+                spans.append(span)
+            token = self._next(tokens, closer)
+        return forms, spans
+
+    def _parse_vector(self, token, tokens):
+        ''' :: Token, gen(Token) -> List[], Span
+        Parse a vector literal and return it along with its position.
+        '''
+        items, spans = self._read_until(tokens, 'BRACKET_CLOSE', ']')
+        return RVector(items), (token.line, token.col, spans)
+
+    def _parse_typed_vector(self, token, tokens):
+        ''' :: Token, gen(Token) -> ndarray, Span
+        Parse a typed vector literal into a numpy array (see ripl.arrays).
+        The token value is the dtype prefix: f64, i64...
+        '''
+        items, _ = self._read_until(tokens, 'BRACKET_CLOSE', ']')
+        arr = typed_vector(token.val, items)
+        return arr, (token.line, token.col, None)
+
+    def _parse_dict(self, token, tokens):
+        ''' :: Token, gen(Token) -> Dict{}, Span
+        Parse a dict literal and return the dict and its position.
         Dict literals are given as {k1 v1, k2 v2, ...}
         '''
-        tmp = []
-        token = next(tokens)
-        try:
-            while token.tag != 'BRACE_CLOSE':
-                if token.tag != 'COMMA':
-                    tmp.append(token)
-                token = next(tokens)
-            # Drop the final brace
-            parsed = [v for v in self.parse(tmp)]
-            if len(parsed) % 2 != 0:
-                # We didn't get key/value pairs
-                raise SyntaxError("Invalid dict literal")
-
-            pairs = [parsed[i:i+2] for i in range(0, len(parsed), 2)]
-            return RDict({k: v for k, v in pairs}), tokens
-        except StopIteration:
-            # If we hit here then there was an error in the input.
-            raise SyntaxError('missing closing } in dict literal.')
+        parsed, _ = self._read_until(
+                tokens, 'BRACE_CLOSE', '}', skip=('COMMA',))
+        if len(parsed) % 2 != 0:
+            # We didn't get key/value pairs
+            raise SyntaxError("Invalid dict literal")
+
+        pairs = [parsed[i:i+2] for i in range(0, len(parsed), 2)]
+        return RDict({k: v for k, v in pairs}), (token.line, token.col, None)
@@ -1,7 +1,8 @@
-import functools
 import collections
 import collections.abc
 import operator as op
+import threading
+from importlib import import_module
 
 
 class Symbol:
@@ -186,6 +187,147 @@ class RString(str):
 Scope = collections.ChainMap
 
 
+class LazyDef:
+    '''
+    A base scope entry that isn't imported until it is first looked up
+    (see Overlay): LazyDef('ripl.table', 'read_csv'). Like ModuleProxy in
+    ripl.utils, this keeps modules that a script doesn't use out of start
+    up.
+    '''
+    __slots__ = 'module', 'name', 'value'
+    _UNSET = object()
+
+    def __init__(self, module, name):
+        self.module = module
+        self.name = name
+        self.value = self._UNSET
+
+    def __repr__(self):
+        return '<lazy {}.{}>'.format(self.module, self.name)
+
+    def resolve(self):
+        if self.value is self._UNSET:
+            self.value = getattr(import_module(self.module), self.name)
+        return self.value
+
+
+class Overlay(dict):
+    '''
+    A dict of definitions in front of a read-only base mapping (see
+    `base_scope` in ripl.evaluators). Lookups that miss fall through to the
+    base via __missing__ rather than a second map in the Scope, as every
+    map a Scope misses costs it a KeyError. Values found in the base are
+    copied up so that the next lookup is a plain dict hit: an Overlay only
+    ever holds the names that have actually been used. LazyDefs in the
+    base are resolved as they are copied up.
+
+    Dotted symbols that aren't defined (np.mean) are resolved by looking
+    up the longest defined prefix (np) and then each attribute in turn.
+    The result is cached like a base value until the prefix is rebound.
+
+    Copying up and forgetting cached lookups happen under `lock` (the
+    evaluator's lock, see ripl.threads) so that a lookup racing with a
+    definition can't put back the value that it replaced.
+    '''
+    __slots__ = 'base', 'dotted', 'lock'
+
+    def __init__(self, base, lock=None):
+        self.base = base
+        # {prefix: [dotted symbols resolved through it]}
+        self.dotted = {}
+        self.lock = threading.RLock() if lock is None else lock
+
+    def __missing__(self, key):
+        with self.lock:
+            if dict.__contains__(self, key):
+                # Defined or copied up by another thread while we waited
+                return dict.__getitem__(self, key)
+            try:
+                value = self.base[key]
+            except KeyError:
+                if not _is_dotted(key):
+                    raise
+                value = self._resolve(key)
+            else:
+                if value.__class__ is LazyDef:
+                    value = value.resolve()
+            dict.__setitem__(self, key, value)
+            return value
+
+    def _resolve(self, key):
+        parts = key.str.split('.')
+        for i in range(len(parts) - 1, 0, -1):
+            prefix = Symbol('.'.join(parts[:i]))
+            if prefix in self:
+                value = self[prefix]
+                for attr in parts[i:]:
+                    try:
+                        value = getattr(value, attr)
+                    except AttributeError:
+                        raise KeyError(key) from None
+                self.dotted.setdefault(prefix, []).append(key)
+                return value
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            dict.__setitem__(self, key, value)
+            if key in self.dotted:
+                # Forget anything we looked up through the old value
+                stale = self.dotted.pop(key)
+                while stale:
+                    sym = stale.pop()
+                    self.pop(sym, None)
+                    stale.extend(self.dotted.pop(sym, ()))
+
+    def __contains__(self, key):
+        if dict.__contains__(self, key) or key in self.base:
+            return True
+        elif _is_dotted(key):
+            try:
+                self[key]
+            except KeyError:
+                return False
+            return True
+        return False
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+def _is_dotted(key):
+    return isinstance(key, Symbol) and '.' in key.str
+
+
+def lookup_dotted(scope, sym, head, attrs):
+    ''' :: Scope, Symbol, Symbol, [str] -> value
+    Look up a dotted symbol (sym = head.attrs...). A local binding of head
+    shadows everything else and gives its attributes. Otherwise the Overlay
+    resolves the longest bound prefix of the whole symbol (os.path.sep
+    after pyimporting os.path) and caches the result.
+    Raises KeyError if nothing is bound.
+    '''
+    for defs in scope.maps:
+        if isinstance(defs, Overlay):
+            return defs[sym]
+        if head in defs:
+            value = defs[head]
+            for attr in attrs:
+                value = getattr(value, attr)
+            return value
+    raise KeyError(sym)
+
+
+def scope_lookup(scope, sym):
+    ''' :: Scope, Symbol -> value
+    scope[sym], with dotted symbols resolved as the evaluator does.
+    '''
+    if _is_dotted(sym):
+        head, *attrs = sym.str.split('.')
+        return lookup_dotted(scope, sym, Symbol(head), attrs)
+    return scope[sym]
+
+
 def nested_scope(current_scope, args=[], vals=[]):
     '''
     Wrapper for the ChainMap.new_child() method that allows
@@ -244,20 +386,22 @@ def get_global_scope():
     '''
     Build a scope with some standard procedures to get started.
     '''
+    from . import operators
+
     py_builtins = {Symbol(k): v for k, v in __builtins__.items()}
 
     std_ops = {
-        Symbol('+'): lambda *x: functools.reduce(op.add, x),
-        Symbol('-'): op.sub,
-        Symbol('*'): op.mul,
-        Symbol('/'): op.truediv,
+        Symbol('+'): operators.add,
+        Symbol('-'): operators.sub,
+        Symbol('*'): operators.mul,
+        Symbol('/'): operators.truediv,
         Symbol('%'): op.mod,
-        Symbol('>'): op.gt,
-        Symbol('<'): op.lt,
-        Symbol('>='): op.ge,
-        Symbol('<='): op.le,
-        Symbol('=='): op.eq,
-        Symbol('!='): op.ne
+        Symbol('>'): operators.gt,
+        Symbol('<'): operators.lt,
+        Symbol('>='): operators.ge,
+        Symbol('<='): operators.le,
+        Symbol('=='): operators.eq,
+        Symbol('!='): operators.ne
         }
 
     key_words = {
@@ -272,6 +416,7 @@ def get_global_scope():
         Symbol('or'): op.or_,
         Symbol('not'): op.not_,
         Symbol('len'): len,
+        Symbol('in'): lambda x, xs: x in xs,
         }
 
     type_cons = {
@@ -307,22 +452,107 @@ def get_global_scope():
     return scope
 
 
+class TailCall:
+    '''
+    Returned by compiled Funcs (see ripl.compiler) in place of making a
+    tail call to another Func. `Func.__call__` bounces these.
+    '''
+    __slots__ = 'func', 'args'
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+
 class Func:
     '''
     A user-defined function.
+    Calls made from Python are counted and, once a Func is called
+    `evaluator.hot_threshold` times, it is promoted to a compiled Python
+    function if possible (see ripl.compiler).
     '''
-    def __init__(self, args, docstring, body, scope, evaluator):
+    def __init__(self, args, docstring, body, scope, evaluator, name=None):
         self.args = args
         self.body = body
         self.scope = scope
         self.evaluator = evaluator
+        self.name = name
+        self.calls = 0
+        self.compiled = None
+        self.vectorised = None
         self.__doc__ = docstring
 
+    def __repr__(self):
+        return '<Func {}>'.format(self.name or 'lambda')
+
     def __call__(self, *arg_vals):
-        res = self.evaluator.eval(
-                self.body,
-                nested_scope(
-                    current_scope=self.scope,
-                    args=self.args,
-                    vals=arg_vals))
-        return res
+        func = self
+        while True:
+            step = func.compiled
+            if step is None:
+                func.calls += 1
+                evaluator = func.evaluator
+                if func.calls == evaluator.hot_threshold and \
+                        evaluator.promote(func):
+                    continue
+                if evaluator.watch is not None:
+                    evaluator.watch.call(func)
+                return evaluator.eval(
+                        func.body,
+                        nested_scope(
+                            current_scope=func.scope,
+                            args=func.args,
+                            vals=arg_vals))
+            # Budgets send compiled Funcs back to the interpreter so this
+            # can only be an InterpStats
+            watch = func.evaluator.watch
+            if watch is not None:
+                watch.call(func)
+            res = step(*arg_vals)
+            if res.__class__ is not TailCall:
+                return res
+            func, arg_vals = res.func, res.args
+
+
+class GenFunc:
+    '''
+    A user-defined generator function (defgen).
+    Calling it gives a Python generator that runs the body a statement at
+    a time as values are asked for (see Evaluator.generate).
+    '''
+    def __init__(self, args, docstring, body, scope, evaluator, name=None):
+        self.args = args
+        self.body = body
+        self.scope = scope
+        self.evaluator = evaluator
+        self.name = name
+        self.__doc__ = docstring
+
+    def __repr__(self):
+        return '<GenFunc {}>'.format(self.name or 'lambda')
+
+    def __call__(self, *arg_vals):
+        return self.evaluator.generate(self, arg_vals)
+
+
+# What Memoised.lookup gives for a result that isn't cached
+MISS = object()
+
+
+class Memoised:
+    '''
+    Base for functions with cached results (MemoFunc in ripl.memo and
+    CachedFunc in ripl.diskcache) that wrap `self.func`.
+        key, value = f.lookup(args)     # value is MISS if not cached
+        f.remember(key, value)
+    The evaluators call these directly so that a miss on a wrapped Func
+    can jump into its body (keeping tail calls) and store the result
+    when the body has been evaluated. `key` is None for arguments that
+    can't be cached.
+    '''
+    def __call__(self, *args):
+        key, value = self.lookup(args)
+        if value is MISS:
+            value = self.func(*args)
+            self.remember(key, value)
+        return value
@@ -0,0 +1,127 @@
+'''
+Limits on how much work a single evaluation can do.
+
+    budget = Budget(steps=10**6, seconds=2.0, memory=50 * 2**20)
+    try:
+        evaluator.eval(node, evaluator.global_scope, budget=budget)
+    except BudgetExceeded as err:
+        print(err.reason, err.profile)
+
+`steps` counts trips round the evaluator loop (every symbol, call, `if`...
+that is interpreted), `seconds` is a wall clock deadline and `memory` caps
+the bytes that the evaluation has allocated and still holds (measured with
+tracemalloc, which is started for the duration if it isn't running). The
+deadline and memory are checked every CHECK_INTERVAL steps.
+
+Funcs are not compiled while a budget is in force and already compiled
+Funcs fall back to the interpreter, so every step is counted. Without a
+budget the evaluator only pays for an `is None` test per step.
+NOTE: Python functions that loop without calling back into ripl code
+      (`drain` over an infinite Python iterator for example) can't be
+      interrupted.
+'''
+import time
+import tracemalloc
+from collections import Counter
+
+CHECK_INTERVAL = 256
+
+
+class BudgetExceeded(Exception):
+    '''
+    Raised when an evaluation goes over its budget. `reason` is one of
+    'steps', 'seconds' or 'memory' and `profile` is what had been used so
+    far (see Budget.profile).
+    '''
+    def __init__(self, reason, profile):
+        Exception.__init__(self, 'evaluation exceeded its {} budget'.format(
+            reason))
+        self.reason = reason
+        self.profile = profile
+
+
+class Budget:
+    def __init__(self, steps=None, seconds=None, memory=None):
+        self.max_steps = steps
+        self.seconds = seconds
+        self.max_memory = memory
+        self.steps = 0
+        # Calls to ripl Funcs by name
+        self.calls = Counter()
+        self._next_check = 0
+        self._started = None
+        self._deadline = None
+        self._baseline = 0
+        self._peak = 0
+        self._tracing = False
+
+    def __repr__(self):
+        return '<Budget steps={} seconds={} memory={}>'.format(
+            self.max_steps, self.seconds, self.max_memory)
+
+    def start(self):
+        '''Start the clock (and tracemalloc if we are limiting memory)'''
+        self.steps = 0
+        self.calls.clear()
+        self._started = time.monotonic()
+        if self.seconds is not None:
+            self._deadline = self._started + self.seconds
+        if self.max_memory is not None:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            self._baseline = tracemalloc.get_traced_memory()[0]
+            self._peak = 0
+        self._next_check = self._limit(CHECK_INTERVAL)
+
+    def stop(self):
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def _limit(self, steps):
+        if self.max_steps is None:
+            return steps
+        return min(steps, self.max_steps + 1)
+
+    def step(self, node, scope):
+        '''Called by the evaluator for every step'''
+        self.steps += 1
+        if self.steps >= self._next_check:
+            self.check()
+
+    def call(self, func, node=None):
+        '''Called by the evaluator for every call to a ripl Func'''
+        self.calls[func.name or 'lambda'] += 1
+
+    def check(self):
+        '''Raise BudgetExceeded if we have gone over any of our limits'''
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise BudgetExceeded('steps', self.profile())
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise BudgetExceeded('seconds', self.profile())
+        if self.max_memory is not None:
+            used = self._allocated()
+            if used > self.max_memory:
+                raise BudgetExceeded('memory', self.profile())
+        self._next_check = self._limit(self.steps + CHECK_INTERVAL)
+
+    def _allocated(self):
+        used = tracemalloc.get_traced_memory()[0] - self._baseline
+        self._peak = max(self._peak, used)
+        return used
+
+    def profile(self):
+        ''' :: -> dict
+        Steps taken, seconds elapsed, the busiest Funcs and (if limited)
+        bytes allocated so far
+        '''
+        profile = {
+            'steps': self.steps,
+            'seconds': time.monotonic() - self._started,
+            'calls': self.calls.most_common(10),
+            }
+        if self.max_memory is not None and tracemalloc.is_tracing():
+            profile['memory'] = self._allocated()
+            profile['peak_memory'] = self._peak
+        return profile
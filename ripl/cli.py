@@ -1,13 +1,19 @@
+import sys
 import argparse
 
-from .evaluators import REPL
-
 
 __version__ = "0.1.2"
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'command',
+        nargs='?',
+        choices=['serve'],
+        help='serve: run a resident evaluator for `ripl -c`. Whoever can '
+             'connect to its socket can run code as you (see --socket)',
+    )
     # parser.add_argument(
     #     'file_name',
     #     required=False,
@@ -19,24 +25,123 @@ def main(argv=None):
         default='',
         required=False,
     )
+    parser.add_argument(
+        '-c',
+        '--client',
+        type=str,
+        default='',
+        required=False,
+        help='evaluate code on a running `ripl serve`',
+    )
+    parser.add_argument(
+        '--socket',
+        type=str,
+        default=None,
+        required=False,
+        help='unix socket path or HOST:PORT for serve and -c '
+             '(default: $RIPL_SOCKET or ripl-UID.sock in the temp directory)',
+    )
+    parser.add_argument(
+        '--allow-remote',
+        action='store_true',
+        required=False,
+        help='let serve listen on a non-loopback HOST. There is no '
+             'authentication: anyone who can reach the port can run code '
+             'as you',
+    )
     parser.add_argument(
         '-v',
         '--version',
         action='store_true',
         required=False,
     )
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        required=False,
+        help='print interpreter statistics on exit',
+    )
+    parser.add_argument(
+        '--cache',
+        choices=['info', 'clear'],
+        required=False,
+        help='inspect or empty the defn/cached result cache',
+    )
 
-    if argv:
+    if isinstance(argv, list):
+        args = parser.parse_args(argv)
+    elif argv:
         args = parser.parse_args([argv])
     else:
         args = parser.parse_args()
 
     if args.version:
         print(__version__)
+    elif args.cache:
+        cache_command(args.cache)
+    elif args.command == 'serve':
+        from .server import serve, ADDRESS
+        return serve(args.socket or ADDRESS, allow_remote=args.allow_remote)
+    elif args.client:
+        # Doesn't import the interpreter at all
+        return client_command(args.client, args.socket)
     elif args.script:
-        repl = REPL()
-        repl.eval_and_print(args.script)
+        from .evaluators import Evaluator
+        evaluator = Evaluator()
+        with_stats(evaluator, args.stats, evaluator.eval_and_print,
+                   args.script)
     else:
+        # Only the interactive REPL needs prompt_toolkit and pygments so
+        # don't import them for scripts.
+        from .repl import REPL
         # Spin up a repl with optional debug
         repl = REPL()
-        repl.read()
+        with_stats(repl, args.stats, repl.read)
+
+
+def with_stats(evaluator, stats, func, *args):
+    '''Run func, printing the evaluator's stats at the end if asked to'''
+    if not stats:
+        return func(*args)
+    evaluator.enable_stats()
+    try:
+        return func(*args)
+    finally:
+        print(evaluator.stats.report(), file=sys.stderr)
+
+
+def client_command(code, address):
+    '''ripl -c CODE'''
+    from .client import Client, RemoteError, ADDRESS
+    address = address or ADDRESS
+    try:
+        with Client(address) as client:
+            for result in client.results(code):
+                print('> ' + result + '\n')
+    except RemoteError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except OSError as e:
+        print('unable to connect to ripl serve at {}: {}'.format(
+            address, e), file=sys.stderr)
+        return 1
+
+
+def cache_command(command):
+    '''ripl --cache info|clear'''
+    from .diskcache import default_cache
+    cache = default_cache()
+    if command == 'clear':
+        cache.clear()
+        print('cleared {}'.format(cache.path))
+        return
+    info = cache.info()
+    print(info['path'])
+    print('{} results, {} of {}'.format(
+        info['entries'], _mb(info['size']), _mb(info['max_bytes'])))
+    for name, entries, size in info['funcs']:
+        print('  {:<30}{:>8}{:>12}'.format(name, entries, _mb(size)))
+
+
+def _mb(size):
+    return '{:.1f}MB'.format(size / 2**20)
@@ -0,0 +1,85 @@
+'''
+A thin client for `ripl serve` (see ripl.server).
+
+    ripl -c '(defn f (x) (* x 2)) (f 21)'
+
+This only needs the standard library so that scripts calling a running
+server don't pay for importing the interpreter.
+'''
+import os
+import json
+import socket
+import tempfile
+
+# Unix socket path or HOST:PORT
+ADDRESS = os.environ.get('RIPL_SOCKET', os.path.join(
+    tempfile.gettempdir(), 'ripl-{}.sock'.format(os.getuid())))
+
+
+class RemoteError(Exception):
+    '''An error raised by code evaluated on the server'''
+    pass
+
+
+def parse_address(address):
+    ''' :: str -> (str, int) | str
+    HOST:PORT for TCP, anything else is the path of a Unix socket
+    '''
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and os.sep not in address:
+        return host or '127.0.0.1', int(port)
+    return address
+
+
+class Client:
+    '''
+    A connection to a ripl server. Each connection is its own session:
+    definitions last until it is closed.
+    '''
+    def __init__(self, address=ADDRESS):
+        address = parse_address(address)
+        family = socket.AF_INET if isinstance(address, tuple) \
+            else socket.AF_UNIX
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile('rb')
+        self.ids = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def results(self, code):
+        ''' :: str -> Gen[str]
+        Evaluate `code` and yield the printed value of each top level
+        expression as it arrives. Raises RemoteError if evaluation fails.
+        '''
+        self.ids += 1
+        request = {'id': self.ids, 'code': code}
+        self.sock.sendall(json.dumps(request).encode() + b'\n')
+        for line in self.file:
+            response = json.loads(line.decode())
+            if 'result' in response:
+                yield response['result']
+            elif 'error' in response:
+                raise RemoteError(response['error'])
+            elif response.get('done'):
+                return
+        raise ConnectionError('server closed the connection')
+
+    def eval(self, code):
+        ''' :: str -> str
+        The printed value of the last expression in `code`
+        '''
+        result = None
+        for result in self.results(code):
+            pass
+        return result
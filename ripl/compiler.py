@@ -0,0 +1,405 @@
+'''
+Compile ripl Funcs down to native Python functions.
+
+Funcs count how many times they are called from Python (`map`, `sorted`
+etc all go through `Func.__call__`) and once they pass the evaluator's
+`hot_threshold` they are handed to `compile_func`. This generates Python
+source for the body, execs it and returns a `step` function that is then
+used in place of re-entering `Evaluator.eval` for every call.
+
+What gets compiled (see ripl.nodes):
+    - literals, quoted data and references to the Func's parameters
+    - free symbols: looked up once at compile time and captured as
+      constants, guarded by the evaluator's definition epoch (see below)
+    - `if` and calls (including calls to other Funcs)
+    - two argument arithmetic and comparisons, which become the bare
+      Python operator rather than a call into ripl.operators
+Anything else (`define`, `set`, `lambda`, `eval`, *args parameters...)
+raises a CompileError and the Func stays interpreted.
+
+Guards
+    Every define/set/defn bumps `Evaluator.epoch`. A compiled step checks
+    the epoch on entry and, if it has moved, re-checks that each captured
+    symbol is still bound to the same object. If any binding has changed
+    the Func is deoptimised back to the interpreter.
+    NOTE: Mutating a Scope directly from Python does not bump the epoch.
+
+Tail calls
+    A tail call to the Func itself becomes a loop. Tail calls to other
+    Funcs return a TailCall that is bounced by `Func.__call__` so compiled
+    code keeps the interpreter's constant-space tail calls.
+
+Vectorising
+    `vectorise` uses the same codegen to turn a Func built only from
+    arithmetic, comparisons and `if` into one numpy expression over whole
+    arrays (see `vmap` in the prelude). Kernels use the same guards.
+'''
+import re
+import operator as op
+from keyword import iskeyword
+from types import FunctionType
+
+from . import operators
+from .arrays import numpy
+from .bases import Symbol, EmptyList, Func, TailCall, nested_scope, \
+    scope_lookup
+from .nodes import Literal, Empty, SymRef, Quote, If, Call, Attr, \
+    MethodCall
+
+# Literal types that are safe to inline via repr
+_LITERAL_TYPES = (int, float, complex, bool, type(None))
+
+# Two argument calls to these become the Python operator
+_INLINE_OPS = {
+    operators.add: '+', operators.sub: '-',
+    operators.mul: '*', operators.truediv: '/',
+    operators.lt: '<', operators.le: '<=',
+    operators.gt: '>', operators.ge: '>=',
+    operators.eq: '==', operators.ne: '!=',
+    }
+_COMPARISONS = {'<', '<=', '>', '>=', '==', '!='}
+
+
+class CompileError(Exception):
+    '''Raised when a Func body uses something we can't compile'''
+    pass
+
+
+class _Codegen:
+    '''
+    Turns a single Func body into the source for a `step` function.
+    Free values end up in `self.consts` and are referenced as `_k<n>`.
+    '''
+    def __init__(self, func):
+        self.func = func
+        self.params = {}
+        for n, arg in enumerate(func.args):
+            if not isinstance(arg, Symbol) or arg.str.startswith('*'):
+                raise CompileError('only simple positional args compile')
+            self.params[arg] = '_a{}'.format(n)
+        self.consts = []
+        self.const_ids = {}
+        self.guards = {}
+
+    def const(self, value):
+        '''Reference a constant value from the generated code'''
+        key = id(value)
+        if key not in self.const_ids:
+            self.const_ids[key] = '_k{}'.format(len(self.consts))
+            self.consts.append(value)
+        return self.const_ids[key]
+
+    def lookup(self, sym):
+        '''Resolve a free symbol now and guard on the binding'''
+        try:
+            value = scope_lookup(self.func.scope, sym)
+        except (KeyError, AttributeError):
+            raise CompileError('symbol {} is not defined'.format(sym))
+        self.guards[sym] = value
+        return self.const(value), value
+
+    def expr(self, node):
+        ''' :: Node -> python expression source'''
+        cls = node.__class__
+        if cls is Literal:
+            if type(node.value) in _LITERAL_TYPES:
+                return repr(node.value)
+            return self.const(node.value)
+        elif cls is SymRef:
+            if node.sym in self.params:
+                return self.params[node.sym]
+            return self.lookup(node.sym)[0]
+        elif cls is Call:
+            if len(node.args) == 2 and node.func.__class__ is SymRef and \
+                    node.func.sym not in self.params:
+                name, value = self.lookup(node.func.sym)
+                if isinstance(value, FunctionType) and value in _INLINE_OPS:
+                    return '({} {} {})'.format(
+                        self.expr(node.args[0]), _INLINE_OPS[value],
+                        self.expr(node.args[1]))
+            return '{}({})'.format(self.callee(node.func), self.args(node))
+        elif cls is If:
+            return '({} if {} else {})'.format(
+                self.expr(node.then), self.expr(node.test),
+                self.expr(node.orelse))
+        elif cls is Attr:
+            if node.obj.sym in self.params:
+                return '.'.join([self.params[node.obj.sym]] +
+                                [_attribute(a) for a in node.attrs])
+            # Resolved as a whole, like the evaluator (see lookup_dotted)
+            return self.lookup(node.form)[0]
+        elif cls is MethodCall:
+            # Python's own method calls are as quick as our cache
+            return '{}.{}({})'.format(self.expr(node.obj),
+                                      _attribute(node.name), self.args(node))
+        elif cls is Quote:
+            return self.const(node.datum)
+        elif cls is Empty:
+            return '_EmptyList()'
+        raise CompileError('{} does not compile'.format(cls.__name__))
+
+    def callee(self, node):
+        if node.__class__ is SymRef and node.sym not in self.params:
+            return self.lookup(node.sym)[0]
+        return self.expr(node)
+
+    def args(self, node):
+        return ', '.join(self.expr(arg) for arg in node.args)
+
+    def tail(self, node, indent):
+        ''' :: Node -> lines of python in tail position'''
+        pad = '    ' * indent
+        if node.__class__ is If:
+            lines = ['{}if {}:'.format(pad, self.expr(node.test))]
+            lines += self.tail(node.then, indent + 1)
+            lines += ['{}else:'.format(pad)]
+            lines += self.tail(node.orelse, indent + 1)
+            return lines
+        if node.__class__ is Call and node.func.__class__ is SymRef and \
+                node.func.sym not in self.params:
+            name, value = self.lookup(node.func.sym)
+            if value is self.func and len(node.args) == len(self.params):
+                # Self tail call: rebind the params and loop
+                names = [self.params[a] for a in self.func.args]
+                return ['{}{}, = ({},)'.format(
+                            pad, ', '.join(names), self.args(node)),
+                        '{}continue'.format(pad)]
+            if type(value) is Func:
+                return ['{}return _TailCall({}, ({},))'.format(
+                    pad, name, self.args(node))]
+        return ['{}return {}'.format(pad, self.expr(node))]
+
+    def source(self, fname):
+        params = [self.params[a] for a in self.func.args]
+        lines = self.tail(self.func.body, 3)
+        src = [
+            'def _build(_consts, _check, _interp):',
+            self.unpack_consts(),
+            '    def {}(*_a):'.format(fname),
+            '        if len(_a) != {} or (_ev.epoch != _seen[0] and '
+            'not _check()):'.format(len(params)),
+            '            return _interp(_a)',
+            ]
+        if params:
+            src.append('        {}, = _a'.format(', '.join(params)))
+        src.append('        while True:')
+        src.extend(lines)
+        src.append('    return {}'.format(fname))
+        return '\n'.join(src)
+
+    def unpack_consts(self):
+        '''Bind the `_k<n>` names inside `_build`'''
+        consts = ''.join('{}, '.format(c) for c in
+                         sorted(self.const_ids.values(),
+                                key=lambda k: int(k[2:])))
+        return '    {}= _consts'.format(consts) if consts else '    pass'
+
+
+def _attribute(name):
+    '''Attribute names have to be valid Python to use `obj.name`'''
+    if not name.isidentifier() or iskeyword(name):
+        raise CompileError('.{} does not compile'.format(name))
+    return name
+
+
+class _VectorCodegen(_Codegen):
+    '''
+    Lowers a Func body to a single numpy expression over whole arrays.
+    Only literals, parameters, free values, arithmetic / comparison
+    operators and `if` (as np.where) are allowed.
+    '''
+    def expr(self, node):
+        cls = node.__class__
+        if cls is Literal:
+            if type(node.value) in _LITERAL_TYPES:
+                return repr(node.value)
+        elif cls is SymRef:
+            return _Codegen.expr(self, node)
+        elif cls is If:
+            return '_where({}, {}, {})'.format(
+                self.expr(node.test), self.expr(node.then),
+                self.expr(node.orelse))
+        elif cls is Call:
+            return self.operator(node)
+        raise CompileError('{} does not vectorise'.format(cls.__name__))
+
+    def operator(self, node):
+        if node.func.__class__ is not SymRef or node.func.sym in self.params:
+            raise CompileError('only calls to operators vectorise')
+        _, value = self.lookup(node.func.sym)
+        try:
+            symbol = _VECTOR_OPS.get(value)
+        except TypeError:
+            # Unhashable value
+            symbol = None
+        if symbol is None:
+            raise CompileError(
+                'calls to {} do not vectorise'.format(node.func.sym))
+        args = [self.expr(arg) for arg in node.args]
+
+        if symbol in _COMPARISONS:
+            if len(args) < 2:
+                return 'True'
+            pairs = ('({} {} {})'.format(a, symbol, b)
+                     for a, b in zip(args, args[1:]))
+            return '({})'.format(' & '.join(pairs))
+        elif not args and symbol in ('+', '*'):
+            return '0' if symbol == '+' else '1'
+        elif len(args) == 1 and symbol == '-':
+            return '(-{})'.format(args[0])
+        elif len(args) == 1 and symbol == '/':
+            return '(1 / {})'.format(args[0])
+        elif len(args) == 1 and symbol != '%':
+            return args[0]
+        elif len(args) < 2 or (symbol == '%' and len(args) > 2):
+            raise CompileError(
+                'wrong number of arguments in {}'.format(node.form))
+        return '({})'.format(' {} '.format(symbol).join(args))
+
+    def source(self, fname):
+        params = ', '.join(self.params[a] for a in self.func.args)
+        body = self.expr(self.func.body)
+        return '\n'.join([
+            'def _build(_consts):',
+            self.unpack_consts(),
+            '    def {}({}):'.format(fname, params),
+            '        return {}'.format(body),
+            '    return {}'.format(fname),
+            ])
+
+
+_VECTOR_OPS = dict(_INLINE_OPS)
+_VECTOR_OPS[op.mod] = '%'
+
+
+def _py_name(name):
+    '''Make a ripl name usable as a Python identifier'''
+    # NOTE: str(Symbol) re-initialises the RString returned by __repr__
+    #       so go via format instead.
+    return 'ripl_' + re.sub(r'\W', '_', '{}'.format(name))
+
+
+def _changed_binding(func, guards):
+    '''Return the first captured symbol that is now bound to something else'''
+    for sym, value in guards.items():
+        try:
+            current = scope_lookup(func.scope, sym)
+        except (KeyError, AttributeError):
+            current = None
+        if current is not value:
+            return sym
+    return None
+
+
+def compile_func(func):
+    ''' :: Func -> step function
+    Generate and exec Python source for a Func body. The returned function
+    takes the same arguments as the Func and returns either a value or a
+    TailCall for `Func.__call__` to bounce.
+    Raises CompileError if the body can't be compiled.
+    '''
+    evaluator = func.evaluator
+    gen = _Codegen(func)
+    fname = _py_name(func.name or 'lambda')
+    source = gen.source(fname)
+    seen = [evaluator.epoch]
+
+    def check():
+        '''Definitions have changed: are our captured bindings still good?'''
+        if evaluator.budget is not None:
+            # Interpret while a budget is in force so steps are counted
+            return False
+        changed = _changed_binding(func, gen.guards)
+        if changed is not None:
+            deoptimise(func, 'binding for {} changed'.format(changed))
+            return False
+        seen[0] = evaluator.epoch
+        return True
+
+    def interp(arg_vals):
+        return evaluator.eval(
+                func.body, nested_scope(func.scope, func.args, arg_vals))
+
+    namespace = {
+        '_ev': evaluator,
+        '_seen': seen,
+        '_TailCall': TailCall,
+        '_EmptyList': EmptyList,
+        }
+    code = compile(source, '<ripl:{}>'.format(fname), 'exec')
+    exec(code, namespace)
+    step = namespace['_build'](tuple(gen.consts), check, interp)
+    step.__doc__ = func.__doc__
+    step.source = source
+    return step
+
+
+def promote(func):
+    ''' :: Func -> bool
+    Try to swap in a compiled version of a hot Func, recording the outcome
+    in the evaluator's `jit_events`.
+    '''
+    events = func.evaluator.jit_events
+    try:
+        func.compiled = compile_func(func)
+    except CompileError as err:
+        events.append(('reject', func.name, str(err)))
+        return False
+    except Exception as err:
+        # Anything unexpected just leaves the Func interpreted
+        events.append(('reject', func.name, repr(err)))
+        return False
+    events.append(('promote', func.name, func.calls))
+    return True
+
+
+def deoptimise(func, reason):
+    '''Drop a Func's compiled code and go back to the interpreter'''
+    func.compiled = None
+    func.calls = 0
+    func.evaluator.jit_events.append(('deopt', func.name, reason))
+
+
+def vectorise(func):
+    ''' :: Func -> kernel function
+    Generate a function that evaluates the Func body once over whole numpy
+    arrays (one per parameter). `if` becomes np.where, so both branches
+    are computed for every element.
+    Raises CompileError if the body can't be vectorised.
+    '''
+    np = numpy()
+    if np is None:
+        raise CompileError('numpy is not installed')
+    gen = _VectorCodegen(func)
+    fname = _py_name(func.name or 'lambda') + '_vector'
+    source = gen.source(fname)
+    namespace = {'_where': np.where}
+    exec(compile(source, '<ripl:{}>'.format(fname), 'exec'), namespace)
+    kernel = namespace['_build'](tuple(gen.consts))
+    kernel.source = source
+    kernel.guards = gen.guards
+    return kernel
+
+
+def vectorised(func):
+    ''' :: Func -> kernel function | None
+    The cached `vectorise` kernel for a Func, or None if it can't be
+    vectorised. Kernels are re-traced if any of their captured bindings
+    change (see Guards above).
+    '''
+    evaluator = func.evaluator
+    if func.vectorised is not None:
+        epoch, kernel = func.vectorised
+        if epoch == evaluator.epoch:
+            return kernel
+        if kernel is not None and \
+                _changed_binding(func, kernel.guards) is None:
+            func.vectorised = (evaluator.epoch, kernel)
+            return kernel
+    try:
+        kernel = vectorise(func)
+    except CompileError as err:
+        evaluator.jit_events.append(('scalar', func.name, str(err)))
+        kernel = None
+    func.vectorised = (evaluator.epoch, kernel)
+    return kernel
@@ -0,0 +1,210 @@
+'''
+Dataflow pipelines as a DAG of cached stages: make for data.
+
+    (defstage raw () (read-csv "prices.csv"))
+    (defstage cheap (raw) (filter-rows raw (lambda (p) (< p 10)) "price"))
+    (defstage report (raw cheap) (tuple (len raw) (len cheap)))
+    (run-dag report)
+
+A stage names the stages it takes as inputs and a body that is evaluated
+with each input bound to that stage's output. `run-dag` works out which
+stages the targets need, runs the independent ones concurrently on a
+thread pool and returns the targets' outputs.
+
+Every stage has a key: a hash of its body, the ripl functions and plain
+constants (numbers, strings...) that the body refers to and the keys of
+its inputs. Outputs are pickled to `cache_dir` under that key, so a stage
+only runs if it (or something upstream of it) has changed. A stage whose
+output is already cached doesn't need its inputs at all, so they aren't
+run or loaded either.
+    NOTE: Stages are only re-run when their source changes: a stage that
+          reads a file won't notice the file changing. Change the body (or
+          clear the cache) to force a re-run.
+Outputs that are iterators are drained into a vector so that they can be
+cached and shared between downstream stages. Outputs that can't be pickled
+are passed on but not cached.
+
+What happened to each stage is logged to the evaluator's `dag_events` as
+(event, name, detail) tuples: 'run', 'cached' (loaded from the cache) and
+'uncached' (ran but could not be cached).
+'''
+import os
+import pickle
+import hashlib
+import tempfile
+import collections.abc
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .bases import RVector, nested_scope
+from .hashing import canonical, references
+
+CACHE_DIR = os.environ.get('RIPL_DAG_CACHE', '.ripl-cache')
+
+
+class Stage:
+    '''
+    A named step in a pipeline (see defstage).
+    `inputs` are the symbols of the stages it takes as input: they are
+    looked up when the DAG is run so redefining a stage is picked up by
+    everything downstream of it.
+    '''
+    def __init__(self, name, inputs, docstring, body, scope, evaluator):
+        self.name = name
+        self.inputs = inputs
+        self.body = body
+        self.scope = scope
+        self.evaluator = evaluator
+        self.__doc__ = docstring
+
+    def __repr__(self):
+        return '<Stage {}>'.format(self.name)
+
+    def upstream(self):
+        ''' :: List[Stage]
+        The stages this stage takes as input
+        '''
+        stages = []
+        for sym in self.inputs:
+            try:
+                stage = self.scope[sym]
+            except KeyError:
+                raise NameError('stage {} is not defined'.format(sym))
+            if not isinstance(stage, Stage):
+                raise TypeError(
+                    '{} is an input of {} but is not a stage'.format(
+                        sym, self.name))
+            stages.append(stage)
+        return stages
+
+    def run(self, values):
+        ''' :: List[Any] -> Any
+        Evaluate the body with the inputs bound to `values`
+        '''
+        scope = nested_scope(self.scope, list(self.inputs), values)
+        result = self.evaluator.eval(self.body, scope)
+        if isinstance(result, collections.abc.Iterator):
+            result = RVector(result)
+        return result
+
+
+def run_dag(*targets, cache_dir=None, workers=None):
+    ''' :: *Stage -> Any
+    Bring the target stages up to date and return their outputs (a tuple
+    if there is more than one target).
+    '''
+    if not targets:
+        raise ValueError('run-dag needs at least one stage')
+    cache = _Cache(cache_dir or CACHE_DIR)
+    keys, deps = {}, {}
+    for stage in targets:
+        _key(stage, keys, deps, ())
+
+    # Work back from the targets: cached stages are loaded and everything
+    # else has to run, which needs its inputs.
+    todo, cached = list(targets), set()
+    pending = {}
+    while todo:
+        stage = todo.pop()
+        if stage in pending:
+            continue
+        if keys[stage] in cache:
+            cached.add(stage)
+            pending[stage] = ()
+        else:
+            pending[stage] = deps[stage]
+            todo.extend(deps[stage])
+
+    results = {}
+    with ThreadPoolExecutor(workers) as pool:
+        running = {}
+        while pending or running:
+            ready = [s for s, needs in pending.items()
+                     if all(n in results for n in needs)]
+            for stage in ready:
+                del pending[stage]
+                if stage in cached:
+                    job = pool.submit(_load, stage, keys[stage], cache)
+                else:
+                    values = [results[s] for s in deps[stage]]
+                    job = pool.submit(
+                        _build, stage, keys[stage], values, cache)
+                running[job] = stage
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for job in done:
+                results[running.pop(job)] = job.result()
+
+    outputs = tuple(results[stage] for stage in targets)
+    return outputs[0] if len(outputs) == 1 else outputs
+
+
+def _load(stage, key, cache):
+    value = cache.load(key)
+    stage.evaluator.dag_events.append(('cached', stage.name, key))
+    return value
+
+
+def _build(stage, key, values, cache):
+    value = stage.run(values)
+    events = stage.evaluator.dag_events
+    events.append(('run', stage.name, key))
+    try:
+        cache.save(key, value)
+    except Exception as err:
+        # Pickling arbitrary objects can fail in all sorts of ways
+        events.append(('uncached', stage.name, str(err)))
+    return value
+
+
+def _key(stage, keys, deps, path):
+    ''' :: Stage, dict, dict, tuple -> str
+    The content hash of a stage, filling in `keys` and `deps` for it and
+    everything upstream of it.
+    '''
+    if stage in keys:
+        return keys[stage]
+    elif stage in path:
+        names = [s.name for s in path + (stage,)]
+        raise ValueError('cycle in DAG: {}'.format(
+            ' -> '.join('{}'.format(n) for n in names)))
+
+    upstream = stage.upstream()
+    digest = hashlib.sha256()
+    form = stage.body.form
+    digest.update(canonical(form).encode())
+    for text in references(form, stage.scope, stage.inputs):
+        digest.update(text.encode())
+    for sym, dep in zip(stage.inputs, upstream):
+        dep_key = _key(dep, keys, deps, path + (stage,))
+        digest.update('{}={}'.format(sym.str, dep_key).encode())
+    keys[stage] = digest.hexdigest()
+    deps[stage] = upstream
+    return keys[stage]
+
+
+class _Cache:
+    '''Pickled stage outputs stored by key'''
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.pickle')
+
+    def __contains__(self, key):
+        return os.path.exists(self._file(key))
+
+    def load(self, key):
+        with open(self._file(key), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, key, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        os.makedirs(self.path, exist_ok=True)
+        # Write then rename so that a crash never leaves half a file
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._file(key))
+        except:
+            os.unlink(tmp)
+            raise
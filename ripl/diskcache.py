@@ -0,0 +1,256 @@
+'''
+Persistent memoisation of pure ripl functions across runs.
+
+    (defn/cached load-prices (day) (read-csv (+ "prices/" day ".csv")))
+
+Results are pickled into a sqlite database (RIPL_CACHE, default
+~/.cache/ripl/cache.sqlite3) keyed by a sha256 of the function's source
+(see ripl.hashing: including any functions and constants it uses) and its
+arguments. Changing the function, or anything it calls, gives new keys so
+stale results are never returned; they are just left to be evicted.
+
+The database is bounded to `max_bytes` of results: once it grows past
+that the least recently used results are deleted. Hits don't write to the
+database: their access times are kept in memory and written in batches
+(with the next result stored, or every TOUCH_BATCH hits). Inspect or
+empty it from the command line with
+
+    ripl --cache info
+    ripl --cache clear
+
+NOTE: Only cache pure functions! Arguments must be plain data (numbers,
+      strings, keywords, containers of those and numpy arrays): calls
+      with anything else, and results that can't be pickled, are not
+      cached.
+'''
+import os
+import time
+import atexit
+import pickle
+import sqlite3
+import hashlib
+import threading
+
+from .bases import RDict, Memoised, MISS
+from .hashing import canonical, source
+
+CACHE_PATH = os.environ.get('RIPL_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'ripl', 'cache.sqlite3'))
+MAX_BYTES = 2**30
+# Fraction of max_bytes to shrink to when evicting, so that we aren't
+# evicting on every write once the cache is full.
+_LOW_WATER = 0.9
+# Hits whose access times are held back before being written
+TOUCH_BATCH = 256
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    func TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+'''
+
+
+class DiskCache:
+    '''A size bounded sqlite store of pickled results'''
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._db = None
+        self._size = None
+        # {key: access time} for hits not yet written (see _flush)
+        self._touched = {}
+
+    @property
+    def db(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def get(self, key):
+        ''' :: str -> Any
+        Raises KeyError if there is no result for key
+        '''
+        with self.lock:
+            row = self.db.execute(
+                'SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                with self.db:
+                    self._flush()
+        return pickle.loads(row[0])
+
+    def _flush(self):
+        '''Write the access times of recent hits'''
+        if self._touched:
+            self.db.executemany(
+                'UPDATE results SET accessed = ? WHERE key = ?',
+                [(t, key) for key, t in self._touched.items()])
+            self._touched.clear()
+
+    def put(self, key, name, value):
+        ''' :: str, str, Any -> None
+        Store a result, evicting old ones if we have gone over max_bytes.
+        Raises if value can't be pickled.
+        '''
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock, self.db:
+            # Eviction needs to know what has been used recently
+            self._flush()
+            old = self.db.execute(
+                'SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+            self.db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+                (key, name, data, len(data), time.time()))
+            if self._size is None:
+                self._size = self._total()
+            else:
+                self._size += len(data) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _total(self):
+        return self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def _evict(self):
+        # Another process may have been writing too
+        size = self._total()
+        target = self.max_bytes * _LOW_WATER
+        rows = self.db.execute(
+            'SELECT key, size FROM results ORDER BY accessed')
+        doomed = []
+        for key, length in rows:
+            if size <= target:
+                break
+            doomed.append((key,))
+            size -= length
+        self.db.executemany('DELETE FROM results WHERE key = ?', doomed)
+        self._size = size
+
+    def info(self):
+        ''' :: -> dict
+        The path, size and number of results in the cache along with the
+        number of results for each function.
+        '''
+        with self.lock:
+            entries, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results'
+                ).fetchone()
+            funcs = self.db.execute(
+                'SELECT func, COUNT(*), SUM(size) FROM results '
+                'GROUP BY func ORDER BY SUM(size) DESC').fetchall()
+        return {'path': self.path, 'entries': entries, 'size': size,
+                'max_bytes': self.max_bytes, 'funcs': funcs}
+
+    def clear(self):
+        '''Delete every result'''
+        with self.lock:
+            with self.db:
+                self.db.execute('DELETE FROM results')
+            self.db.execute('VACUUM')
+            self._size = 0
+            self._touched.clear()
+
+    def close(self):
+        with self.lock:
+            if self._db is not None:
+                with self._db:
+                    self._flush()
+                self._db.close()
+                self._db = None
+
+
+_default = None
+
+
+def default_cache():
+    ''' :: -> DiskCache
+    The cache used by defn/cached, opened on first use
+    '''
+    global _default
+    if _default is None:
+        _default = DiskCache()
+        # Write out any access times still held back
+        atexit.register(_default.close)
+    return _default
+
+
+class CachedFunc(Memoised):
+    '''
+    A ripl Func with its results stored on disk by argument.
+    As with MemoFunc (see ripl.memo) this is not a Func so that calls from
+    ripl code go through the cache.
+    '''
+    def __init__(self, func, cache=None):
+        self.func = func
+        self.cache = cache
+        self.name = func.name
+        self.__doc__ = func.__doc__
+        self.hits = self.misses = 0
+        # (evaluator epoch, hash of the source) so that we only re-read
+        # the source when something has been (re)defined.
+        self._source = None
+
+    def __repr__(self):
+        return '<CachedFunc {}>'.format(self.name or 'lambda')
+
+    def source_hash(self):
+        ''' :: -> str
+        A hash of the source of the function and everything it uses
+        '''
+        epoch = self.func.evaluator.epoch
+        if self._source is None or self._source[0] != epoch:
+            text = source(self.func).encode()
+            self._source = epoch, hashlib.sha256(text).hexdigest()
+        return self._source[1]
+
+    def lookup(self, args):
+        ''' :: tuple -> key, value|MISS
+        See Memoised in ripl.bases
+        '''
+        cache = self.cache or default_cache()
+        try:
+            key = hashlib.sha256('{}\n{}'.format(
+                self.source_hash(), canonical(args, strict=True)).encode()
+                ).hexdigest()
+        except TypeError:
+            self.misses += 1
+            return None, MISS
+
+        try:
+            value = cache.get(key)
+        except KeyError:
+            self.misses += 1
+            return key, MISS
+        self.hits += 1
+        return key, value
+
+    def remember(self, key, value):
+        '''Store the result for a key from `lookup`'''
+        if key is None:
+            return
+        cache = self.cache or default_cache()
+        try:
+            cache.put(key, '{}'.format(self.name), value)
+        except Exception:
+            # Pickling arbitrary objects can fail in all sorts of ways
+            pass
+
+    def stats(self):
+        ''' :: RDict
+        Hits and misses for this function in this process
+        '''
+        return RDict(hits=self.hits, misses=self.misses)
@@ -1,80 +1,66 @@
 import sys
+import threading
 import traceback
-from collections import Container, Counter
-
-from pygments.token import Token
-
-from prompt_toolkit.keys import Keys
-from prompt_toolkit.document import Document
-from prompt_toolkit.filters import IsDone, Filter
-from prompt_toolkit.history import InMemoryHistory
-from prompt_toolkit.layout.lexers import PygmentsLexer
-from prompt_toolkit.interface import CommandLineInterface
-from prompt_toolkit.contrib.completers import WordCompleter
-from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
-from prompt_toolkit.key_binding.manager import KeyBindingManager
-from prompt_toolkit.validation import Validator, ValidationError
-from prompt_toolkit.clipboard.pyperclip import PyperclipClipboard
-from prompt_toolkit.layout.processors import \
-    ConditionalProcessor, HighlightMatchingBracketProcessor
-from prompt_toolkit.shortcuts import \
-        create_prompt_application, create_output, create_eventloop
+from types import MappingProxyType
+from collections import deque
 
 from ripl.backend import Reader
-from ripl.bases import Symbol, EmptyList, RList, Func, nested_scope, Scope
-from ripl.repl_utils import RiplLexer, ripl_style
+from ripl.bases import Symbol, EmptyList, RList, RDict, Func, GenFunc, \
+    nested_scope, Scope, Overlay, LazyDef, Memoised, MISS, lookup_dotted
+from ripl.nodes import Node, Literal, Empty, SymRef, Quote, Quasiquote, \
+    If, Define, Set, Defn, Defstage, Defgen, Yield, YieldFrom, Lambda, \
+    Eval, Index, Call, Attr, MethodCall, Future, analyse
 from ripl.bases import get_global_scope
+from ripl.arrays import is_array
 
 import ripl.prelude as prelude
+import ripl.compiler as compiler
+import ripl.arrays as arrays
+import ripl.utils as utils
+from ripl.stats import InterpStats, Watchers
 
 
-def is_balanced(text):
-    '''Check that () {} [] are all matched'''
-    c = Counter(text)
-    return all([c['('] == c[')'], c['{'] == c['}'], c['['] == c[']']])
+# Number of calls from Python before a Func is compiled (None disables)
+HOT_THRESHOLD = 100
+JIT_EVENT_LOG_SIZE = 256
 
+# Continuation frame tags for Evaluator.eval_stackless
+_CALL_FRAME, _IF_FRAME, _SET_FRAME, _EVAL_FRAME, _MEMO_FRAME = range(5)
+# Returned by Evaluator._simple_call for calls that need the main loop
+_FUNC = object()
 
-class ParenValidator(Validator):
-    '''
-    Check that the input has balanced parens/brackets/braces
-    '''
-    def validate(self, document):
-        balanced = is_balanced(document.text)
-        if not balanced:
-            raise ValidationError(
-                message='Unclosed expression in input',
-                cursor_position=len(document.text))
+# Read-only base scopes shared by every Evaluator: {use_prelude: scope}
+_BASE_SCOPES = {}
 
 
-class Tab_to_whitespace(Filter):
-    '''
-    Insert whitespace rather than autocomplete when there is nothing
-    to complete.
+def _is_table(value):
+    '''Without importing ripl.table if nothing has made a Table yet'''
+    table = sys.modules.get('ripl.table')
+    return table is not None and isinstance(value, table.Table)
+
+
+def base_scope(use_prelude=True):
+    ''' :: bool -> MappingProxyType
+    The builtins, operators and (optionally) prelude functions that every
+    Evaluator starts with. This is built once per process and can't be
+    modified: each Evaluator puts its own definitions in a Scope in front
+    of it, so creating one is cheap and `define`/`set` can't leak between
+    evaluators.
     '''
-    def __call__(self, cli):
-        b = cli.current_buffer
-        before_cursor = b.document.current_line_before_cursor
-
-        return b.text and (not before_cursor or before_cursor.isspace())
-
-
-def newline_and_indent(buf):
-    '''Insert a new line and handle indenting based on input so far'''
-    if buf.document.current_line_after_cursor:
-        # Cursor is in the middle of a line: always insert a new line
-        buf.insert_text('\n')
-    else:
-        # Cursor is at the end of a line so add a new line and
-        # work out how far we need to indent.
-        buf.insert_text('\n')
-        # If we are indenting, we are unbalanced so find out
-        # how many open expressions are in the current buffer.
-        indent = 0
-        c = Counter(buf.document.text)
-        indent += (c.get('(', 0) - c.get(')', 0))
-        indent += (c.get('[', 0) - c.get(']', 0))
-        indent += (c.get('{', 0) - c.get('}', 0))
-        buf.insert_text('  ' * indent)
+    base = _BASE_SCOPES.get(use_prelude)
+    if base is None:
+        defs = dict(get_global_scope())
+        if use_prelude:
+            names = dict(vars(prelude))
+            for module, lazy in prelude.LAZY.items():
+                names.update({k: LazyDef(module, k) for k in lazy})
+            defs.update({Symbol(k): v for k, v in names.items()})
+            # LISPy names for snake_case prelude functions: read-csv
+            defs.update({Symbol(k.replace('_', '-')): v
+                         for k, v in names.items()
+                         if '_' in k and not k.startswith('_')})
+        base = _BASE_SCOPES[use_prelude] = MappingProxyType(defs)
+    return base
 
 
 class Evaluator:
@@ -83,15 +69,107 @@ class Evaluator:
         Not sure whether to call it a compiler or not as it
         should eventually be able to output .py and .pyc
     '''
-    def __init__(self, use_prelude=True):
-        self.global_scope = get_global_scope()
-        if use_prelude:
-            funcs = {Symbol(k): v for k, v in vars(prelude).items()}
-            self.global_scope.update(funcs)
+    def __init__(self, use_prelude=True, stackless=False,
+                 hot_threshold=HOT_THRESHOLD):
+        # Held while publishing a definition so that concurrent ones can't
+        # lose an epoch bump (see ripl.threads)
+        self.lock = threading.RLock()
+        # Definitions go in our own overlay in front of the shared base
+        self.global_scope = Scope(
+            Overlay(base_scope(use_prelude), self.lock))
+        # These work on this evaluator's globals
+        self.global_scope.update({
+            Symbol('apply'): self._apply,
+            Symbol('save-image'): self.save_image,
+            Symbol('load-image'): self.load_image,
+            Symbol('interp-stats'): self.interp_stats,
+            Symbol('pyimport'): self.pyimport})
 
         self.reader = Reader()
         self.syntax = Scope()
 
+        # Hot Func promotion (see ripl.compiler). `epoch` is bumped by
+        # every definition so that compiled code can check its guards.
+        self.hot_threshold = hot_threshold
+        self.jit_events = deque(maxlen=JIT_EVENT_LOG_SIZE)
+        self.epoch = 0
+
+        # What `run_dag` did with each stage (see ripl.dag)
+        self.dag_events = deque(maxlen=JIT_EVENT_LOG_SIZE)
+
+        # The Budget for the evaluation in progress, if any (see
+        # ripl.budget) and InterpStats if enabled (see ripl.stats).
+        # `watch` is whichever of them are set: it sees every step.
+        self.budget = None
+        self.stats = None
+        self.watch = None
+
+        if stackless:
+            # Recursion depth is bounded by memory rather than the
+            # Python recursion limit. See `eval_stackless`.
+            self.eval = self.eval_stackless
+
+    def _apply(self, x, xs):
+        return self.global_scope[x](xs)
+
+    def save_image(self, path):
+        ''' :: str -> List[Symbol]
+        Save everything defined in this evaluator to `path` so that it
+        can be loaded without re-running the source (see ripl.image).
+        Returns the symbols that couldn't be saved.
+        '''
+        from ripl.image import save_image
+        return RList(save_image(self, path))
+
+    def load_image(self, path):
+        ''' :: str -> None
+        Load the definitions from an image saved by `save_image`
+        '''
+        from ripl.image import load_image
+        load_image(path, self)
+
+    def pyimport(self, module, _as=None):
+        ''' :: str, str -> None
+        (pyimport "numpy" "np"): bind a Python module so that its
+        attributes can be used as np.mean etc. The module isn't imported
+        until one of them is used (see ripl.utils.ModuleProxy).
+        '''
+        with self.lock:
+            utils.pyimport(str(module), self.global_scope,
+                           _as=str(_as) if _as else None)
+            self.epoch += 1
+
+    def _update_watch(self):
+        watchers = [w for w in (self.stats, self.budget) if w is not None]
+        if len(watchers) > 1:
+            self.watch = Watchers(*watchers)
+        else:
+            self.watch = watchers[0] if watchers else None
+
+    def enable_stats(self):
+        ''' :: -> InterpStats
+        Start counting what the interpreter does (see ripl.stats)
+        '''
+        if self.stats is None:
+            self.stats = InterpStats()
+            self.stats.wrap_reader(self.reader)
+            self._update_watch()
+        return self.stats
+
+    def disable_stats(self):
+        if self.stats is not None:
+            self.stats = None
+            self.reader = Reader()
+            self._update_watch()
+
+    def interp_stats(self):
+        ''' :: -> RDict
+        The interpreter's counters, if enabled (see ripl.stats)
+        '''
+        if self.stats is None:
+            return RDict()
+        return self.stats.snapshot()
+
     def py_to_lisp_str(self, exp):
         '''
         Convert a Python object back into a Lisp-readable string for display.
@@ -111,182 +189,655 @@ class Evaluator:
         elif isinstance(exp, tuple):
             # (, 1 2 ... n)
             return '(,' + ' '.join(map(self.py_to_lisp_str, exp)) + ')'
+        elif is_array(exp):
+            # #f64[1.0 2.0 ... n]
+            return arrays.to_lisp_str(exp)
+        elif _is_table(exp):
+            # name:str  price:f64
+            # 'a'       1.5 ...
+            return exp.preview()
         else:
             return str(exp)
 
-    def eval(self, tkns, scope):
+    def _index(self, node):
+        '''
+        Containers are functions of Key/Index -> value so we allow
+        calling them as syntax for `get`:
+            (<CONTAINER> KEY/INDEX) -> VALUE
+        '''
+        return node.container.__getitem__(node.key)
+
+    def _attr(self, node, scope):
+        '''obj.attr...: see lookup_dotted in ripl.bases'''
+        try:
+            return lookup_dotted(scope, node.form, node.obj.sym, node.attrs)
+        except KeyError:
+            raise NameError('symbol {} is not defined'.format(node.form))
+
+    def _method_call(self, node, scope):
+        '''(.method obj args...) for the recursive evaluator'''
+        vals = []
+        for arg in (node.obj,) + node.args:
+            arg_cls = arg.__class__
+            if arg_cls is Literal:
+                vals.append(arg.value)
+            elif arg_cls is SymRef:
+                try:
+                    vals.append(scope[arg.sym])
+                except KeyError:
+                    raise NameError(
+                        'symbol {} is not defined'.format(arg.sym))
+            else:
+                vals.append(self.eval(arg, scope))
+        # The node caches the method for the type of the object
+        return node(*vals)
+
+    def _quasiquote(self, exp, scope):
+        '''
+        Splice in any unquoted (~) or unquote-spliced (~@) expressions
+        and return the result without evaluating it.
+        TODO: check that this works!
+        '''
+        if len(exp) == 1:
+            return exp  # [Symbol('quote'), args[0]]
+        rep = []
+        iter_exp = iter(exp)
+        for element in iter_exp:
+            if element == Symbol('~'):
+                # Unquote s-expression
+                unquoted = next(iter_exp)
+                rep.append(self.eval(unquoted, scope))
+            elif element == Symbol('~@'):
+                # Unquote and splice s-expression
+                unquoted = next(iter_exp)
+                try:
+                    expression = self.eval(unquoted, scope)
+                except TypeError:
+                    expression = unquoted
+                if not isinstance(expression, RList):
+                    raise SyntaxError('Can only use ~@ on an expression')
+                for atom in expression:
+                    rep.append(atom)
+            else:
+                rep.append(element)
+        return RList(rep)
+
+    def _define(self, node, scope):
+        '''Attempt to define a new symbol, fails if it is already defined'''
+        if scope.get(node.name):
+            raise SyntaxError('use set! to modify a stored symbol')
+
+    def _publish(self, scope, name, value, define=None):
+        '''
+        Bind a name and bump the epoch as one step. `define` is the
+        Define node if the name has to be new: the check is made again
+        as another thread may have got there first.
+        '''
+        with self.lock:
+            if define is not None:
+                self._define(define, scope)
+            scope[name] = value
+            self.epoch += 1
+
+    def _bump_epoch(self):
+        with self.lock:
+            self.epoch += 1
+
+    def _future(self, node, scope):
+        '''
+        (future expr): evaluate expr on the shared thread pool, giving a
+        concurrent.futures.Future (see `deref`). Definitions made by expr
+        go in a scope of its own.
+        '''
+        from ripl.threads import executor
+        return executor().submit(self.eval, node.expr, scope.new_child())
+
+    def _defn(self, node, scope):
+        '''
+        (defn foo
+         \"\"\"do that voodoo that foo do\"\"\"
+         (body ...))
+        '''
+        func = Func(node.params, node.doc, node.body, scope, self,
+                    name=node.name)
+        if node.kind == 'memo':
+            # (defn/memo ...): recursive calls go through the cache too
+            from ripl.memo import MemoFunc
+            func = MemoFunc(func)
+        elif node.kind == 'cached':
+            # (defn/cached ...): results are kept on disk between runs
+            from ripl.diskcache import CachedFunc
+            func = CachedFunc(func)
+        self._publish(scope, node.name, func)
+        return None
+
+    def _defstage(self, node, scope):
+        '''
+        (defstage clean
+         """drop the junk"""
+         (raw) (body ...))
+        '''
+        from ripl.dag import Stage
+        stage = Stage(node.name, node.inputs, node.doc, node.body, scope,
+                      self)
+        self._publish(scope, node.name, stage)
+        return None
+
+    def _defgen(self, node, scope):
+        '''
+        (defgen naturals
+         """0, 1, 2..."""
+         (n) (yield n) (yield-from (naturals (+ n 1))))
+        '''
+        func = GenFunc(node.params, node.doc, node.body, scope, self,
+                       name=node.name)
+        self._publish(scope, node.name, func)
+        return None
+
+    def generate(self, func, args):
+        '''
+        Run the body of a GenFunc as a Python generator.
+        Statements are evaluated in order: `(yield x)` and
+        `(yield-from xs)` hand values out and `if` picks the branch to run
+        as a statement, so branches can yield too. Any other statement is
+        evaluated for its side effects.
+        `(yield-from (self args...))` as the final statement starts the
+        body again with the new arguments rather than nesting another
+        generator, so infinite streams run in constant space.
+        '''
+        scope = nested_scope(func.scope, func.args, args)
+        while True:
+            args = yield from self._gen_block(func, func.body, scope, True)
+            if args is None:
+                return
+            scope = nested_scope(func.scope, func.args, args)
+
+    def _gen_block(self, func, body, scope, tail):
+        '''Run statements, returning the args of a tail call to func'''
+        last = len(body) - 1
+        for i, node in enumerate(body):
+            cls = node.__class__
+            if cls is Yield:
+                yield self.eval(node.expr, scope)
+            elif cls is YieldFrom:
+                if tail and i == last:
+                    args = self._self_call(func, node.expr, scope)
+                    if args is not None:
+                        return args
+                yield from self.eval(node.expr, scope)
+            elif cls is If:
+                branch = node.then if self.eval(node.test, scope) \
+                    else node.orelse
+                args = yield from self._gen_block(
+                    func, (branch,), scope, tail and i == last)
+                if args is not None:
+                    return args
+            else:
+                self.eval(node, scope)
+        return None
+
+    def _self_call(self, func, node, scope):
+        '''The evaluated arguments if node is a call to func'''
+        if node.__class__ is not Call or node.func.__class__ is not SymRef:
+            return None
+        if scope.get(node.func.sym) is not func:
+            return None
+        return [self.eval(arg, scope) for arg in node.args]
+
+    def promote(self, func):
+        ''' :: Func -> bool
+        Attempt to compile a hot Func. Promotions, rejections and deopts
+        are logged to `self.jit_events` as (event, name, detail) tuples.
+        '''
+        if self.budget is not None:
+            # Compiled code doesn't count its steps: try again next call
+            func.calls -= 1
+            return False
+        return compiler.promote(func)
+
+    def _eval_within(self, budget, node, scope):
+        '''Evaluate with `budget` in force'''
+        outer = self.budget
+        self.budget = budget
+        self._update_watch()
+        # Compiled Funcs check the epoch on entry: this sends them back
+        # to the interpreter while the budget is in force.
+        self._bump_epoch()
+        budget.start()
+        try:
+            return self.eval(node, scope)
+        finally:
+            budget.stop()
+            self.budget = outer
+            self._update_watch()
+
+    def eval(self, node, scope, budget=None, memos=None):
         '''
         Try to evaluate an expression in a given scope.
+        Expressions are syntax trees from `Reader.parse`: anything else
+        (raw data from Python or `eval`) is analysed first.
+        If a Budget is given, BudgetExceeded is raised if evaluation goes
+        over it (see ripl.budget).
+        `memos` is only passed by _memo_call.
         NOTE: Special language features and syntax found here.
         '''
+        if budget is not None:
+            return self._eval_within(budget, node, scope)
+        if not isinstance(node, Node):
+            node = analyse(node)
+
+        watch = self.watch
         while True:
-            if isinstance(tkns, RList):
-                # Internal representation of an s-expression
-                if tkns == EmptyList():
-                    return EmptyList()
-                elif isinstance(tkns[0], Container):
-                    if len(tkns) == 2:
-                        # Containers are functions of Key/Index -> value so
-                        # we allow calling them as syntax for `get`
-                        # (<CONTAINER> KEY/INDEX) -> VALUE
-                        if isinstance(tkns[0], RList):
-                            if tkns[0][0] == Symbol('quote'):
-                                raise SyntaxError(
-                                        'Cannot index into quoted list')
-                        return tkns[0].__getitem__(tkns[1])
-                    else:
-                        raise SyntaxError('Invalid function call')
+            if watch is not None:
+                watch.step(node, scope)
+            cls = node.__class__
+            if cls is SymRef:
+                try:
+                    return scope[node.sym]
+                except KeyError:
+                    raise NameError(
+                            'symbol {} is not defined'.format(node.sym))
+            elif cls is Literal:
+                return node.value
+            elif cls is Call:
+                func = node.func
+                if func.__class__ is SymRef:
+                    # Named functions don't need a trip through eval
+                    try:
+                        proc = scope[func.sym]
+                    except KeyError:
+                        raise NameError(
+                            'symbol {} is not defined'.format(func.sym))
                 else:
-                    # This is a call
-                    # NOTE: This args always a list:
-                    #       (foo 1 2 3)   -> foo, [1,2,3]
-                    #       (foo 1)       -> foo, [1]
-                    #       (foo (1 2 3)) -> foo, [(1,2,3)]
-                    call, *args = tkns
-
-                    if call == Symbol('quote'):
-                        # Return the argument without evaluation
-                        return args[0]
-                    elif call == Symbol('quasiquote'):
-                        # TODO: check that this works!
-                        # Splice is unquoted args and then return
-                        # without evaluating
-                        exp = args[0]
-                        if len(exp) == 1:
-                            return exp  # [Symbol('quote'), args[0]]
-                        else:
-                            rep = []
-                            iter_exp = iter(exp)
-                            for element in iter_exp:
-                                if element == Symbol('~'):
-                                    # Unquote s-expression
-                                    unquoted = next(iter_exp)
-                                    rep.append(self.eval(unquoted, scope))
-                                elif element == Symbol('~@'):
-                                    # Unquote and splice s-expression
-                                    unquoted = next(iter_exp)
-                                    try:
-                                        expression = self.eval(unquoted, scope)
-                                    except TypeError:
-                                        expression = unquoted
-                                    if not isinstance(expression, RList):
-                                        raise SyntaxError(
-                                            'Can only use ~@ on an expression')
-                                    for atom in expression:
-                                        rep.append(atom)
-                                else:
-                                    rep.append(element)
-                            return RList(rep)
-                    elif call == Symbol('define'):
-                        # Attempt to define a new symbol, fails if the
-                        # symbol is already defined
-                        name, expression = args
-                        if scope.get(name):
-                            raise SyntaxError(
-                                    'use set! to modify a stored symbol')
-                        scope[name] = self.eval(expression, scope)
-                        return None
-                    elif call == Symbol('defn'):
-                        # (defn foo
-                        #  """do that voodoo that foo do"""
-                        #  (body ...))
-                        # handle function definitions
-                        if len(args) == 4:
-                            docstring = args.pop(1)
-                        else:
-                            docstring = None
-                        name, args, body = args
-                        scope[name] = Func(args, docstring, body, scope, self)
-                        return None
-                    elif call == Symbol('defmacro'):
-                        # handle macro definitions
-                        raise SyntaxError("haven't finished macros!")
-                    elif call == Symbol('set'):
-                        # dame as define but allow mutation
-                        name, expression = args
-                        scope[name] = self.eval(expression, scope)
-                        return None
-                    elif call == Symbol('if'):
-                        # handle both forms of if
-                        # if/elif... will be replaced with a cond macro
-                        if len(args) == 3:
-                            test, _true, _false = args
-                        elif len(args) == 2:
-                            test, _true = args
-                            _false = None
-                        tkns = _true if self.eval(test, scope) else _false
-                    elif call == Symbol('eval'):
-                        # evaluate a quoted expression
-                        tokens = args[0]
-                        if isinstance(tokens, list):
-                            # tokens are [quote, [ ... ]]
-                            return self.eval(tokens[1], scope)
-                        else:
-                            # single token is a symbol, try to look it up
-                            try:
-                                _val = scope[tokens]
-                            except AttributeError:
-                                raise NameError(
-                                    'undefined symbol {}'.format(tokens)
-                                    )
-                            tkns = self.eval(_val, scope)
-                    elif call == Symbol('lambda'):
-                        # make a procedure
-                        bindings, body = args
-                        return Func(bindings, 'anonymous lambda', body,
-                                    scope, self)
+                    proc = self.eval(func, scope)
+                # Literals and symbols are common enough as arguments to
+                # be worth resolving here rather than recursing.
+                args = []
+                for arg in node.args:
+                    arg_cls = arg.__class__
+                    if arg_cls is Literal:
+                        args.append(arg.value)
+                    elif arg_cls is SymRef:
+                        try:
+                            args.append(scope[arg.sym])
+                        except KeyError:
+                            raise NameError(
+                                'symbol {} is not defined'.format(arg.sym))
                     else:
-                        func, *arg_vals = tkns
-                        proc = self.eval(func, scope)
-                        args = [self.eval(exp, scope) for exp in arg_vals]
-                        if isinstance(proc, Func):
-                            # A ripl Func with a body we can extract to allow
-                            # tail calls
-                            tkns = proc.body
-                            scope = nested_scope(proc.scope, proc.args, args)
-                        else:
-                            # Evaluate
-                            return proc(*args)
+                        args.append(self.eval(arg, scope))
+                if isinstance(proc, Func):
+                    # A ripl Func with a body we can extract to allow
+                    # tail calls
+                    if watch is not None:
+                        watch.call(proc, node)
+                    node = proc.body
+                    scope = nested_scope(proc.scope, proc.args, args)
+                elif isinstance(proc, Memoised):
+                    key, val = proc.lookup(tuple(args))
+                    if val is not MISS:
+                        return val
+                    func = proc.func
+                    if not isinstance(func, Func):
+                        val = func(*args)
+                        proc.remember(key, val)
+                        return val
+                    if watch is not None:
+                        watch.call(func, node)
+                    if memos is None:
+                        return self._memo_call(proc, key, func, args)
+                    # A tail call from a memoised body: it gives the same
+                    # result so we can run it here and remember both.
+                    memos.append((proc, key))
+                    node = func.body
+                    scope = nested_scope(func.scope, func.args, args)
+                else:
+                    # Evaluate
+                    return proc(*args)
+            elif cls is If:
+                node = node.then if self.eval(node.test, scope) \
+                    else node.orelse
+            elif cls is Empty:
+                return EmptyList()
+            elif cls is Quote:
+                # Return the argument without evaluation
+                return node.datum
+            elif cls is Quasiquote:
+                return self._quasiquote(node.datum, scope)
+            elif cls is Define:
+                self._define(node, scope)
+                self._publish(scope, node.name, self.eval(node.value, scope),
+                              node)
+                return None
+            elif cls is Set:
+                # same as define but allow mutation
+                self._publish(scope, node.name, self.eval(node.value, scope))
+                return None
+            elif cls is Defn:
+                return self._defn(node, scope)
+            elif cls is Defstage:
+                return self._defstage(node, scope)
+            elif cls is Lambda:
+                # make a procedure
+                return Func(node.params, 'anonymous lambda', node.body,
+                            scope, self)
+            elif cls is Eval:
+                # evaluate an expression that evaluates to a form
+                node = analyse(self.eval(node.expr, scope))
+            elif cls is Index:
+                return self._index(node)
+            elif cls is Attr:
+                return self._attr(node, scope)
+            elif cls is MethodCall:
+                return self._method_call(node, scope)
+            elif cls is Defgen:
+                return self._defgen(node, scope)
+            elif cls is Future:
+                return self._future(node, scope)
+            elif cls is Yield or cls is YieldFrom:
+                raise SyntaxError('{} outside of a defgen body: {}'.format(
+                    node.form[0], node.form))
+            else:
+                raise SyntaxError('unknown syntax: {}'.format(node))
+
+    def _memo_call(self, proc, key, func, args):
+        '''
+        Evaluate the body of a memoised Func for a cache miss and remember
+        the result. Memoised calls from the tail of the body are evaluated
+        in the same loop and their results remembered here as well, so
+        that they don't use up the Python stack.
+        '''
+        memos = [(proc, key)]
+        val = self.eval(func.body, nested_scope(func.scope, func.args, args),
+                        None, memos)
+        for proc, key in memos:
+            proc.remember(key, val)
+        return val
+
+    def _memo_lookup(self, proc, args, stack):
+        '''
+        Call a Memoised function for eval_stackless. On a miss on a Func
+        this pushes a frame to remember the result and gives _FUNC: the
+        caller evaluates the body.
+        '''
+        key, val = proc.lookup(tuple(args))
+        if val is MISS:
+            func = proc.func
+            if isinstance(func, Func):
+                stack.append((_MEMO_FRAME, proc, key))
+                return _FUNC
+            val = func(*args)
+            proc.remember(key, val)
+        return val
+
+    def _simple_call(self, node, scope):
+        '''
+        Make a simple Call (see ripl.nodes.Call) for eval_stackless. Calls
+        to ripl Funcs (and Memoised functions) give _FUNC as their bodies
+        have to be evaluated in the main loop.
+        '''
+        try:
+            proc = scope[node.func.sym]
+        except KeyError:
+            raise NameError('symbol {} is not defined'.format(node.func.sym))
+        if isinstance(proc, (Func, Memoised)):
+            return _FUNC
+        args = []
+        for arg in node.args:
+            if arg.__class__ is Literal:
+                args.append(arg.value)
             else:
-                # This is an atom: a symbol or a built-in type
-                # Check to see if we have it in the current scope.
                 try:
-                    return scope[tkns]
+                    args.append(scope[arg.sym])
                 except KeyError:
-                    # We just tried to perform lookup on None:
-                    # --> tkns is not a known symbol
-                    if isinstance(tkns, Symbol):
-                        raise NameError(
-                                 'symbol {} is not defined'.format(tkns))
+                    raise NameError(
+                        'symbol {} is not defined'.format(arg.sym))
+        return proc(*args)
+
+    def eval_stackless(self, node, scope, budget=None):
+        '''
+        Evaluate an expression using an explicit continuation stack in place
+        of the Python call stack (a CEK machine: Control, Environment and
+        Kontinuation).
+            - Sub-expressions that need evaluating before we can continue
+              (call heads and arguments, `if` tests and the values for
+              `define`/`set`) push a frame onto `stack` describing what to
+              do with the result.
+            - Calls to ripl Funcs replace the control expression with the
+              body of the function and push nothing, so tail calls (mutual
+              or otherwise) run in constant space.
+            - Cache misses on memoised Funcs push a frame that remembers
+              the result and then carry on into the body in the same way.
+        Recursion depth is bounded only by available memory.
+        NOTE: Python callables that call back into ripl (`map` etc) still
+              re-enter the evaluator through `Func.__call__`.
+        '''
+        if budget is not None:
+            return self._eval_within(budget, node, scope)
+        if not isinstance(node, Node):
+            node = analyse(node)
+
+        watch = self.watch
+        stack = []
+        while True:
+            if watch is not None:
+                watch.step(node, scope)
+            # Reduce the control expression: either we get a value or we
+            # push a frame and move on to a sub-expression.
+            cls = node.__class__
+            if cls is SymRef:
+                try:
+                    val = scope[node.sym]
+                except KeyError:
+                    raise NameError(
+                            'symbol {} is not defined'.format(node.sym))
+            elif cls is Literal:
+                val = node.value
+            elif cls is Call:
+                func = node.func
+                if func.__class__ is not SymRef:
+                    # Evaluate the head and then each argument in turn,
+                    # collecting the results in the frame.
+                    stack.append([_CALL_FRAME, node.args, 0, [], scope,
+                                  node])
+                    node = func
+                    continue
+                # Named functions: resolve the head and as many arguments
+                # as we can here (as eval does), only pushing a frame if
+                # an argument needs a trip round the loop.
+                try:
+                    proc = scope[func.sym]
+                except KeyError:
+                    raise NameError(
+                        'symbol {} is not defined'.format(func.sym))
+                args = []
+                pending = None
+                for idx, arg in enumerate(node.args):
+                    arg_cls = arg.__class__
+                    if arg_cls is Literal:
+                        args.append(arg.value)
+                    elif arg_cls is SymRef:
+                        try:
+                            args.append(scope[arg.sym])
+                        except KeyError:
+                            raise NameError(
+                                'symbol {} is not defined'.format(arg.sym))
+                    elif arg_cls is Call and arg.simple:
+                        if watch is not None:
+                            watch.step(arg, scope)
+                        arg_val = self._simple_call(arg, scope)
+                        if arg_val is _FUNC:
+                            pending = arg
+                            break
+                        args.append(arg_val)
+                    else:
+                        pending = arg
+                        break
+                if pending is not None:
+                    args.insert(0, proc)
+                    stack.append([_CALL_FRAME, node.args, idx + 1, args,
+                                  scope, node])
+                    node = pending
+                    continue
+                if isinstance(proc, Func):
+                    # Tail call: no frame needed
+                    if watch is not None:
+                        watch.call(proc, node)
+                    node = proc.body
+                    scope = nested_scope(proc.scope, proc.args, args)
+                    continue
+                elif isinstance(proc, Memoised):
+                    val = self._memo_lookup(proc, args, stack)
+                    if val is _FUNC:
+                        func = proc.func
+                        if watch is not None:
+                            watch.call(func, node)
+                        node = func.body
+                        scope = nested_scope(func.scope, func.args, args)
+                        continue
+                else:
+                    val = proc(*args)
+            elif cls is If:
+                test = node.test
+                if test.__class__ is Call and test.simple:
+                    # Tests like (== n 0) are common enough to make in
+                    # place when they don't call a ripl Func.
+                    if watch is not None:
+                        watch.step(test, scope)
+                    val = self._simple_call(test, scope)
+                    if val is not _FUNC:
+                        node = node.then if val else node.orelse
+                        continue
+                stack.append((_IF_FRAME, node.then, node.orelse, scope))
+                node = test
+                continue
+            elif cls is Empty:
+                val = EmptyList()
+            elif cls is Quote:
+                val = node.datum
+            elif cls is Quasiquote:
+                val = self._quasiquote(node.datum, scope)
+            elif cls is Define or cls is Set:
+                if cls is Define:
+                    self._define(node, scope)
+                stack.append((_SET_FRAME, node.name, scope,
+                              node if cls is Define else None))
+                node = node.value
+                continue
+            elif cls is Defn:
+                val = self._defn(node, scope)
+            elif cls is Defstage:
+                val = self._defstage(node, scope)
+            elif cls is Lambda:
+                val = Func(node.params, 'anonymous lambda', node.body,
+                           scope, self)
+            elif cls is Eval:
+                stack.append((_EVAL_FRAME, scope))
+                node = node.expr
+                continue
+            elif cls is Index:
+                val = self._index(node)
+            elif cls is Attr:
+                val = self._attr(node, scope)
+            elif cls is MethodCall:
+                # A call with the node itself in place of the function
+                # (it finds and caches the method) and the object as the
+                # first argument
+                stack.append([_CALL_FRAME, node.args, 0, [node], scope,
+                              node])
+                node = node.obj
+                continue
+            elif cls is Defgen:
+                val = self._defgen(node, scope)
+            elif cls is Future:
+                val = self._future(node, scope)
+            elif cls is Yield or cls is YieldFrom:
+                raise SyntaxError('{} outside of a defgen body: {}'.format(
+                    node.form[0], node.form))
+            else:
+                raise SyntaxError('unknown syntax: {}'.format(node))
+
+            # Pass the value on to the most recent continuation frame.
+            # Frames either complete (and we keep unwinding) or give us a
+            # new control expression to reduce.
+            while stack:
+                frame = stack[-1]
+                kind = frame[0]
+                if kind is _CALL_FRAME:
+                    _, args, idx, vals, fscope, call = frame
+                    vals.append(val)
+                    # Literals and symbols can be resolved in place
+                    # without a trip round the main loop.
+                    pending = None
+                    while idx < len(args):
+                        arg = args[idx]
+                        idx += 1
+                        arg_cls = arg.__class__
+                        if arg_cls is Literal:
+                            vals.append(arg.value)
+                        elif arg_cls is SymRef:
+                            try:
+                                vals.append(fscope[arg.sym])
+                            except KeyError:
+                                raise NameError(
+                                    'symbol {} is not defined'.format(
+                                        arg.sym))
+                        elif arg_cls is Call and arg.simple:
+                            if watch is not None:
+                                watch.step(arg, fscope)
+                            arg_val = self._simple_call(arg, fscope)
+                            if arg_val is _FUNC:
+                                pending = arg
+                                break
+                            vals.append(arg_val)
+                        else:
+                            pending = arg
+                            break
+                    if pending is not None:
+                        frame[2] = idx
+                        node, scope = pending, fscope
+                        break
+
+                    stack.pop()
+                    proc, *args = vals
+                    if isinstance(proc, Func):
+                        # Tail call: no frame needed
+                        if watch is not None:
+                            watch.call(proc, call)
+                        node = proc.body
+                        scope = nested_scope(proc.scope, proc.args, args)
+                        break
+                    elif isinstance(proc, Memoised):
+                        val = self._memo_lookup(proc, args, stack)
+                        if val is _FUNC:
+                            func = proc.func
+                            if watch is not None:
+                                watch.call(func, call)
+                            node = func.body
+                            scope = nested_scope(func.scope, func.args,
+                                                 args)
+                            break
                     else:
-                        # It's a value
-                        return tkns
-
-
-class REPL(Evaluator):
-    completions = (
-            'define defn lambda if for-each quote yield yield-from'
-            ' apply append begin car cdr cons not vector eq? equal?'
-            ' callable? null? symbol? dict? tuple? list? vector?'
-            ' int? float? number? complex? eval').split()
-    completions.extend([
-            'getattr', 'str', 'property', 'license', 'divmod', 'object',
-            'issubclass', 'all', 'exit', 'None', 'format', 'set', 'slice',
-            'max', 'complex', 'chr', 'id', 'reversed', 'SystemExit', 'hex',
-            'True', 'type', 'len', 'open', 'bool', 'dict', 'next', 'bytes',
-            'Exception', 'min', 'hasattr', 'range', 'Ellipsis', 'any',
-            'abs', 'round', 'compile', 'quit', 'staticmethod', 'float',
-            'eval', 'credits', 'exec', 'memoryview', 'delattr', 'dir',
-            'ord', 'print', 'callable', 'bytearray', 'sum', 'bin',
-            'frozenset', 'StopAsyncIteration', 'vars', 'repr', 'globals',
-            'oct', 'pow', 'sorted', 'tuple', 'filter', 'isinstance', 'int',
-            'zip', 'setattr', 'input', 'help', 'hash', 'enumerate',
-            'False', 'locals', 'list', 'map', 'ascii', 'super', 'iter'
-            ])
-
-    def cont_tokens(self, cli, width):
-        '''For use with multiline input when I get that working...'''
-        return [(Token, '~' * (width - 1) + ' ')]
+                        val = proc(*args)
+                elif kind is _IF_FRAME:
+                    stack.pop()
+                    node = frame[1] if val else frame[2]
+                    scope = frame[3]
+                    break
+                elif kind is _SET_FRAME:
+                    stack.pop()
+                    self._publish(frame[2], frame[1], val, frame[3])
+                    val = None
+                elif kind is _MEMO_FRAME:
+                    # The body of a memoised Func has been evaluated
+                    stack.pop()
+                    frame[1].remember(frame[2], val)
+                else:
+                    # _EVAL_FRAME: evaluate the result in the saved scope
+                    stack.pop()
+                    node, scope = analyse(val), frame[1]
+                    break
+            else:
+                return val
 
     def eval_and_print(self, exp):
         '''
@@ -314,95 +865,41 @@ class REPL(Evaluator):
             finally:
                 last_tb, excinf = None, None
 
-    def read(self, prompt_str='λ く'):
-        '''
-        The main read eval print loop for RIPL.
-        Uses prompt_toolkit:
-            http://python-prompt-toolkit.readthedocs.io/en/stable/
-        '''
-        def exit_message():
-            print('\nThanks for giving RIPL a try!\nさようなら!\n')
-
-        if not self.global_scope:
-            raise EnvironmentError('Things have gone horribly wrong...')
-
-        print(' <({[ RIPL -- RIPL Is Pythonic Lisp ]})>\n'
-              '    Ctrl-Space to enter selection mode.\n'
-              '    Ctrl-W/Y to cut/paste to system clipboard.\n'
-              '    Ctrl-D to exit\n')
-
-        history = InMemoryHistory()
-        completer = WordCompleter(self.completions, ignore_case=True)
-        kbm = KeyBindingManager.for_prompt(enable_system_bindings=True)
-        add_binding = kbm.registry.add_binding
-
-        @add_binding(Keys.Tab, filter=Tab_to_whitespace())
-        def _(event):
-            '''Either indent or do completion'''
-            event.cli.current_buffer.insert_text('  ')
-
-        @add_binding(Keys.ControlJ)
-        def __(event):
-            '''Either enter a newline or accept input based on context'''
-            b = event.current_buffer
-            txt = b.document.text
-
-            def at_end(b):
-                '''Is the cursor at the end of the buffer?'''
-                text = b.document.text_after_cursor
-                return text == '' or (text.isspace() and '\n' not in text)
-
-            at_end = at_end(b)
-            has_empty_line = txt.replace(' ', '').endswith('\n')
-            balanced = is_balanced(b.document.text)
-            if (at_end and has_empty_line) or balanced:
-                if b.validate():
-                    b.accept_action.validate_and_handle(event.cli, b)
-            else:
-                newline_and_indent(b)
-
-        # Show matching parentheses, but only while editing.
-        highlight_parens = ConditionalProcessor(
-            processor=HighlightMatchingBracketProcessor(
-                chars='[](){}'),
-            filter=~IsDone())
 
-        while True:
-            repl = create_prompt_application(
-                    prompt_str,
-                    multiline=True,
-                    history=history,
-                    style=ripl_style,
-                    mouse_support=True,
-                    completer=completer,
-                    validator=ParenValidator(),
-                    enable_history_search=True,
-                    complete_while_typing=False,
-                    clipboard=PyperclipClipboard(),
-                    lexer=PygmentsLexer(RiplLexer),
-                    key_bindings_registry=kbm.registry,
-                    display_completions_in_columns=True,
-                    auto_suggest=AutoSuggestFromHistory(),
-                    get_continuation_tokens=self.cont_tokens,
-                    extra_input_processors=[highlight_parens])
-
-            try:
-                eventloop = create_eventloop()
-                cli = CommandLineInterface(
-                    application=repl,
-                    eventloop=eventloop,
-                    output=create_output(true_color=True))
-
-                user_input = cli.run(reset_current_buffer=False)
-                if user_input:
-                    if isinstance(user_input, Document):
-                        user_input = user_input.text
-                    lines = user_input.split('\n')
-                    expression = ' '.join([l.strip() for l in lines])
-                    self.eval_and_print(expression)
-            except (EOFError, KeyboardInterrupt):
-                # User hit Ctl+d
-                exit_message()
-                break
-            finally:
-                eventloop.close()
+class ThreadSafeEvaluator(Evaluator):
+    '''
+    An Evaluator for sharing between threads (see ripl.threads).
+    The Budget in force and so what watches each step are per thread.
+    '''
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        Evaluator.__init__(self, *args, **kwargs)
+
+    @property
+    def budget(self):
+        return getattr(self._local, 'budget', None)
+
+    @budget.setter
+    def budget(self, budget):
+        self._local.budget = budget
+
+    @property
+    def watch(self):
+        budget = self.budget
+        if budget is None:
+            return self.stats
+        if self.stats is None:
+            return budget
+        return Watchers(self.stats, budget)
+
+    @watch.setter
+    def watch(self, watch):
+        # Worked out from the stats and this thread's budget when read
+        pass
+
+    def promote(self, func):
+        with self.lock:
+            if func.compiled is not None:
+                # Another thread got there first
+                return True
+            return Evaluator.promote(self, func)
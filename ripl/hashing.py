@@ -0,0 +1,109 @@
+'''
+Stable text forms of ripl code and data for content-addressed caches
+(see ripl.dag and ripl.diskcache).
+
+Printing isn't good enough for a cache key: strings lose their quotes,
+dict and set order can change between runs and large arrays are
+abbreviated. `canonical` avoids all of that and `source` gives the text of
+a Func along with everything it refers to, so that changing a helper
+function or constant changes the key of anything that uses it.
+'''
+import hashlib
+
+from .bases import Symbol, Keyword, RList, Func
+from .arrays import is_array
+
+# Values that are folded into a key when code refers to them
+CONSTANT_TYPES = (int, float, complex, bool, str, bytes, Keyword,
+                  type(None))
+
+
+def canonical(form, strict=False):
+    ''' :: datum, bool -> str
+    A stable text form of ripl data. If `strict`, anything other than
+    plain data (numbers, strings, containers of them, arrays...) is a
+    TypeError rather than falling back on its repr, which may not be the
+    same in the next process.
+    '''
+    if isinstance(form, Symbol):
+        return form.str
+    elif isinstance(form, RList):
+        return '(' + ' '.join(canonical(f, strict) for f in form) + ')'
+    elif isinstance(form, list):
+        return '[' + ' '.join(canonical(f, strict) for f in form) + ']'
+    elif isinstance(form, tuple):
+        return '(, ' + ' '.join(canonical(f, strict) for f in form) + ')'
+    elif isinstance(form, dict):
+        return '{' + ', '.join(sorted(
+            '{} {}'.format(canonical(k, strict), canonical(v, strict))
+            for k, v in form.items())) + '}'
+    elif isinstance(form, (set, frozenset)):
+        return '#{' + ' '.join(sorted(
+            canonical(f, strict) for f in form)) + '}'
+    elif isinstance(form, str):
+        return repr(str(form))
+    elif is_array(form):
+        digest = hashlib.sha256(form.tobytes()).hexdigest()
+        return '#{}{}[{}]'.format(form.dtype.str, form.shape, digest)
+    elif strict and not isinstance(form, CONSTANT_TYPES):
+        raise TypeError('no stable key for {}'.format(type(form).__name__))
+    return repr(form)
+
+
+def symbols(form):
+    '''Every symbol in a form'''
+    if isinstance(form, Symbol):
+        yield form
+    elif isinstance(form, (RList, list, tuple)):
+        for item in form:
+            for sym in symbols(item):
+                yield sym
+    elif isinstance(form, dict):
+        for pair in form.items():
+            for sym in symbols(pair):
+                yield sym
+
+
+def references(form, scope, skip=()):
+    ''' :: datum, Scope, Set[Symbol] -> Gen[str]
+    The source of the ripl functions and the values of the constants that
+    a form uses (and that those functions use in turn). Symbols in `skip`
+    are ignored.
+    '''
+    todo = [(form, scope)]
+    seen = set(skip)
+    while todo:
+        form, scope = todo.pop()
+        for sym in symbols(form):
+            if sym in seen:
+                continue
+            seen.add(sym)
+            value = scope.get(sym)
+            # Memoised / cached Funcs
+            value = getattr(value, 'func', value)
+            if isinstance(value, Func):
+                body = _form(value)
+                yield '{}: (lambda {} {})'.format(
+                    sym.str, canonical(value.args), canonical(body))
+                todo.append((body, value.scope))
+            elif isinstance(value, CONSTANT_TYPES):
+                yield '{}: {}'.format(sym.str, canonical(value))
+
+
+def source(func):
+    ''' :: Func -> str
+    The text of a Func and everything it refers to
+    '''
+    body = _form(func)
+    lines = ['(lambda {} {})'.format(canonical(func.args), canonical(body))]
+    lines.extend(references(body, func.scope, set(_params(func.args))))
+    return '\n'.join(lines)
+
+
+def _form(func):
+    return getattr(func.body, 'form', func.body)
+
+
+def _params(args):
+    return [Symbol(a.str.lstrip('*')) for a in args
+            if isinstance(a, Symbol)]
@@ -0,0 +1,174 @@
+'''
+Evaluator images: save everything that has been defined in an evaluator
+to a file and load it back into a fresh one without re-reading any source.
+
+    (save-image "pipeline.img")
+    ...
+    evaluator = load_image('pipeline.img')   # or (load-image "...")
+
+An image holds the evaluator's own definitions (see Overlay in
+ripl.bases), pickled and zlib compressed:
+    - Funcs are stored as their parameters and analysed body (the syntax
+      tree from ripl.nodes) along with any closed over scopes, so loading
+      doesn't lex, parse, analyse or evaluate anything. Compiled code is
+      not stored: hot Funcs are compiled again as they are used.
+    - Anything from the shared base scope (builtins, operators and the
+      prelude) and Python modules are stored by name and looked up again
+      on load, so the image only holds what the user defined.
+    - Definitions that can't be pickled (open files, generators...) are
+      left out: `save_image` returns their names.
+'''
+import zlib
+import pickle
+import copyreg
+from io import BytesIO
+from types import ModuleType
+from importlib import import_module
+
+from .bases import Symbol, Func, LazyDef
+
+# Bumped whenever the layout of an image changes
+IMAGE_VERSION = 2
+_MAGIC = b'RIPLIMG'
+_PLAIN = (int, float, complex, str, bytes, type(None))
+
+
+class ImageError(Exception):
+    pass
+
+
+def _reduce_func(func):
+    # Drop the compiled step, call counts and the vectorised kernel
+    return Func, (func.args, func.__doc__, func.body, func.scope,
+                  func.evaluator, func.name)
+
+
+class _Pickler(pickle.Pickler):
+    '''Pickle definitions, referring back to the evaluator by name'''
+    dispatch_table = copyreg.dispatch_table.copy()
+    dispatch_table[Func] = _reduce_func
+
+    def __init__(self, file, evaluator):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.evaluator = evaluator
+        self.scope = evaluator.global_scope
+        self.overlay = self.scope.maps[0]
+        base = self.overlay.base
+        self.base = {id(_value(v)): k for k, v in base.items()}
+        # Keep the base values alive while we hold their ids
+        self._keep = base
+
+    def persistent_id(self, obj):
+        if isinstance(obj, _PLAIN):
+            # Don't tie plain values to whatever the base scope holds
+            return None
+        elif obj is self.evaluator:
+            return 'evaluator',
+        elif obj is self.scope:
+            return 'scope',
+        elif obj is self.overlay:
+            return 'overlay',
+        elif isinstance(obj, ModuleType):
+            return 'module', obj.__name__
+        key = self.base.get(id(obj))
+        if key is not None:
+            return 'base', key.str
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, evaluator):
+        pickle.Unpickler.__init__(self, file)
+        self.evaluator = evaluator
+
+    def persistent_load(self, pid):
+        kind = pid[0]
+        if kind == 'evaluator':
+            return self.evaluator
+        elif kind == 'scope':
+            return self.evaluator.global_scope
+        elif kind == 'overlay':
+            return self.evaluator.global_scope.maps[0]
+        elif kind == 'module':
+            return import_module(pid[1])
+        elif kind == 'base':
+            value = self.evaluator.global_scope.maps[0].base[Symbol(pid[1])]
+            if value.__class__ is LazyDef:
+                value = value.resolve()
+            return value
+        raise pickle.UnpicklingError('unknown reference {}'.format(pid))
+
+
+def definitions(evaluator):
+    ''' :: Evaluator -> dict
+    The symbols that have been defined in an evaluator (rather than just
+    looked up from the base scope).
+    '''
+    overlay = evaluator.global_scope.maps[0]
+    base = overlay.base
+    defs = {}
+    for sym, value in overlay.items():
+        if _value(base.get(sym)) is value:
+            continue
+        elif getattr(value, '__self__', None) is evaluator:
+            # Per-evaluator builtins (apply...) are made by __init__
+            continue
+        defs[sym] = value
+    return defs
+
+
+def _value(base_value):
+    '''The value of a base scope entry, if it has been imported'''
+    if base_value.__class__ is LazyDef:
+        return base_value.value
+    return base_value
+
+
+def _dumps(obj, evaluator):
+    buf = BytesIO()
+    _Pickler(buf, evaluator).dump(obj)
+    return buf.getvalue()
+
+
+def save_image(evaluator, path):
+    ''' :: Evaluator, str -> List[Symbol]
+    Write an evaluator's definitions to `path`. Returns the symbols that
+    couldn't be saved.
+    '''
+    defs, skipped = {}, []
+    for sym, value in definitions(evaluator).items():
+        try:
+            _dumps(value, evaluator)
+        except Exception:
+            # Pickling arbitrary objects can fail in all sorts of ways
+            skipped.append(sym)
+        else:
+            defs[sym] = value
+    # Pickle everything together so that shared scopes stay shared
+    data = _dumps({'defs': defs}, evaluator)
+    with open(path, 'wb') as f:
+        f.write(_MAGIC + bytes([IMAGE_VERSION]) + zlib.compress(data))
+    return skipped
+
+
+def load_image(path, evaluator=None):
+    ''' :: str, Evaluator -> Evaluator
+    Load the definitions saved in an image into `evaluator` (a new
+    Evaluator by default) and return it.
+    '''
+    if evaluator is None:
+        from .evaluators import Evaluator
+        evaluator = Evaluator()
+    with open(path, 'rb') as f:
+        raw = f.read()
+    header = len(_MAGIC) + 1
+    if raw[:len(_MAGIC)] != _MAGIC:
+        raise ImageError('{} is not a ripl image'.format(path))
+    elif raw[len(_MAGIC)] != IMAGE_VERSION:
+        raise ImageError('{} is an image version {}, expected {}'.format(
+            path, raw[len(_MAGIC)], IMAGE_VERSION))
+    image = _Unpickler(BytesIO(zlib.decompress(raw[header:])),
+                       evaluator).load()
+    evaluator.global_scope.update(image['defs'])
+    evaluator.epoch += 1
+    return evaluator
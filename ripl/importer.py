@@ -0,0 +1,126 @@
+'''
+Import .rpl files from Python.
+
+    import ripl.importer
+    ripl.importer.install()
+
+    import pipeline                 # finds pipeline.rpl on sys.path
+    pipeline.load_prices('mon')     # (defn load-prices (day) ...)
+
+Each module gets its own Evaluator (`module.__evaluator__`) and the
+module's top level forms are evaluated in it once, on import. Everything
+the module defines is then set as an attribute of the module: hyphens
+become underscores so that `load-prices` can be called as `load_prices`.
+
+Like .pyc files, the analysed forms are cached in __pycache__ next to the
+source (name.<cache tag>.rplc) and used until the source changes, so
+later imports skip lexing and parsing. The forms are still evaluated on
+every import, as Python modules are, so top level side effects happen as
+you'd expect.
+'''
+import os
+import sys
+import pickle
+import struct
+import tempfile
+import importlib.abc
+import importlib.util
+
+from .backend import Reader
+from .evaluators import Evaluator
+from .image import definitions
+
+SUFFIX = '.rpl'
+# Bumped whenever the syntax tree (see ripl.nodes) changes
+CACHE_VERSION = 5
+_MAGIC = b'RIPLC'
+# magic, cache version, source mtime (ns) and size
+_HEADER = struct.Struct('<5sBqq')
+
+
+class RiplFinder(importlib.abc.MetaPathFinder):
+    '''Finds name.rpl on sys.path (or a package's __path__)'''
+    def find_spec(self, fullname, path=None, target=None):
+        name = fullname.rpartition('.')[2]
+        for entry in (sys.path if path is None else path):
+            if not isinstance(entry, str):
+                continue
+            filename = os.path.join(entry or '.', name + SUFFIX)
+            if os.path.isfile(filename):
+                return importlib.util.spec_from_file_location(
+                    fullname, filename,
+                    loader=RiplLoader(fullname, filename))
+        return None
+
+
+class RiplLoader(importlib.abc.Loader):
+    def __init__(self, fullname, path):
+        self.name = fullname
+        self.path = path
+
+    def exec_module(self, module):
+        evaluator = Evaluator()
+        for node in self.get_forms():
+            evaluator.eval(node, evaluator.global_scope)
+        for sym, value in definitions(evaluator).items():
+            setattr(module, sym.str.replace('-', '_'), value)
+        module.__evaluator__ = evaluator
+
+    def cache_path(self):
+        directory, filename = os.path.split(self.path)
+        base = filename[:-len(SUFFIX)]
+        return os.path.join(directory, '__pycache__', '{}.{}.rplc'.format(
+            base, sys.implementation.cache_tag))
+
+    def get_forms(self):
+        ''' :: -> List[Node]
+        The analysed top level forms of the module, from the cache if it
+        is up to date.
+        '''
+        st = os.stat(self.path)
+        header = _HEADER.pack(_MAGIC, CACHE_VERSION, st.st_mtime_ns,
+                              st.st_size)
+        cache = self.cache_path()
+        try:
+            with open(cache, 'rb') as f:
+                data = f.read()
+            if data[:_HEADER.size] == header:
+                return pickle.loads(data[_HEADER.size:])
+        except Exception:
+            # Missing, stale or corrupt: we just read the source again
+            pass
+
+        reader = Reader()
+        with open(self.path) as f:
+            forms = list(reader.parse(reader.lex(f.read())))
+        if not sys.dont_write_bytecode:
+            self._write_cache(cache, header, forms)
+        return forms
+
+    def _write_cache(self, cache, header, forms):
+        try:
+            data = pickle.dumps(forms, pickle.HIGHEST_PROTOCOL)
+            directory = os.path.dirname(cache)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header + data)
+            os.replace(tmp, cache)
+        except Exception:
+            # As with .pyc files, not being able to cache isn't an error
+            pass
+
+
+_finder = RiplFinder()
+
+
+def install():
+    '''Let `import` find .rpl modules'''
+    if _finder not in sys.meta_path:
+        # After the standard finders so that .py files win
+        sys.meta_path.append(_finder)
+
+
+def uninstall():
+    if _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
@@ -0,0 +1,236 @@
+'''
+Memory-mapped file readers.
+
+Iterating over `(open ...)` allocates a new Python string for every line.
+These readers mmap the file instead and hand out Records: light-weight
+(start, end) windows onto the mapping that only copy or decode their bytes
+when asked to. Searching a Record (`in`) runs directly over the mapped
+bytes, so filtering a large log only pays for the lines that are kept.
+
+    (drain (take 5 (filter (lambda (l) (in "ERROR" l))
+                           (mmap-lines "app.log"))))
+
+The mapping stays open for as long as any Record or memoryview from it is
+alive.
+'''
+import mmap
+
+# Common line ending bytes
+_NL = b'\n'
+_CR = 13
+
+
+class Record:
+    '''
+    A slice of a memory-mapped file. Decoded with `str()` / `decode`, copied
+    with `bytes()` and viewed without copying with `.view`.
+    Records compare and hash as the text they decode to, so they can be
+    used in place of strings as dict keys and set members. Compare the
+    bytes with `bytes(record) == ...`.
+    '''
+    __slots__ = '_mm', 'start', 'end', 'encoding'
+
+    def __init__(self, mm, start, end, encoding='utf-8'):
+        self._mm = mm
+        self.start = start
+        self.end = end
+        self.encoding = encoding
+
+    @property
+    def view(self):
+        ''' :: memoryview
+        A zero-copy view of the bytes of this record
+        '''
+        return memoryview(self._mm)[self.start:self.end]
+
+    def decode(self, errors='strict'):
+        return self._mm[self.start:self.end].decode(self.encoding, errors)
+
+    def split(self, sep=None, maxsplit=-1):
+        return self.decode().split(sep, maxsplit)
+
+    def __str__(self):
+        return self.decode()
+
+    def __bytes__(self):
+        return self._mm[self.start:self.end]
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __contains__(self, sub):
+        if isinstance(sub, str):
+            sub = sub.encode(self.encoding)
+        return self._mm.find(sub, self.start, self.end) != -1
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            if self.encoding == other.encoding:
+                # Same text if and only if the same bytes
+                return bytes(self) == bytes(other)
+            return self.decode() == other.decode()
+        elif isinstance(other, str):
+            return self.decode() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.decode())
+
+    def __repr__(self):
+        return '<Record {!r}>'.format(self.decode('replace'))
+
+
+def _map(path):
+    '''Map a whole file read-only (None for an empty file)'''
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Can't mmap an empty file
+            return None
+
+
+def mmap_bytes(path, start=0, end=None):
+    ''' :: str, int, int -> memoryview
+    A zero-copy view of (part of) a file.
+    '''
+    mm = _map(path)
+    if mm is None:
+        return memoryview(b'')
+    return memoryview(mm)[start:end]
+
+
+def mmap_lines(path, encoding='utf-8', keepends=False, matching=None):
+    ''' :: str -> Gen[Record]
+    Lazily yield each line of a file as a Record. Line endings (\\n or
+    \\r\\n) are dropped unless `keepends` is true.
+    If `matching` is given, only lines containing it are returned. This
+    searches the whole mapping at once rather than line by line so it runs
+    at close to disk speed.
+    '''
+    needle = _encode(matching, encoding)
+    mm = _map(path)
+    if mm is None:
+        return iter(())
+    return _lines(mm, encoding, keepends, needle)
+
+
+def _lines(mm, encoding, keepends, needle):
+    size = len(mm)
+    if needle is None and not keepends:
+        # The common case, kept as one tight loop
+        find = mm.find
+        pos = 0
+        while pos < size:
+            nl = find(_NL, pos)
+            if nl == -1:
+                yield Record(mm, pos, size, encoding)
+                return
+            end = nl - 1 if nl > pos and mm[nl - 1] == _CR else nl
+            yield Record(mm, pos, end, encoding)
+            pos = nl + 1
+        return
+
+    if needle is None:
+        spans = _split(mm, _NL)
+    else:
+        spans = _split_matching(mm, _NL, needle)
+    for start, end in spans:
+        if keepends:
+            end = min(end + 1, size)
+        elif end > start and mm[end - 1] == _CR:
+            end -= 1
+        yield Record(mm, start, end, encoding)
+
+
+def mmap_records(path, width=None, delimiter=None, encoding='utf-8',
+                 matching=None):
+    ''' :: str, int, str|bytes -> Gen[Record]
+    Lazily yield fixed `width` byte records or records separated by
+    `delimiter`. A trailing delimiter does not give an empty last record.
+    `matching` works as for mmap_lines.
+    '''
+    if (width is None) == (delimiter is None):
+        raise ValueError('give one of width or delimiter')
+    elif width is not None and width <= 0:
+        raise ValueError('record width must be positive')
+    delimiter = _encode(delimiter, encoding)
+    if delimiter is not None and not delimiter:
+        raise ValueError('empty record delimiter')
+    needle = _encode(matching, encoding)
+
+    mm = _map(path)
+    if mm is None:
+        return iter(())
+    elif width is not None:
+        spans = _fixed(mm, width, needle)
+    elif needle is None:
+        spans = _split(mm, delimiter)
+    else:
+        spans = _split_matching(mm, delimiter, needle)
+    return (Record(mm, start, end, encoding) for start, end in spans)
+
+
+def _encode(text, encoding):
+    if isinstance(text, str):
+        return text.encode(encoding)
+    return text
+
+
+def _split(mm, sep):
+    '''(start, end) of each `sep` terminated record'''
+    size = len(mm)
+    find = mm.find
+    step = len(sep)
+    pos = 0
+    while pos < size:
+        end = find(sep, pos)
+        if end == -1:
+            yield pos, size
+            return
+        yield pos, end
+        pos = end + step
+
+
+def _split_matching(mm, sep, needle):
+    '''
+    As _split but only for records that contain `needle`: jump to each
+    match and then look either side of it for the record boundaries.
+    '''
+    size = len(mm)
+    find, rfind = mm.find, mm.rfind
+    step = len(sep)
+    pos = 0
+    while pos < size:
+        hit = find(needle, pos)
+        if hit == -1:
+            return
+        start = rfind(sep, pos, hit)
+        start = pos if start == -1 else start + step
+        end = find(sep, hit + len(needle))
+        if end == -1:
+            yield start, size
+            return
+        yield start, end
+        pos = end + step
+
+
+def _fixed(mm, width, needle):
+    '''(start, end) of each `width` byte record'''
+    size = len(mm)
+    if needle is None:
+        for pos in range(0, size, width):
+            yield pos, min(pos + width, size)
+        return
+    pos = 0
+    while pos < size:
+        hit = mm.find(needle, pos)
+        if hit == -1:
+            return
+        start = hit - hit % width
+        if hit + len(needle) <= start + width:
+            yield start, min(start + width, size)
+            pos = start + width
+        else:
+            # Match runs over the end of a record: keep looking
+            pos = hit + 1
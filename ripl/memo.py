@@ -0,0 +1,254 @@
+'''
+In-memory memoisation of ripl (or Python) functions.
+
+    (defn/memo fib (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+    (define slow-lookup (memoize lookup 1000 60 :lfu))
+    (memo-stats fib "hits")
+
+`functools.lru_cache` can't be used on a Func: calls from ripl code never
+go through it as the evaluator jumps straight into the Func's body to keep
+tail calls. A MemoFunc isn't a Func, so the evaluator looks every call up
+in the cache. On a miss it jumps into the body of the Func it wraps as it
+would for any other call, so tail calls are kept, and the result is
+remembered when the body has been evaluated (see Memoised in
+ripl.bases).
+
+Caches can be bounded by size (evicting the least recently or least
+frequently used result) and by age (`ttl` seconds). Arguments are keyed
+structurally: vectors, lists, dicts and sets (and numpy arrays) are keyed
+by their contents rather than being rejected as unhashable.
+    NOTE: The key is taken when the function is called: mutating an
+          argument afterwards doesn't update the cached result.
+Arguments that still can't be hashed are passed straight through to the
+function and counted as misses.
+'''
+import time
+import threading
+from collections import OrderedDict
+
+from .bases import Keyword, RList, RDict, Memoised, MISS
+from .arrays import is_array
+
+DEFAULT_MAXSIZE = 1024
+
+# Markers for the kinds of container in a structural key
+_LIST, _VECTOR, _DICT, _SET, _ARRAY = (object() for _ in range(5))
+
+
+class _LRU:
+    '''Least recently used results are evicted first'''
+    def __init__(self):
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        value = self.entries[key]
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+
+    def discard(self, key):
+        del self.entries[key]
+
+    def evict(self):
+        self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class _LFU:
+    '''
+    Least frequently used results are evicted first (the oldest of them
+    on a tie). Keys are kept in buckets by use count so that every
+    operation is O(1).
+    '''
+    def __init__(self):
+        self.entries = {}
+        self.buckets = {}
+        self.least = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        entry = self.entries[key]
+        self._unlink(key, entry[1])
+        entry[1] += 1
+        self.buckets.setdefault(entry[1], OrderedDict())[key] = None
+        return entry[0]
+
+    def put(self, key, value):
+        self.entries[key] = [value, 1]
+        self.buckets.setdefault(1, OrderedDict())[key] = None
+        self.least = 1
+
+    def discard(self, key):
+        self._unlink(key, self.entries.pop(key)[1])
+
+    def evict(self):
+        bucket = self.buckets[self.least]
+        key, _ = bucket.popitem(last=False)
+        del self.entries[key]
+        if not bucket:
+            self._drop_bucket(self.least)
+
+    def clear(self):
+        self.entries.clear()
+        self.buckets.clear()
+        self.least = 0
+
+    def _unlink(self, key, count):
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            self._drop_bucket(count)
+
+    def _drop_bucket(self, count):
+        del self.buckets[count]
+        if count == self.least:
+            self.least = min(self.buckets) if self.buckets else 0
+
+
+_POLICIES = {'lru': _LRU, 'lfu': _LFU}
+
+
+class MemoFunc(Memoised):
+    '''
+    A function with its results cached by argument.
+    `maxsize` of None gives an unbounded cache and a `ttl` of None (or 0)
+    means that results never expire.
+    '''
+    def __init__(self, func, maxsize=DEFAULT_MAXSIZE, ttl=None,
+                 policy='lru'):
+        # NOTE: None reads as () in ripl, which == None
+        maxsize = None if maxsize == None else maxsize  # noqa: E711
+        if maxsize is not None and maxsize <= 0:
+            raise ValueError('maxsize must be positive or None')
+        name = policy.str if isinstance(policy, Keyword) else policy
+        self.policy = name.lstrip(':')
+        try:
+            self.store = _POLICIES[self.policy]()
+        except KeyError:
+            raise ValueError('unknown eviction policy: {}'.format(policy))
+        self.func = func
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self.name = getattr(func, 'name', None) or \
+            getattr(func, '__name__', None)
+        self.__doc__ = func.__doc__
+        self.hits = self.misses = self.evictions = 0
+        # Guards the store (but not calls to func) between threads
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return '<MemoFunc {}>'.format(self.name or 'lambda')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def lookup(self, args):
+        ''' :: tuple -> key, value|MISS
+        See Memoised in ripl.bases
+        '''
+        key = args
+        try:
+            hash(key)
+        except TypeError:
+            try:
+                key = _freeze(args)
+                hash(key)
+            except TypeError:
+                self.misses += 1
+                return None, MISS
+
+        store = self.store
+        with self.lock:
+            try:
+                value, expires = store.get(key)
+            except KeyError:
+                pass
+            else:
+                if expires is None or expires > time.monotonic():
+                    self.hits += 1
+                    return key, value
+                store.discard(key)
+            self.misses += 1
+        return key, MISS
+
+    def remember(self, key, value):
+        '''Cache the result for a key from `lookup`'''
+        if key is None:
+            return
+        store = self.store
+        with self.lock:
+            if key in store:
+                # Filled in by a recursive call (or another thread) while
+                # we were computing it
+                store.discard(key)
+            elif self.maxsize is not None and len(store) >= self.maxsize:
+                store.evict()
+                self.evictions += 1
+            expires = None if self.ttl is None else \
+                time.monotonic() + self.ttl
+            store.put(key, (value, expires))
+
+    def stats(self):
+        ''' :: RDict
+        Cache statistics: hits, misses, evictions, size and maxsize
+        '''
+        return RDict(hits=self.hits, misses=self.misses,
+                     evictions=self.evictions, size=len(self.store),
+                     maxsize=self.maxsize)
+
+    def clear(self):
+        '''Drop every cached result and reset the statistics'''
+        with self.lock:
+            self.store.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+def memoize(func, maxsize=DEFAULT_MAXSIZE, ttl=None, policy='lru'):
+    ''' :: f(*a) -> b, int, num, str -> MemoFunc
+    Cache the results of func by argument. At most `maxsize` results are
+    kept (None for no limit), evicting by `policy` (:lru or :lfu), and
+    results older than `ttl` seconds are recomputed. Bound in the prelude.
+    '''
+    return MemoFunc(func, maxsize, ttl, policy)
+
+
+def _freeze(value):
+    ''' :: Any -> hashable
+    A structural key for a value: containers become tuples of their frozen
+    contents tagged with the kind of container.
+    '''
+    if isinstance(value, tuple):
+        return tuple(map(_freeze, value))
+    elif isinstance(value, RList):
+        return _LIST, tuple(map(_freeze, value))
+    elif isinstance(value, list):
+        return _VECTOR, tuple(map(_freeze, value))
+    elif isinstance(value, dict):
+        return _DICT, frozenset(
+            (_freeze(k), _freeze(v)) for k, v in value.items())
+    elif isinstance(value, (set, frozenset)):
+        return _SET, frozenset(map(_freeze, value))
+    elif is_array(value):
+        return _ARRAY, value.dtype.str, value.shape, value.tobytes()
+    return value
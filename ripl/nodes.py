@@ -0,0 +1,517 @@
+'''
+Typed syntax tree for RIPL.
+
+The Reader turns source into plain LISP data (RLists of Symbols, numbers
+and strings). `analyse` then converts that data into a tree of nodes so
+that the evaluator can dispatch on node type rather than probing raw lists
+and falling back to scope lookups to decide what an atom is.
+
+    (if (< x 2) x (fib (- x 1)))
+    --> If(Call(SymRef(<), [SymRef(x), Literal(2)]),
+           SymRef(x),
+           Call(SymRef(fib), [Call(SymRef(-), [SymRef(x), Literal(1)])]))
+
+Every node keeps the `form` it was analysed from (so that quoting and
+printing still see data) along with the line and column of the token that
+started it when it came from the Reader.
+'''
+from collections.abc import Container
+from types import FunctionType
+
+from .bases import Symbol, RList
+
+# Attributes of these types can be called with the instance as the first
+# argument in place of looking up a bound method: str.upper(s) etc
+_UNBOUND_TYPES = (FunctionType, type(str.upper), type(str.__add__))
+
+
+class Node:
+    '''Base class for syntax tree nodes'''
+    __slots__ = 'form', 'line', 'col'
+
+    def __init__(self, form, line=None, col=None):
+        self.form = form
+        self.line = line
+        self.col = col
+
+    def __repr__(self):
+        return '<{} {}>'.format(type(self).__name__, self.form)
+
+
+class Literal(Node):
+    '''A self-evaluating value: numbers, strings, keywords, [] and {}'''
+    __slots__ = 'value',
+
+    def __init__(self, value, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.value = value
+
+
+class Empty(Node):
+    '''The empty list. Evaluates to a new EmptyList each time'''
+    __slots__ = ()
+
+
+class SymRef(Node):
+    '''A reference to a symbol in scope'''
+    __slots__ = 'sym',
+
+    def __init__(self, sym, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.sym = sym
+
+
+class Quote(Node):
+    '''(quote datum)'''
+    __slots__ = 'datum',
+
+    def __init__(self, datum, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.datum = datum
+
+
+class Quasiquote(Node):
+    '''(quasiquote datum) with ~ and ~@ unquoting'''
+    __slots__ = 'datum',
+
+    def __init__(self, datum, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.datum = datum
+
+
+class If(Node):
+    '''(if test then [orelse])'''
+    __slots__ = 'test', 'then', 'orelse'
+
+    def __init__(self, test, then, orelse, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.test = test
+        self.then = then
+        self.orelse = orelse
+
+
+class Define(Node):
+    '''(define name value)'''
+    __slots__ = 'name', 'value'
+
+    def __init__(self, name, value, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.name = name
+        self.value = value
+
+
+class Set(Node):
+    '''(set name value)'''
+    __slots__ = 'name', 'value'
+
+    def __init__(self, name, value, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.name = name
+        self.value = value
+
+
+class Defn(Node):
+    '''
+    (defn name ["""docstring"""] (params...) body)
+    `kind` is None for a plain defn, 'memo' for defn/memo or 'cached' for
+    defn/cached.
+    '''
+    __slots__ = 'name', 'params', 'doc', 'body', 'kind'
+
+    def __init__(self, name, params, doc, body, kind=None,
+                 form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.name = name
+        self.params = params
+        self.doc = doc
+        self.body = body
+        self.kind = kind
+
+
+class Defstage(Node):
+    '''(defstage name ["""docstring"""] (inputs...) body)'''
+    __slots__ = 'name', 'inputs', 'doc', 'body'
+
+    def __init__(self, name, inputs, doc, body,
+                 form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.name = name
+        self.inputs = inputs
+        self.doc = doc
+        self.body = body
+
+
+class Defgen(Node):
+    '''
+    (defgen name ["""docstring"""] (params...) body...)
+    The body is a tuple of statements (see Evaluator.generate).
+    '''
+    __slots__ = 'name', 'params', 'doc', 'body'
+
+    def __init__(self, name, params, doc, body,
+                 form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.name = name
+        self.params = params
+        self.doc = doc
+        self.body = body
+
+
+class Yield(Node):
+    '''(yield value): only as a statement in a defgen body'''
+    __slots__ = 'expr',
+
+    def __init__(self, expr, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.expr = expr
+
+
+class YieldFrom(Node):
+    '''(yield-from iterable): yield each of its values in turn'''
+    __slots__ = 'expr',
+
+    def __init__(self, expr, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.expr = expr
+
+
+class Future(Node):
+    '''(future expr): evaluate expr on another thread'''
+    __slots__ = 'expr',
+
+    def __init__(self, expr, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.expr = expr
+
+
+class Lambda(Node):
+    '''(lambda (params...) body)'''
+    __slots__ = 'params', 'body'
+
+    def __init__(self, params, body, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.params = params
+        self.body = body
+
+
+class Eval(Node):
+    '''(eval expr): evaluate expr and then evaluate the result'''
+    __slots__ = 'expr',
+
+    def __init__(self, expr, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.expr = expr
+
+
+class Index(Node):
+    '''(<CONTAINER> KEY/INDEX): containers are functions of their keys'''
+    __slots__ = 'container', 'key'
+
+    def __init__(self, container, key, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.container = container
+        self.key = key
+
+
+class Call(Node):
+    '''
+    (func args...)
+    `simple` calls have a named head and only literals and symbols as
+    arguments: the stackless evaluator makes them without pushing a frame.
+    '''
+    __slots__ = 'func', 'args', 'simple'
+
+    def __init__(self, func, args, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.func = func
+        self.args = args
+        self.simple = func.__class__ is SymRef and all(
+            arg.__class__ is Literal or arg.__class__ is SymRef
+            for arg in args)
+
+
+class Attr(Node):
+    '''
+    obj.attr.attr...: attributes of the value bound to obj, or of the
+    longest bound prefix for globals (see lookup_dotted in ripl.bases)
+    '''
+    __slots__ = 'obj', 'attrs'
+
+    def __init__(self, obj, attrs, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.obj = obj
+        self.attrs = attrs
+
+
+class MethodCall(Node):
+    '''
+    (.method obj args...) or (obj.method args...)
+    Each call site remembers the type it last saw and, where it is safe,
+    the plain function behind the method so that calls on objects of the
+    same type skip the attribute lookup and creating a bound method.
+    Calling the node with the object and arguments makes the call.
+    NOTE: The cache is only used for types whose instances have no
+          __dict__ (builtins, numpy arrays, classes with __slots__) as
+          anything else could shadow the method on the instance.
+    '''
+    __slots__ = 'obj', 'name', 'args', 'cache'
+
+    def __init__(self, obj, name, args, form=None, line=None, col=None):
+        Node.__init__(self, form, line, col)
+        self.obj = obj
+        self.name = name
+        self.args = args
+        # (type, function or None): replaced as a whole so that threads
+        # sharing the node never see half of an update
+        self.cache = (None, None)
+
+    def __reduce__(self):
+        # Cached functions and types needn't be picklable
+        return (MethodCall, (self.obj, self.name, self.args, self.form,
+                             self.line, self.col))
+
+    def __call__(self, obj, *args):
+        cls, func = self.cache
+        if obj.__class__ is not cls:
+            cls = obj.__class__
+            func = _unbound_method(cls, self.name)
+            self.cache = (cls, func)
+        if func is not None:
+            return func(obj, *args)
+        return getattr(obj, self.name)(*args)
+
+
+def _unbound_method(cls, name):
+    '''The function to call for obj.name(...) if it is safe to cache'''
+    if cls.__dictoffset__ != 0:
+        return None
+    for klass in cls.__mro__:
+        attr = klass.__dict__.get(name)
+        if attr is not None:
+            return attr if isinstance(attr, _UNBOUND_TYPES) else None
+    return None
+
+
+def analyse(form, span=None):
+    ''' :: datum, Span -> Node
+    Convert a datum into a syntax tree.
+    `span` is the (line, col, [child spans]) position information from
+    `Reader.read_spans`. Data created at runtime (`eval`, quasiquote) has
+    no span and gives nodes with no line/col.
+    '''
+    if span is None:
+        line = col = children = None
+    else:
+        line, col, children = span
+
+    if isinstance(form, RList):
+        if len(form) == 0:
+            return Empty(form, line, col)
+        head = form[0]
+        if isinstance(head, Symbol):
+            special = SPECIAL_FORMS.get(head)
+            if special is not None:
+                return special(form, children, line, col)
+            if '.' in head.str:
+                return _analyse_method_call(form, children, line, col)
+        elif isinstance(head, Container):
+            return _analyse_index(form, children, line, col)
+        func = _child(form, children, 0)
+        args = tuple(_child(form, children, i) for i in range(1, len(form)))
+        return Call(func, args, form, line, col)
+    elif isinstance(form, Symbol):
+        if '.' in form.str:
+            return _dotted(form, line, col)
+        return SymRef(form, form, line, col)
+    else:
+        return Literal(form, form, line, col)
+
+
+def _child(form, children, index):
+    '''Analyse a sub-form, passing on its span if we have one'''
+    if children is None:
+        return analyse(form[index])
+    return analyse(form[index], children[index])
+
+
+def _dotted(sym, line, col):
+    '''
+    obj.attr... -> Attr(SymRef(obj), attrs)
+    A bare .method is a function of (obj, args...) that calls it.
+    '''
+    if sym.str.startswith('.'):
+        method = MethodCall(None, sym.str[1:], (), sym, line, col)
+        return Literal(method, sym, line, col)
+    head, *attrs = sym.str.split('.')
+    obj = SymRef(Symbol(head), Symbol(head), line, col)
+    return Attr(obj, tuple(attrs), sym, line, col)
+
+
+def _analyse_method_call(form, children, line, col):
+    head = form[0]
+    args = tuple(_child(form, children, i) for i in range(1, len(form)))
+    if head.str.startswith('.'):
+        # (.method obj args...)
+        if not args:
+            raise SyntaxError('{} needs an object to call it on: {}'.format(
+                head, form))
+        obj, args = args[0], args[1:]
+        name = head.str[1:]
+    else:
+        # (obj.attr.method args...)
+        prefix, _, name = head.str.rpartition('.')
+        span = None if children is None else children[0]
+        obj = analyse(Symbol(prefix), span)
+    return MethodCall(obj, name, args, form, line, col)
+
+
+def _check_len(form, *allowed):
+    if len(form) not in allowed:
+        raise SyntaxError('malformed {} expression: {}'.format(form[0], form))
+
+
+def _analyse_index(form, children, line, col):
+    if len(form) != 2:
+        raise SyntaxError('Invalid function call')
+    if isinstance(form[0], RList) and len(form[0]) > 0:
+        if form[0][0] == Symbol('quote'):
+            raise SyntaxError('Cannot index into quoted list')
+    return Index(form[0], form[1], form, line, col)
+
+
+def _analyse_quote(form, children, line, col):
+    _check_len(form, 2)
+    return Quote(form[1], form, line, col)
+
+
+def _analyse_quasiquote(form, children, line, col):
+    _check_len(form, 2)
+    return Quasiquote(form[1], form, line, col)
+
+
+def _analyse_if(form, children, line, col):
+    # handle both forms of if
+    # if/elif... will be replaced with a cond macro
+    _check_len(form, 3, 4)
+    test = _child(form, children, 1)
+    then = _child(form, children, 2)
+    if len(form) == 4:
+        orelse = _child(form, children, 3)
+    else:
+        orelse = Literal(None)
+    return If(test, then, orelse, form, line, col)
+
+
+def _analyse_define(form, children, line, col):
+    _check_len(form, 3)
+    value = _child(form, children, 2)
+    return Define(form[1], value, form, line, col)
+
+
+def _analyse_set(form, children, line, col):
+    _check_len(form, 3)
+    value = _child(form, children, 2)
+    return Set(form[1], value, form, line, col)
+
+
+def _analyse_defn(form, children, line, col, kind=None):
+    # (defn foo
+    #  """do that voodoo that foo do"""
+    #  (args) (body ...))
+    _check_len(form, 4, 5)
+    if len(form) == 5:
+        doc, params = form[2], form[3]
+    else:
+        doc, params = None, form[2]
+    body = _child(form, children, len(form) - 1)
+    return Defn(form[1], params, doc, body, kind, form, line, col)
+
+
+def _analyse_defn_memo(form, children, line, col):
+    return _analyse_defn(form, children, line, col, kind='memo')
+
+
+def _analyse_defn_cached(form, children, line, col):
+    return _analyse_defn(form, children, line, col, kind='cached')
+
+
+def _analyse_defstage(form, children, line, col):
+    # (defstage clean
+    #  """drop the junk"""
+    #  (raw) (body ...))
+    _check_len(form, 4, 5)
+    if len(form) == 5:
+        doc, inputs = form[2], form[3]
+    else:
+        doc, inputs = None, form[2]
+    if not isinstance(form[1], Symbol) or not isinstance(inputs, RList) \
+            or not all(isinstance(i, Symbol) for i in inputs):
+        raise SyntaxError('malformed defstage expression: {}'.format(form))
+    body = _child(form, children, len(form) - 1)
+    return Defstage(form[1], inputs, doc, body, form, line, col)
+
+
+def _analyse_defgen(form, children, line, col):
+    # (defgen naturals
+    #  """0, 1, 2..."""
+    #  (n) (yield n) (yield-from (naturals (+ n 1))))
+    start = 3 if len(form) > 2 and isinstance(form[2], str) else 2
+    if len(form) < start + 2 or not isinstance(form[1], Symbol) or \
+            not isinstance(form[start], RList):
+        raise SyntaxError('malformed {} expression: {}'.format(form[0], form))
+    doc = form[2] if start == 3 else None
+    body = tuple(_child(form, children, i)
+                 for i in range(start + 1, len(form)))
+    return Defgen(form[1], form[start], doc, body, form, line, col)
+
+
+def _analyse_yield(form, children, line, col):
+    _check_len(form, 1, 2)
+    if len(form) == 1:
+        return Yield(Literal(None), form, line, col)
+    return Yield(_child(form, children, 1), form, line, col)
+
+
+def _analyse_yield_from(form, children, line, col):
+    _check_len(form, 2)
+    return YieldFrom(_child(form, children, 1), form, line, col)
+
+
+def _analyse_future(form, children, line, col):
+    _check_len(form, 2)
+    return Future(_child(form, children, 1), form, line, col)
+
+
+def _analyse_lambda(form, children, line, col):
+    _check_len(form, 3)
+    body = _child(form, children, 2)
+    return Lambda(form[1], body, form, line, col)
+
+
+def _analyse_eval(form, children, line, col):
+    _check_len(form, 2)
+    return Eval(_child(form, children, 1), form, line, col)
+
+
+def _analyse_defmacro(form, children, line, col):
+    raise SyntaxError("haven't finished macros!")
+
+
+SPECIAL_FORMS = {
+    Symbol('quote'): _analyse_quote,
+    Symbol('quasiquote'): _analyse_quasiquote,
+    Symbol('if'): _analyse_if,
+    Symbol('define'): _analyse_define,
+    Symbol('set'): _analyse_set,
+    Symbol('defn'): _analyse_defn,
+    Symbol('defn/memo'): _analyse_defn_memo,
+    Symbol('defn/cached'): _analyse_defn_cached,
+    Symbol('defstage'): _analyse_defstage,
+    Symbol('defmacro'): _analyse_defmacro,
+    Symbol('defgen'): _analyse_defgen,
+    Symbol('yield'): _analyse_yield,
+    Symbol('yield-from'): _analyse_yield_from,
+    Symbol('future'): _analyse_future,
+    Symbol('lambda'): _analyse_lambda,
+    Symbol('eval'): _analyse_eval,
+    }
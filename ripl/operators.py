@@ -0,0 +1,134 @@
+'''
+Arithmetic and comparison operators for the global scope.
+
+All of these are variadic in the LISPy way, (+ 1 2 3) and (< a b c), and
+dispatch on the type of their arguments:
+    - the two argument case is always a single Python operation
+    - strings, lists, tuples and RLists are concatenated in linear time
+      rather than by repeated pairwise `+`
+    - sequences of ints are summed with `sum`, and anything containing
+      floats with `math.fsum` (exact rounding)
+    - comparisons chain pairwise like Python's a < b < c, stopping at the
+      first failure and without building intermediate sequences
+Anything else falls back to a left fold with the `operator` function, which
+for numpy arrays (see ripl.arrays) is already element-wise.
+'''
+import math
+import functools
+import operator as op
+from itertools import chain, islice
+
+from .bases import RList
+
+
+def add(*args):
+    ''' :: *T -> T
+    Add an arbitrary number of numerics or cat an arbitrary number of
+    strings / lists / tuples together.
+    '''
+    if len(args) == 2:
+        return args[0] + args[1]
+    elif not args:
+        return 0
+    elif len(args) == 1:
+        return args[0]
+
+    kind = type(args[0])
+    if kind is int or kind is float:
+        try:
+            total = sum(args)
+        except TypeError:
+            return functools.reduce(op.add, args)
+        if type(total) is float:
+            # Don't accumulate rounding error across long sequences
+            return math.fsum(args)
+        return total
+    elif isinstance(args[0], str):
+        return ''.join(args)
+    elif kind is RList or issubclass(kind, (list, tuple)):
+        # Including RVector: every [...] literal is one
+        if all(isinstance(arg, kind) for arg in args):
+            return _concat(kind, args)
+    return functools.reduce(op.add, args)
+
+
+def _concat(kind, args):
+    '''Join sequences of the same kind in one pass, giving that kind'''
+    if kind is RList:
+        return RList(chain.from_iterable(arg.data for arg in args))
+    joined = chain.from_iterable(args)
+    if kind is tuple or issubclass(kind, list):
+        return kind(joined)
+    # Tuple subclasses (namedtuples) can't all be built from one iterable:
+    # `+` gives a plain tuple for them too
+    return tuple(joined)
+
+
+def sub(*args):
+    ''' :: *T -> T
+    (- a) negates, (- a b c) is ((a - b) - c)
+    '''
+    if len(args) == 2:
+        return args[0] - args[1]
+    elif len(args) == 1:
+        return -args[0]
+    return functools.reduce(op.sub, args)
+
+
+def mul(*args):
+    ''' :: *T -> T
+    (* a b c) is ((a * b) * c)
+    '''
+    if len(args) == 2:
+        return args[0] * args[1]
+    elif not args:
+        return 1
+    return functools.reduce(op.mul, args)
+
+
+def truediv(*args):
+    ''' :: *T -> T
+    (/ a) is 1/a, (/ a b c) is ((a / b) / c)
+    '''
+    if len(args) == 2:
+        return args[0] / args[1]
+    elif len(args) == 1:
+        return 1 / args[0]
+    return functools.reduce(op.truediv, args)
+
+
+def _chained(compare, doc):
+    '''Build a variadic comparison from a binary one'''
+    def chained(*args):
+        if len(args) == 2:
+            return compare(args[0], args[1])
+        try:
+            return all(map(compare, args, islice(args, 1, None)))
+        except ValueError:
+            # Element-wise comparisons (numpy arrays) have no single truth
+            # value so combine them instead.
+            return functools.reduce(
+                    op.and_, map(compare, args, islice(args, 1, None)))
+    chained.__name__ = compare.__name__
+    chained.__doc__ = doc
+    return chained
+
+
+lt = _chained(op.lt, ''' :: *T -> bool
+    (< a b c) is a < b < c
+    ''')
+le = _chained(op.le, ''' :: *T -> bool
+    (<= a b c) is a <= b <= c
+    ''')
+gt = _chained(op.gt, ''' :: *T -> bool
+    (> a b c) is a > b > c
+    ''')
+ge = _chained(op.ge, ''' :: *T -> bool
+    (>= a b c) is a >= b >= c
+    ''')
+eq = _chained(op.eq, ''' :: *T -> bool
+    (== a b c) is a == b == c
+    ''')
+ne = _chained(op.ne, ''' :: *T -> bool
+    (!= a b c) is a != b != c (adjacent pairs only, as in Python)
+    ''')
@@ -26,6 +26,9 @@ Repeating subpatterns work:
 This entire concept is based on extending Python Tuple
 unpacking and Clojure destructuring:
     http://clojure.org/guides/destructuring
+
+Matching with `==` keeps its state in the template, so use
+`Template.match` to share a template between threads (or to reuse it).
 '''
 import collections
 import collections.abc
@@ -105,7 +108,8 @@ class Pvar:
         self.symbol = symbol
         self.greedy = True if symbol.str.startswith('*') else False
         if self.greedy:
-            self.symbol.str = self.symbol.str.lstrip('*')
+            # A new symbol: the template's data may be used again
+            self.symbol = Symbol(symbol.str.lstrip('*'))
         self.value = None
 
     def __repr__(self):
@@ -192,13 +196,15 @@ class Rvar:
 
 class Template:
     '''A list of pattern variables'''
-    __slots__ = 'repeating pvars value has_star has_ellipsis map'.split()
+    __slots__ = 'repeating pvars value has_star has_ellipsis map data'.split()
     greedy = False
 
     def __init__(self, *data):
-        if len(data) == 1 and isinstance(data[0], collections.Container):
+        if len(data) == 1 and isinstance(data[0],
+                                         collections.abc.Container):
             # Allow a single arg of a list to be passed
             data = data[0]
+        self.data = data
 
         self.pvars = []
         has_star = False
@@ -315,6 +321,15 @@ class Template:
             else:
                 raise FailedMatch(self.pvars)
 
+    def match(self, target):
+        ''' :: Container -> dict
+        Match against target, returning the bindings or raising
+        FailedMatch. The match is made with a fresh copy of the template
+        so this one is left untouched.
+        '''
+        attempt = Template(self.data)
+        return attempt.__eq__(target)
+
     def check_match(self, pvar, target):
         '''Check for a match and update the current mapping'''
         if pvar == target:
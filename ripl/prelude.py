@@ -13,13 +13,32 @@ http://learnyouahaskell.com/higher-order-functions
 Clojure's core reference:
 https://clojuredocs.org/clojure.core
 https://clojuredocs.org/quickref
+
+NOTE: snake_case names are also bound with hyphens in ripl: read_csv is
+      available as read-csv.
 '''
+import sys
 import functools
 import itertools
 import operator as op
 from types import GeneratorType
 
-from .bases import RVector
+from .bases import RVector, Func
+from .arrays import numpy, is_array, fold_ufunc
+from .compiler import vectorised
+
+# Also in the prelude but only imported when they are first used (see
+# LazyDef in ripl.bases): between them these modules pull in csv, json,
+# mmap, pickle, tempfile, hashlib and concurrent.futures.
+LAZY = {
+    'ripl.table': ('Table', 'read_csv', 'read_jsonl'),
+    'ripl.mapped': ('mmap_lines', 'mmap_records', 'mmap_bytes'),
+    'ripl.relational': ('sort_by', 'group_by', 'join'),
+    'ripl.windows': ('tumbling_window', 'sliding_window', 'session_window',
+                     'Sum', 'Count', 'Mean', 'Min', 'Max'),
+    'ripl.dag': ('run_dag',),
+    'ripl.memo': ('memoize',),
+    }
 
 
 def reverse(itr):
@@ -36,13 +55,22 @@ def product(cont):
     Find the product of an iterable. Contents of the iterable must
     implement __mul__
     '''
+    if is_array(cont):
+        return fold_ufunc(op.mul)[0].reduce(cont)
     return functools.reduce(op.mul, cont)
 
 
 def foldl(func, acc, cont):
     ''' :: f(a, a) -> a, Itr|Gen[a] -> a
     Fold a list with a given binary function from the left
+    NOTE: Folding a numpy array with an arithmetic operator, min or max
+          reduces it with the matching ufunc in one go.
     '''
+    if is_array(cont) and len(cont) > 0:
+        fold = fold_ufunc(func)
+        if fold is not None:
+            ufunc, combine = fold
+            return combine(acc, ufunc.reduce(cont))
     for val in cont:
         acc = func(acc, val)
     return acc
@@ -106,6 +134,7 @@ def scanr(func, acc, cont):
 def take(num, cont):
     ''' :: Int, Itr|Gen[*T] -> List[*T]
     Return up to the first `num` elements of an iterable or generator.
+    Lists, strings, numpy arrays etc are sliced (arrays give a view).
     '''
     try:
         return cont[:num]
@@ -123,6 +152,7 @@ def take(num, cont):
 def drop(num, cont):
     ''' :: Int, Itr|Gen[*T] -> List[*T]
     Return everything but the first `num` elements of itr
+    Lists, strings, numpy arrays etc are sliced (arrays give a view).
     '''
     try:
         items = cont[num:]
@@ -166,3 +196,83 @@ def drain(gen):
     Given a generator, convert it to a list (RVector)
     '''
     return RVector([elem for elem in gen])
+
+
+def deref(ref, timeout=None):
+    ''' :: Future[T] -> T
+    Wait for the result of a `future` (re-raising any error it raised).
+    Anything else is returned as it is.
+    '''
+    # Nothing can be a Future until concurrent.futures has been imported
+    futures = sys.modules.get('concurrent.futures')
+    if futures is not None and isinstance(ref, futures.Future):
+        return ref.result(timeout)
+    return ref
+
+
+def vmap(func, *cols):
+    ''' :: f(*a) -> b, *Itr[a] -> ndarray
+    Map a function over numpy arrays (or anything numpy can turn into an
+    array) a whole array at a time:
+        (vmap (lambda (x) (+ (* x x) 1)) #f64[1 2 3]) -> #f64[2.0 5.0 10.0]
+    ripl functions built from arithmetic, comparisons and `if` run as a
+    single numpy expression. NOTE: `if` computes both branches for every
+    element and then picks. Anything else is called element by element.
+    '''
+    np = numpy()
+    if np is None:
+        return RVector(map(func, *cols))
+    cols = [np.asarray(col) for col in cols]
+    kernel = None
+    if isinstance(func, Func) and len(func.args) == len(cols):
+        kernel = vectorised(func)
+    if kernel is None:
+        return np.array([func(*vals)
+                         for vals in zip(*(col.tolist() for col in cols))])
+    with np.errstate(all='ignore'):
+        res = kernel(*cols)
+    if np.ndim(res) == 0:
+        # Constant body: broadcast to the shape of the input
+        res = np.full(np.broadcast(*cols).shape, res)
+    return res
+
+
+def select(table, *names):
+    ''' :: Table, *str -> Table
+    Keep only the named columns of a Table.
+    '''
+    return table.select(*names)
+
+
+def filter_rows(table, predicate, *names):
+    ''' :: Table, f(*a) -> bool, *str -> Table
+    Keep the rows of a Table where predicate is true. The predicate is
+    given the values from the named columns and is vmapped over them:
+        (filter-rows t (lambda (p q) (> (* p q) 100)) "price" "qty")
+    '''
+    return table.where(vmap(predicate, *(table[name] for name in names)))
+
+
+def with_column(table, name, func, *names):
+    ''' :: Table, str, f(*a) -> b, *str -> Table
+    Add (or replace) a column computed from the named columns with vmap:
+        (with-column t "total" (lambda (p q) (* p q)) "price" "qty")
+    '''
+    return table.with_column(
+            name, vmap(func, *(table[name] for name in names)))
+
+
+def memo_stats(func, key=None):
+    ''' :: MemoFunc, str -> RDict|int
+    The hits, misses, evictions, size and maxsize of a memoised function,
+    or just one of them if `key` is given.
+    '''
+    stats = func.stats()
+    return stats if key is None else stats[key]
+
+
+def memo_clear(func):
+    ''' :: MemoFunc -> None
+    Empty the cache of a memoised function
+    '''
+    func.clear()
@@ -0,0 +1,260 @@
+'''
+Relational operations that work on more data than fits in memory.
+
+    (sort-by key items)          -> Gen[item]
+    (group-by key items)         -> Gen[(key, List[item])]
+    (join left right key [rkey]) -> Gen[(left item, right item)]
+
+Each takes a `budget`: roughly how many bytes of items to hold in memory
+at once. Below the budget everything happens in memory. Past it:
+    sort-by  spills sorted runs to temporary files and streams back a
+             k-way merge of them (heapq.merge).
+    group-by spills hash partitions of the groups seen so far and then
+             groups each partition in turn (re-partitioning any that are
+             still too big).
+    join     is a hash join on the right hand side. If that side is too
+             big it becomes a grace hash join: both sides are hash
+             partitioned to disk and each pair of partitions is joined.
+             Partitions that can't be split any further (one huge key) and
+             unhashable keys on the right fall back to a sort-merge join.
+             Unhashable keys on the left are compared with each key held
+             in memory.
+Item sizes are estimated with sys.getsizeof (one level deep for tuples,
+lists and dicts) so the budget is approximate. Temporary files are
+deleted when the result has been consumed (or garbage collected).
+'''
+import sys
+import heapq
+import pickle
+import itertools
+import tempfile
+
+DEFAULT_BUDGET = 256 * 2**20
+# Hash partitions per spill and how many times to re-partition
+FANOUT = 16
+MAX_DEPTH = 3
+# Items per pickle write when spilling
+_BATCH = 1024
+
+
+class _Spill:
+    '''An append-only temporary file of pickled items'''
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.buffer = []
+
+    def write(self, item):
+        self.buffer.append(item)
+        if len(self.buffer) >= _BATCH:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            pickle.dump(self.buffer, self.file, pickle.HIGHEST_PROTOCOL)
+            self.buffer = []
+
+    def read(self):
+        ''' :: Gen[item]
+        Read everything back in the order it was written, then delete.
+        '''
+        self.flush()
+        self.file.seek(0)
+        try:
+            while True:
+                try:
+                    batch = pickle.load(self.file)
+                except EOFError:
+                    return
+                for item in batch:
+                    yield item
+        finally:
+            self.file.close()
+
+
+def _sizeof(item):
+    '''Rough in-memory size of an item'''
+    size = sys.getsizeof(item)
+    if isinstance(item, (tuple, list)):
+        size += sum(map(sys.getsizeof, item))
+    elif isinstance(item, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v)
+                    for k, v in item.items())
+    return size
+
+
+def sort_by(key, items, budget=DEFAULT_BUDGET, reverse=False):
+    ''' :: f(a) -> b, Itr[a] -> Gen[a]
+    Stable sort of items by key, spilling sorted runs to disk once more
+    than `budget` bytes of items have been read.
+    '''
+    runs = []
+    run, size = [], 0
+    for item in items:
+        run.append(item)
+        size += _sizeof(item)
+        if size > budget:
+            runs.append(_spill_run(run, key, reverse))
+            run, size = [], 0
+
+    if not runs:
+        run.sort(key=key, reverse=reverse)
+        return iter(run)
+    if run:
+        runs.append(_spill_run(run, key, reverse))
+    return heapq.merge(*(r.read() for r in runs), key=key, reverse=reverse)
+
+
+def _spill_run(run, key, reverse):
+    run.sort(key=key, reverse=reverse)
+    spill = _Spill()
+    for item in run:
+        spill.write(item)
+    spill.flush()
+    return spill
+
+
+def group_by(key, items, budget=DEFAULT_BUDGET):
+    ''' :: f(a) -> b, Itr[a] -> Gen[(b, List[a])]
+    Group items by key. Groups come out in the order their keys were first
+    seen unless the groups had to be spilled to disk.
+    NOTE: Each single group has to fit in memory.
+    '''
+    return _group(((key(item), [item]) for item in items), budget, 0)
+
+
+def _group(pairs, budget, depth):
+    groups, size = {}, 0
+    partitions = None
+    for k, vals in pairs:
+        group = groups.get(k)
+        if group is None:
+            groups[k] = group = []
+        group.extend(vals)
+        size += sum(map(_sizeof, vals))
+        if size > budget and depth < MAX_DEPTH:
+            if partitions is None:
+                partitions = [_Spill() for _ in range(FANOUT)]
+            _spill_groups(groups, partitions, depth)
+            groups, size = {}, 0
+
+    if partitions is None:
+        for group in groups.items():
+            yield group
+        return
+    _spill_groups(groups, partitions, depth)
+    for partition in partitions:
+        for group in _group(partition.read(), budget, depth + 1):
+            yield group
+
+
+def _spill_groups(groups, partitions, depth):
+    for group in groups.items():
+        partitions[hash((depth, group[0])) % FANOUT].write(group)
+    # Groups can be big so don't leave them sitting in the write buffers
+    for partition in partitions:
+        partition.flush()
+
+
+def join(left, right, left_key, right_key=None, budget=DEFAULT_BUDGET):
+    ''' :: Itr[a], Itr[b], f(a) -> k, f(b) -> k -> Gen[(a, b)]
+    Inner join: every (l, r) pair where left_key(l) == right_key(r).
+    right_key defaults to left_key. The right hand side is the one held in
+    memory so make it the smaller input.
+    '''
+    return _hash_join(iter(left), iter(right), left_key,
+                      right_key or left_key, budget, 0)
+
+
+def _hash_join(left, right, left_key, right_key, budget, depth):
+    table, size = {}, 0
+    for item in right:
+        k = right_key(item)
+        try:
+            matches = table.get(k)
+        except TypeError:
+            # Unhashable keys: sort and merge instead
+            rest = itertools.chain(_flatten(table), [item], right)
+            for pair in _sort_merge_join(
+                    left, rest, left_key, right_key, budget):
+                yield pair
+            return
+        if matches is None:
+            table[k] = matches = []
+        matches.append(item)
+        size += _sizeof(item)
+
+        if size > budget:
+            rest = itertools.chain(_flatten(table), right)
+            if depth >= MAX_DEPTH:
+                # Hashing isn't splitting this up any more (a few huge
+                # keys) so stream a sort-merge join instead.
+                joined = _sort_merge_join(
+                    left, rest, left_key, right_key, budget)
+            else:
+                joined = _grace_join(
+                    left, rest, left_key, right_key, budget, depth)
+            for pair in joined:
+                yield pair
+            return
+
+    for item in left:
+        k = left_key(item)
+        try:
+            matches = table.get(k, ())
+        except TypeError:
+            # Unhashable keys can still compare equal to some of ours
+            matches = [m for key in table if key == k for m in table[key]]
+        for match in matches:
+            yield item, match
+
+
+def _flatten(table):
+    return itertools.chain.from_iterable(table.values())
+
+
+def _partition(items, key, depth):
+    partitions = [_Spill() for _ in range(FANOUT)]
+    for item in items:
+        try:
+            index = hash((depth, key(item))) % FANOUT
+        except TypeError:
+            # Unhashable keys all go together (see _hash_join)
+            index = 0
+        partitions[index].write(item)
+    return partitions
+
+
+def _grace_join(left, right, left_key, right_key, budget, depth):
+    '''Hash partition both sides to disk and join each pair of partitions'''
+    rights = _partition(right, right_key, depth)
+    lefts = _partition(left, left_key, depth)
+    for lpart, rpart in zip(lefts, rights):
+        for pair in _hash_join(lpart.read(), rpart.read(),
+                               left_key, right_key, budget, depth + 1):
+            yield pair
+
+
+def _sort_merge_join(left, right, left_key, right_key, budget):
+    '''
+    Externally sort both sides and walk them together. Only the right
+    hand items for the current key are held in memory.
+    '''
+    lgroups = itertools.groupby(sort_by(left_key, left, budget), left_key)
+    rgroups = itertools.groupby(sort_by(right_key, right, budget), right_key)
+    try:
+        lk, litems = next(lgroups)
+        rk, ritems = next(rgroups)
+        while True:
+            if lk < rk:
+                lk, litems = next(lgroups)
+            elif rk < lk:
+                rk, ritems = next(rgroups)
+            else:
+                matches = list(ritems)
+                for item in litems:
+                    for match in matches:
+                        yield item, match
+                lk, litems = next(lgroups)
+                rk, ritems = next(rgroups)
+    except StopIteration:
+        return
@@ -0,0 +1,199 @@
+'''
+The interactive RIPL REPL.
+
+This is kept apart from ripl.evaluators so that running scripts and
+one-shot expressions (`ripl -s ...`) doesn't pay for importing
+prompt_toolkit and pygments.
+'''
+from collections import Counter
+
+from pygments.token import Token
+
+from prompt_toolkit.keys import Keys
+from prompt_toolkit.document import Document
+from prompt_toolkit.filters import IsDone, Filter
+from prompt_toolkit.history import InMemoryHistory
+from prompt_toolkit.layout.lexers import PygmentsLexer
+from prompt_toolkit.interface import CommandLineInterface
+from prompt_toolkit.contrib.completers import WordCompleter
+from prompt_toolkit.auto_suggest import AutoSuggestFromHistory
+from prompt_toolkit.key_binding.manager import KeyBindingManager
+from prompt_toolkit.validation import Validator, ValidationError
+from prompt_toolkit.clipboard.pyperclip import PyperclipClipboard
+from prompt_toolkit.layout.processors import \
+    ConditionalProcessor, HighlightMatchingBracketProcessor
+from prompt_toolkit.shortcuts import \
+        create_prompt_application, create_output, create_eventloop
+
+from ripl.evaluators import Evaluator
+from ripl.repl_utils import RiplLexer, ripl_style
+
+
+def is_balanced(text):
+    '''Check that () {} [] are all matched'''
+    c = Counter(text)
+    return all([c['('] == c[')'], c['{'] == c['}'], c['['] == c[']']])
+
+
+class ParenValidator(Validator):
+    '''
+    Check that the input has balanced parens/brackets/braces
+    '''
+    def validate(self, document):
+        balanced = is_balanced(document.text)
+        if not balanced:
+            raise ValidationError(
+                message='Unclosed expression in input',
+                cursor_position=len(document.text))
+
+
+class Tab_to_whitespace(Filter):
+    '''
+    Insert whitespace rather than autocomplete when there is nothing
+    to complete.
+    '''
+    def __call__(self, cli):
+        b = cli.current_buffer
+        before_cursor = b.document.current_line_before_cursor
+
+        return b.text and (not before_cursor or before_cursor.isspace())
+
+
+def newline_and_indent(buf):
+    '''Insert a new line and handle indenting based on input so far'''
+    if buf.document.current_line_after_cursor:
+        # Cursor is in the middle of a line: always insert a new line
+        buf.insert_text('\n')
+    else:
+        # Cursor is at the end of a line so add a new line and
+        # work out how far we need to indent.
+        buf.insert_text('\n')
+        # If we are indenting, we are unbalanced so find out
+        # how many open expressions are in the current buffer.
+        indent = 0
+        c = Counter(buf.document.text)
+        indent += (c.get('(', 0) - c.get(')', 0))
+        indent += (c.get('[', 0) - c.get(']', 0))
+        indent += (c.get('{', 0) - c.get('}', 0))
+        buf.insert_text('  ' * indent)
+
+
+class REPL(Evaluator):
+    completions = (
+            'define defn defn/memo defn/cached defgen lambda if for-each'
+            ' quote yield yield-from defstage run-dag memoize apply append'
+            ' begin future deref'
+            ' pyimport car cdr cons not vector eq? equal? callable? null?'
+            ' symbol? dict? tuple? list? vector? int? float? number? complex? eval'
+            ).split()
+    completions.extend([
+            'getattr', 'str', 'property', 'license', 'divmod', 'object',
+            'issubclass', 'all', 'exit', 'None', 'format', 'set', 'slice',
+            'max', 'complex', 'chr', 'id', 'reversed', 'SystemExit', 'hex',
+            'True', 'type', 'len', 'open', 'bool', 'dict', 'next', 'bytes',
+            'Exception', 'min', 'hasattr', 'range', 'Ellipsis', 'any',
+            'abs', 'round', 'compile', 'quit', 'staticmethod', 'float',
+            'eval', 'credits', 'exec', 'memoryview', 'delattr', 'dir',
+            'ord', 'print', 'callable', 'bytearray', 'sum', 'bin',
+            'frozenset', 'StopAsyncIteration', 'vars', 'repr', 'globals',
+            'oct', 'pow', 'sorted', 'tuple', 'filter', 'isinstance', 'int',
+            'zip', 'setattr', 'input', 'help', 'hash', 'enumerate',
+            'False', 'locals', 'list', 'map', 'ascii', 'super', 'iter'
+            ])
+
+    def cont_tokens(self, cli, width):
+        '''For use with multiline input when I get that working...'''
+        return [(Token, '~' * (width - 1) + ' ')]
+
+    def read(self, prompt_str='λ く'):
+        '''
+        The main read eval print loop for RIPL.
+        Uses prompt_toolkit:
+            http://python-prompt-toolkit.readthedocs.io/en/stable/
+        '''
+        def exit_message():
+            print('\nThanks for giving RIPL a try!\nさようなら!\n')
+
+        if not self.global_scope:
+            raise EnvironmentError('Things have gone horribly wrong...')
+
+        print(' <({[ RIPL -- RIPL Is Pythonic Lisp ]})>\n'
+              '    Ctrl-Space to enter selection mode.\n'
+              '    Ctrl-W/Y to cut/paste to system clipboard.\n'
+              '    Ctrl-D to exit\n')
+
+        history = InMemoryHistory()
+        completer = WordCompleter(self.completions, ignore_case=True)
+        kbm = KeyBindingManager.for_prompt(enable_system_bindings=True)
+        add_binding = kbm.registry.add_binding
+
+        @add_binding(Keys.Tab, filter=Tab_to_whitespace())
+        def _(event):
+            '''Either indent or do completion'''
+            event.cli.current_buffer.insert_text('  ')
+
+        @add_binding(Keys.ControlJ)
+        def __(event):
+            '''Either enter a newline or accept input based on context'''
+            b = event.current_buffer
+            txt = b.document.text
+
+            def at_end(b):
+                '''Is the cursor at the end of the buffer?'''
+                text = b.document.text_after_cursor
+                return text == '' or (text.isspace() and '\n' not in text)
+
+            at_end = at_end(b)
+            has_empty_line = txt.replace(' ', '').endswith('\n')
+            balanced = is_balanced(b.document.text)
+            if (at_end and has_empty_line) or balanced:
+                if b.validate():
+                    b.accept_action.validate_and_handle(event.cli, b)
+            else:
+                newline_and_indent(b)
+
+        # Show matching parentheses, but only while editing.
+        highlight_parens = ConditionalProcessor(
+            processor=HighlightMatchingBracketProcessor(
+                chars='[](){}'),
+            filter=~IsDone())
+
+        while True:
+            repl = create_prompt_application(
+                    prompt_str,
+                    multiline=True,
+                    history=history,
+                    style=ripl_style,
+                    mouse_support=True,
+                    completer=completer,
+                    validator=ParenValidator(),
+                    enable_history_search=True,
+                    complete_while_typing=False,
+                    clipboard=PyperclipClipboard(),
+                    lexer=PygmentsLexer(RiplLexer),
+                    key_bindings_registry=kbm.registry,
+                    display_completions_in_columns=True,
+                    auto_suggest=AutoSuggestFromHistory(),
+                    get_continuation_tokens=self.cont_tokens,
+                    extra_input_processors=[highlight_parens])
+
+            try:
+                eventloop = create_eventloop()
+                cli = CommandLineInterface(
+                    application=repl,
+                    eventloop=eventloop,
+                    output=create_output(true_color=True))
+
+                user_input = cli.run(reset_current_buffer=False)
+                if user_input:
+                    if isinstance(user_input, Document):
+                        user_input = user_input.text
+                    lines = user_input.split('\n')
+                    expression = ' '.join([l.strip() for l in lines])
+                    self.eval_and_print(expression)
+            except (EOFError, KeyboardInterrupt):
+                # User hit Ctl+d
+                exit_message()
+                break
+            finally:
+                eventloop.close()
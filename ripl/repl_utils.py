@@ -28,7 +28,8 @@ class RiplLexer(RegexLexer):
         'car', 'cdr', 'import', 'do', 'is', 'in', 'eval',
         'quasiquote', 'unquote', 'unquote-splice', 'quote')
 
-    declarations = 'define defn defmacro defclass lambda setv let'.split()
+    declarations = \
+        'define defn defgen defmacro defclass lambda setv let'.split()
 
     builtins = (
         'define defn lambda if for-each quote yield yield-from'
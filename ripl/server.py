@@ -0,0 +1,199 @@
+'''
+A resident ripl server so that scripts don't pay for interpreter startup
+on every call.
+
+    ripl serve [--socket PATH | --socket HOST:PORT [--allow-remote]]
+    ripl -c '(+ 1 2)'
+
+The server listens on a Unix socket (RIPL_SOCKET, default
+$TMPDIR/ripl-$UID.sock) or a TCP port. Anything that can connect can run
+arbitrary code as the server's user and there is no authentication, so
+TCP is limited to loopback addresses unless allow_remote is set. Each
+connection gets its own
+session: an Evaluator in front of the shared base scope (see
+ripl.evaluators.base_scope) so that definitions don't leak between
+clients and new sessions are cheap.
+
+Requests and responses are JSON, one object per line:
+
+    -> {"id": 1, "code": "(define x 2) (* x 21)"}
+    <- {"id": 1, "result": "42"}
+    <- {"id": 1, "done": true}
+
+A "result" is sent for each top level expression with a value, as soon as
+it has been evaluated. If evaluating fails the server sends
+{"id": 1, "error": "<traceback>"} in place of "done" and skips the rest
+of the request. Requests on a connection run one at a time, in order, on
+a pool of worker threads so that one slow session doesn't hold up the
+others.
+
+NOTE: Anything printed by ripl code goes to the server's stdout.
+'''
+import os
+import sys
+import json
+import stat
+import asyncio
+import ipaddress
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import ADDRESS, parse_address
+from .evaluators import Evaluator
+
+# Longest request line in bytes
+LINE_LIMIT = 2**26
+
+
+class Session:
+    '''The evaluator behind one connection'''
+    def __init__(self):
+        self.evaluator = Evaluator()
+
+    def run(self, code, emit):
+        ''' :: str, Callable[[str], None] -> None
+        Evaluate each top level form in `code`, passing the printed value
+        of each one to `emit`.
+        '''
+        evaluator = self.evaluator
+        reader = evaluator.reader
+        for exp in reader.parse(reader.lex(code)):
+            value = evaluator.eval(exp, evaluator.global_scope)
+            if value is not None:
+                emit(evaluator.py_to_lisp_str(value))
+
+
+def is_loopback(host):
+    ''' :: str -> bool'''
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        # Any other host name could resolve to anything
+        return False
+
+
+def remove_stale_socket(path):
+    ''' :: str -> None
+    Remove a socket left behind by a server that didn't shut down cleanly.
+    Anything else at `path` is left alone and raises FileExistsError.
+    '''
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(
+            '{} exists and is not a socket: not removing it'.format(path))
+    os.unlink(path)
+
+
+class Server:
+    def __init__(self, address=ADDRESS, workers=None, allow_remote=False):
+        self.address = parse_address(address)
+        if isinstance(self.address, tuple):
+            host = self.address[0]
+            if not (allow_remote or is_loopback(host)):
+                raise ValueError(
+                    'refusing to serve on {}: anyone who can connect can run '
+                    'code, pass allow_remote to do so anyway'.format(host))
+        else:
+            remove_stale_socket(self.address)
+        self.executor = ThreadPoolExecutor(workers)
+        self.ready = threading.Event()
+        self.loop = None
+        self.tasks = set()
+
+    def serve_forever(self):
+        '''Serve on a new event loop in this thread until `stop` is called'''
+        loop = self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(self._start())
+        self.ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            server.close()
+            # Hang up on any open sessions
+            for task in self.tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(
+                server.wait_closed(), *self.tasks, return_exceptions=True))
+            loop.close()
+            self.executor.shutdown(wait=False)
+            if not isinstance(self.address, tuple):
+                try:
+                    remove_stale_socket(self.address)
+                except FileExistsError:
+                    # Replaced while we were serving: not ours to remove
+                    pass
+
+    def stop(self):
+        '''Stop serving (from any thread)'''
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _start(self):
+        if isinstance(self.address, tuple):
+            host, port = self.address
+            return asyncio.start_server(
+                self._connected, host, port, limit=LINE_LIMIT)
+        return asyncio.start_unix_server(
+            self._connected, self.address, limit=LINE_LIMIT)
+
+    def _connected(self, reader, writer):
+        task = self.loop.create_task(self._session(reader, writer))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _session(self, reader, writer):
+        session = Session()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line.decode())
+                    code = request['code']
+                except (ValueError, KeyError, TypeError):
+                    self._send(writer, {'error': 'bad request'})
+                    continue
+                await self._run(session, code, request.get('id'), writer)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _run(self, session, code, rid, writer):
+        # Results are sent from the worker thread as they are ready. The
+        # callbacks run in order so "done" always comes last.
+        def emit(result):
+            self.loop.call_soon_threadsafe(
+                self._send, writer, {'id': rid, 'result': result})
+        try:
+            await self.loop.run_in_executor(
+                self.executor, session.run, code, emit)
+        except Exception:
+            self._send(writer, {'id': rid, 'error': traceback.format_exc()})
+        else:
+            self._send(writer, {'id': rid, 'done': True})
+
+    def _send(self, writer, response):
+        writer.write(json.dumps(response).encode() + b'\n')
+
+
+def serve(address=ADDRESS, workers=None, allow_remote=False):
+    '''ripl serve: run a server until interrupted'''
+    try:
+        server = Server(address, workers, allow_remote)
+    except (ValueError, OSError) as e:
+        print('ripl serve: {}'.format(e), file=sys.stderr)
+        return 1
+    print('ripl serving on {}'.format(address), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,228 @@
+'''
+Hosting lots of ripl sessions in one process.
+
+    manager = SessionManager(directory='/var/lib/ripl/sessions')
+    sid = manager.create()
+    manager.eval(sid, '(defn f (x) (* x 2)) (f 21)')    # 42
+    manager.memory()                                   # {sid: bytes}
+    manager.evict_idle()
+
+Sessions are Evaluators, each with its own definitions in front of the
+shared read-only base scope (see ripl.evaluators.base_scope), so an idle
+session only costs what it has defined. Sessions that haven't been used
+for `idle` seconds can be saved as images (see ripl.image) and dropped:
+they are loaded again the next time they are used.
+
+Each session has a lock, so a session is only used by one thread at a
+time and can't be evicted while it is being evaluated.
+
+If `track_memory` is set, tracemalloc is started and the net change in
+traced memory over each evaluation is added to its session's total.
+Evaluations are run one at a time so that they don't get each other's
+allocations, but this is only an approximation of what a session holds:
+allocations made by other threads in the meantime are counted, memory
+that an evaluation frees is taken off whoever it belongs to, and shared
+caches are charged to the session that happened to fill them.
+'''
+import os
+import time
+import uuid
+import threading
+import tracemalloc
+
+from .evaluators import Evaluator
+from .image import save_image, load_image
+
+# Seconds without use before evict_idle saves a session to disk
+IDLE_SECONDS = 600
+
+
+class SessionError(KeyError):
+    pass
+
+
+class _Session:
+    __slots__ = 'evaluator', 'used', 'retained', 'path', 'lock'
+
+    def __init__(self, evaluator, path):
+        self.evaluator = evaluator
+        self.used = time.monotonic()
+        self.retained = 0
+        self.path = path
+        # Held while the session is used, restored or saved. Always taken
+        # before the manager's lock.
+        self.lock = threading.RLock()
+
+
+class SessionManager:
+    def __init__(self, directory=None, idle=IDLE_SECONDS,
+                 track_memory=False, use_prelude=True):
+        if directory is None:
+            directory = os.path.join(
+                os.path.expanduser('~'), '.cache', 'ripl', 'sessions')
+        self.directory = directory
+        self.idle = idle
+        self.use_prelude = use_prelude
+        self.track_memory = track_memory
+        self.sessions = {}
+        self.lock = threading.RLock()
+        # Only taken while evaluating if we are tracking memory
+        self.eval_lock = threading.Lock()
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, sid):
+        return sid in self.sessions
+
+    def create(self, sid=None):
+        ''' :: str -> str
+        Start a new session, returning its id
+        '''
+        sid = sid or uuid.uuid4().hex
+        with self.lock:
+            if sid in self.sessions:
+                raise ValueError('session {} already exists'.format(sid))
+            session = _Session(None, os.path.join(self.directory,
+                                                  sid + '.img'))
+
+            def new():
+                session.evaluator = Evaluator(use_prelude=self.use_prelude)
+            self._measure(session, new)
+            self.sessions[sid] = session
+        return sid
+
+    def _session(self, sid):
+        with self.lock:
+            try:
+                return self.sessions[sid]
+            except KeyError:
+                raise SessionError(sid) from None
+
+    def get(self, sid):
+        ''' :: str -> Evaluator
+        The evaluator for a session, loading it from disk if it was evicted
+        '''
+        session = self._session(sid)
+        with session.lock:
+            if session.evaluator is None:
+                self._restore(session)
+            session.used = time.monotonic()
+            return session.evaluator
+
+    def _restore(self, session):
+        def load():
+            session.evaluator = load_image(
+                session.path, Evaluator(use_prelude=self.use_prelude))
+        session.retained = 0
+        self._measure(session, load)
+        os.unlink(session.path)
+
+    def eval(self, sid, code):
+        ''' :: str, str -> Any
+        Evaluate code in a session, returning the value of the last
+        expression.
+        '''
+        session = self._session(sid)
+        with session.lock:
+            evaluator = self.get(sid)
+            reader = evaluator.reader
+
+            def run():
+                result = None
+                for exp in reader.parse(reader.lex(code)):
+                    result = evaluator.eval(exp, evaluator.global_scope)
+                return result
+            return self._measure(session, run)
+
+    def _measure(self, session, func):
+        if not self.track_memory:
+            return func()
+        with self.eval_lock:
+            before = tracemalloc.get_traced_memory()[0]
+            try:
+                return func()
+            finally:
+                after = tracemalloc.get_traced_memory()[0]
+                session.retained = max(0, session.retained + after - before)
+
+    def memory(self, sid=None):
+        ''' :: str -> int | dict
+        Roughly how many bytes each resident session (or just `sid`) holds:
+        the net change in traced memory over its evaluations, so treat it
+        as an estimate (see above). Evicted sessions use none. Needs
+        track_memory.
+        '''
+        if not self.track_memory:
+            raise RuntimeError('SessionManager(track_memory=True) is needed '
+                               'for memory accounting')
+        with self.lock:
+            if sid is not None:
+                return self._session(sid).retained
+            return {sid: s.retained for sid, s in self.sessions.items()}
+
+    def evict(self, sid):
+        ''' :: str -> bool
+        Save a session to disk and drop its evaluator. Sessions holding
+        anything that can't be saved stay in memory: returns whether the
+        session was evicted.
+        '''
+        session = self._session(sid)
+        with session.lock:
+            if session.evaluator is None:
+                return True
+            os.makedirs(self.directory, exist_ok=True)
+            if save_image(session.evaluator, session.path):
+                os.unlink(session.path)
+                return False
+            session.evaluator = None
+            session.retained = 0
+            return True
+
+    def evict_idle(self):
+        ''' :: -> List[str]
+        Evict every session that hasn't been used for `idle` seconds,
+        returning their ids. Sessions that are in use are skipped.
+        '''
+        cutoff = time.monotonic() - self.idle
+        with self.lock:
+            idle = [(sid, s) for sid, s in self.sessions.items()
+                    if s.evaluator is not None and s.used < cutoff]
+        evicted = []
+        for sid, session in idle:
+            if not session.lock.acquire(blocking=False):
+                continue
+            try:
+                # It may have been used or closed since we looked
+                if (session.used < cutoff and sid in self.sessions and
+                        self.evict(sid)):
+                    evicted.append(sid)
+            finally:
+                session.lock.release()
+        return evicted
+
+    def close(self, sid):
+        '''End a session, deleting it from disk if it was evicted'''
+        session = self._session(sid)
+        with session.lock, self.lock:
+            if self.sessions.get(sid) is not session:
+                raise SessionError(sid)
+            del self.sessions[sid]
+            if session.evaluator is None:
+                os.unlink(session.path)
+
+    def stats(self):
+        ''' :: -> dict
+        Session counts and (if tracked) the total memory they hold
+        '''
+        with self.lock:
+            resident = sum(s.evaluator is not None
+                           for s in self.sessions.values())
+            stats = {'sessions': len(self.sessions), 'resident': resident,
+                     'evicted': len(self.sessions) - resident}
+            if self.track_memory:
+                stats['retained'] = sum(s.retained
+                                        for s in self.sessions.values())
+        return stats
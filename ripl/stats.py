@@ -0,0 +1,171 @@
+'''
+Counters for what the interpreter is doing.
+
+    evaluator.enable_stats()
+    ...
+    (interp-stats)                # or evaluator.stats.report()
+
+    ripl --stats -s '(...)'       # print a report on exit
+
+While enabled, InterpStats counts:
+    steps        trips round the evaluator loop
+    forms        steps by kind of syntax (call, if, define, symref...)
+    calls        calls to ripl Funcs by name
+    tail_calls   calls made from the tail position of a Func body, which
+                 reuse the evaluator loop rather than a Python frame
+    lookups      how many scopes up symbols were found: 0 is the current
+                 Func's parameters and the last entry is the globals
+    lex/parse    seconds spent in Reader.lex and Reader.parse
+
+The evaluator hands each step to whatever is watching it (an InterpStats
+and/or a Budget, see ripl.budget), so with neither the only cost is an
+`is None` test per step.
+NOTE: Compiled Funcs (see ripl.compiler) run without the evaluator so
+      their steps aren't counted: `jit_events` says which Funcs have been
+      compiled. Calls to them are, apart from self tail calls (which
+      compile to loops).
+'''
+import time
+from collections import Counter
+
+from .bases import RDict
+from .nodes import Call, SymRef, If, Attr
+
+
+class InterpStats:
+    def __init__(self):
+        self.steps = 0
+        self.forms = Counter()
+        self.calls = Counter()
+        self.tail_calls = 0
+        self.lookups = Counter()
+        self.lex_seconds = 0.0
+        self.parse_seconds = 0.0
+        # Func bodies we have seen (kept so that their ids stay unique)
+        # and the ids of the Calls in tail position in any of them
+        self._bodies = {}
+        self._tail_ids = set()
+
+    def step(self, node, scope):
+        '''Called by the evaluator for every step'''
+        self.steps += 1
+        cls = node.__class__
+        self.forms[cls.__name__.lower()] += 1
+        if cls is SymRef:
+            self._lookup(node.sym, scope)
+        elif cls is Attr:
+            self._lookup(node.obj.sym, scope)
+        elif cls is Call:
+            # Symbol heads and arguments are looked up without a step of
+            # their own
+            if node.func.__class__ is SymRef:
+                self._lookup(node.func.sym, scope)
+            for arg in node.args:
+                if arg.__class__ is SymRef:
+                    self._lookup(arg.sym, scope)
+
+    def _lookup(self, sym, scope):
+        for depth, defs in enumerate(scope.maps):
+            if sym in defs:
+                self.lookups[depth] += 1
+                return
+
+    def call(self, func, node=None):
+        '''Called for every call to a ripl Func (from `node` if known)'''
+        self.calls[func.name or 'lambda'] += 1
+        if node is not None and id(node) in self._tail_ids:
+            self.tail_calls += 1
+        body = func.body
+        if id(body) not in self._bodies:
+            self._bodies[id(body)] = body
+            self._tail_ids.update(_tail_calls(body))
+
+    def wrap_reader(self, reader):
+        '''Time the lex and parse methods of a Reader'''
+        lex, parse = reader.lex, reader.parse
+
+        def timed_lex(string):
+            return self._timed(lex(string), 'lex_seconds')
+
+        def timed_parse(tokens):
+            return self._timed(parse(tokens), 'parse_seconds')
+        reader.lex, reader.parse = timed_lex, timed_parse
+
+    def _timed(self, gen, counter):
+        while True:
+            lexing = self.lex_seconds
+            start = time.perf_counter()
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - start
+                if counter == 'parse_seconds':
+                    # Parsing pulls tokens from lex: don't count them twice
+                    elapsed -= self.lex_seconds - lexing
+                setattr(self, counter, getattr(self, counter) + elapsed)
+            yield item
+
+    def snapshot(self):
+        ''' :: -> RDict
+        The current counts as ripl data
+        '''
+        return RDict(
+            steps=self.steps,
+            forms=RDict(self.forms),
+            calls=RDict(self.calls),
+            tail_calls=self.tail_calls,
+            lookups=RDict(self.lookups),
+            lex_seconds=self.lex_seconds,
+            parse_seconds=self.parse_seconds)
+
+    def report(self, top=10):
+        ''' :: -> str
+        A summary for people
+        '''
+        lines = [
+            'steps        {}'.format(self.steps),
+            'tail calls   {}'.format(self.tail_calls),
+            'lex          {:.3f}ms'.format(self.lex_seconds * 1e3),
+            'parse        {:.3f}ms'.format(self.parse_seconds * 1e3),
+            'forms',
+            ]
+        lines.extend('  {:<24}{:>10}'.format(name, count)
+                     for name, count in self.forms.most_common())
+        lines.append('calls')
+        lines.extend('  {:<24}{:>10}'.format(str(name), count)
+                     for name, count in self.calls.most_common(top))
+        lines.append('lookup depth')
+        lines.extend('  {:<24}{:>10}'.format(depth, count)
+                     for depth, count in sorted(self.lookups.items()))
+        return '\n'.join(lines)
+
+
+class Watchers:
+    '''Hand each step to several watchers (an InterpStats and a Budget)'''
+    __slots__ = 'watchers',
+
+    def __init__(self, *watchers):
+        self.watchers = watchers
+
+    def step(self, node, scope):
+        for watcher in self.watchers:
+            watcher.step(node, scope)
+
+    def call(self, func, node=None):
+        for watcher in self.watchers:
+            watcher.call(func, node)
+
+
+def _tail_calls(body):
+    '''The ids of the Calls in tail position in a Func body'''
+    tails = set()
+    todo = [body]
+    while todo:
+        node = todo.pop()
+        if node.__class__ is Call:
+            tails.add(id(node))
+        elif node.__class__ is If:
+            todo.extend((node.then, node.orelse))
+    return tails
@@ -0,0 +1,283 @@
+'''
+Columnar tables for data pipelines.
+
+A Table stores each column as a single sequence rather than a dict per
+row: numeric columns become numpy arrays (int64 / float64), or stdlib
+`array`s if numpy isn't installed, and everything else is a plain list.
+Selecting columns shares the underlying data and filtering works on whole
+columns at once, so no per-row dicts are ever built.
+
+    (define t (read-csv "prices.csv"))
+    (select t "name" "price")
+    (filter-rows t (lambda (p) (> p 10)) "price")
+    (with-column t "total" (lambda (p q) (* p q)) "price" "qty")
+
+`read_csv` and `read_jsonl` stream the file in `chunk_size` row chunks,
+converting each chunk to typed columns before reading the next, so only
+one chunk of Python objects is alive at a time.
+'''
+import csv
+import json
+import itertools
+from array import array
+from collections import OrderedDict
+
+from .arrays import numpy
+
+# Tables are numpy backed where possible, so load it with the module
+np = numpy()
+
+CHUNK_SIZE = 65536
+PREVIEW_ROWS = 5
+
+
+class Table:
+    '''
+    A set of named, equal length columns.
+    Tables are functions of their column names: (t "price") -> column
+    '''
+    def __init__(self, columns):
+        self.columns = OrderedDict(columns)
+        lengths = {len(col) for col in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError('Table columns must all be the same length')
+        self.num_rows = lengths.pop() if lengths else 0
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    def __len__(self):
+        return self.num_rows
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise KeyError('no column {} in {!r}'.format(name, self))
+
+    def __call__(self, name):
+        return self[name]
+
+    def __iter__(self):
+        '''Rows as tuples, in column order'''
+        return zip(*self.columns.values())
+
+    def __eq__(self, other):
+        if not isinstance(other, Table) or self.names != other.names:
+            return False
+        return all(_as_list(a) == _as_list(b) for a, b in
+                   zip(self.columns.values(), other.columns.values()))
+
+    def __repr__(self):
+        cols = ', '.join('{} {}'.format(name, _kind(col))
+                         for name, col in self.columns.items())
+        return '<Table {} rows: {}>'.format(self.num_rows, cols)
+
+    def select(self, *names):
+        ''' :: *str -> Table
+        A new Table with just the given columns (the data is shared)
+        '''
+        return Table((name, self[name]) for name in names)
+
+    def where(self, mask):
+        ''' :: Itr[bool] -> Table
+        A new Table with only the rows where mask is true.
+        '''
+        if np is not None:
+            mask = np.asarray(mask, dtype=bool)
+        else:
+            mask = list(mask)
+        if len(mask) != self.num_rows:
+            raise ValueError('mask does not match the Table length')
+        return Table((name, _take(col, mask))
+                     for name, col in self.columns.items())
+
+    def with_column(self, name, values):
+        ''' :: str, Itr -> Table
+        A new Table with an extra (or replaced) column.
+        '''
+        if not _is_column(values):
+            values = _pack(list(values))
+        columns = OrderedDict(self.columns)
+        columns[name] = values
+        return Table(columns)
+
+    def head(self, num=PREVIEW_ROWS):
+        ''' :: int -> Table
+        The first `num` rows.
+        '''
+        return Table((name, col[:num]) for name, col in self.columns.items())
+
+    def preview(self, num=PREVIEW_ROWS):
+        ''' :: int -> str
+        The column names and types followed by the first few rows.
+        '''
+        header = ['{}:{}'.format(name, _kind(col))
+                  for name, col in self.columns.items()]
+        rows = [[repr(v) if isinstance(v, str) else str(v) for v in row]
+                for row in self.head(num)]
+        widths = [max(len(cell) for cell in column)
+                  for column in zip(header, *rows)]
+        lines = ['  '.join(cell.ljust(w) for cell, w in zip(line, widths))
+                 .rstrip() for line in [header] + rows]
+        if self.num_rows > num:
+            lines.append('... {} rows'.format(self.num_rows))
+        return '\n'.join(lines)
+
+
+def read_csv(path, columns=None, chunk_size=CHUNK_SIZE, delimiter=','):
+    ''' :: str -> Table
+    Load a CSV file with a header row into a Table. Columns of numbers are
+    typed, anything else is kept as strings. If `columns` is given, only
+    those columns are kept.
+    '''
+    with open(path, newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        try:
+            header = next(reader)
+        except StopIteration:
+            return Table([])
+        names = header if columns is None else list(columns)
+        missing = [name for name in names if name not in header]
+        if missing:
+            raise KeyError('{} has no columns {}'.format(path, missing))
+
+        index = [header.index(name) for name in names]
+        chunks = {name: [] for name in names}
+        for rows in _chunked(filter(None, reader), chunk_size):
+            if any(len(row) != len(header) for row in rows):
+                raise ValueError(
+                    '{}: rows must match the header'.format(path))
+            cols = list(zip(*rows))
+            for name, i in zip(names, index):
+                chunks[name].append(_parse(cols[i]))
+    return Table((name, _concat(chunks[name], str)) for name in names)
+
+
+def read_jsonl(path, columns=None, chunk_size=CHUNK_SIZE):
+    ''' :: str -> Table
+    Load a file of one JSON object per line into a Table. The columns are
+    the keys of the first record unless `columns` is given; missing keys
+    become None.
+    '''
+    names = None if columns is None else list(columns)
+    chunks = {}
+    with open(path) as f:
+        records = (json.loads(line) for line in f if line.strip())
+        for batch in _chunked(records, chunk_size):
+            if names is None:
+                names = list(batch[0])
+            for name in names:
+                chunks.setdefault(name, []).append(
+                    _pack([r.get(name) for r in batch]))
+    return Table((name, _concat(chunks.get(name, []), None))
+                 for name in names or [])
+
+
+def _chunked(itr, size):
+    '''Yield lists of up to `size` items'''
+    itr = iter(itr)
+    while True:
+        chunk = list(itertools.islice(itr, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _typed(values, kind):
+    ''' :: Itr, int|float -> column
+    Store numbers as an int64 / float64 column.
+    Raises ValueError or OverflowError if they don't fit.
+    '''
+    if np is not None:
+        return np.array(values, dtype='int64' if kind is int else 'float64')
+    return array('q' if kind is int else 'd', map(kind, values))
+
+
+def _parse(values):
+    ''' :: Tuple[str] -> column
+    Type a chunk of CSV strings as ints, then floats, then leave them be.
+    '''
+    for kind in (int, float):
+        try:
+            return _typed(values, kind)
+        except (ValueError, OverflowError):
+            continue
+    return list(values)
+
+
+def _pack(values):
+    ''' :: List[Any] -> column
+    Store already typed values (JSON) in a typed column if they are all
+    numbers of the same kind.
+    '''
+    kinds = {type(v) for v in values}
+    if kinds == {int} or kinds == {float} or kinds == {int, float}:
+        try:
+            return _typed(values, int if kinds == {int} else float)
+        except OverflowError:
+            pass
+    return values
+
+
+def _concat(chunks, untyped):
+    ''' :: List[column], f(a) -> b | None -> column
+    Join the chunks of a column. If some chunks were typed and some were
+    not, the typed values are converted back with `untyped`.
+    NOTE: For CSVs that means str(value), so a column of '1.50' ... 'n/a'
+          will hold '1.5' ... 'n/a'.
+    '''
+    if not chunks:
+        return []
+    elif len(chunks) == 1:
+        return chunks[0]
+    elif any(isinstance(c, list) for c in chunks):
+        return list(itertools.chain.from_iterable(
+            c if isinstance(c, list) else
+            (map(untyped, _as_list(c)) if untyped else _as_list(c))
+            for c in chunks))
+    elif np is not None:
+        return np.concatenate(chunks)
+    codes = {c.typecode for c in chunks}
+    return array(codes.pop() if len(codes) == 1 else 'd',
+                 itertools.chain.from_iterable(chunks))
+
+
+def _is_column(values):
+    return isinstance(values, (list, array)) or (
+        np is not None and isinstance(values, np.ndarray))
+
+
+def _take(col, mask):
+    '''The elements of a column where mask is true'''
+    if np is not None and isinstance(col, np.ndarray):
+        return col[mask]
+    picked = itertools.compress(col, mask)
+    if isinstance(col, array):
+        return array(col.typecode, picked)
+    return list(picked)
+
+
+def _as_list(col):
+    if isinstance(col, array) or (
+            np is not None and isinstance(col, np.ndarray)):
+        return col.tolist()
+    return list(col)
+
+
+def _kind(col):
+    ''' :: column -> str
+    A short name for the type of a column.
+    '''
+    if isinstance(col, array):
+        return {'q': 'i64', 'd': 'f64'}.get(col.typecode, col.typecode)
+    elif np is not None and isinstance(col, np.ndarray):
+        return {'int64': 'i64', 'float64': 'f64', 'int32': 'i32',
+                'float32': 'f32'}.get(col.dtype.name, col.dtype.name)
+    # Only look at the start of long columns
+    kinds = {type(v).__name__ for v in itertools.islice(col, 1000)}
+    return kinds.pop() if len(kinds) == 1 else 'any'
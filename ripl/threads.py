@@ -0,0 +1,65 @@
+'''
+Running ripl from several threads.
+
+    evaluator = ThreadSafeEvaluator()       # see ripl.evaluators
+    # Any number of threads can now evaluate code and call its Funcs
+
+    (define page (future (fetch "http://...")))  ; runs on the shared pool
+    (deref page)                                  ; waits for the result
+
+Evaluators are always careful about the shared state that ripl code
+changes:
+    - Each call to a Func gets a fresh scope for its arguments and local
+      definitions, so concurrent calls (from ripl or Python) don't see
+      each other's variables.
+    - define/set/defn... publish the new binding and bump the evaluator's
+      epoch together under `evaluator.lock`, so other threads see either
+      the old definition or the new one and compiled code never misses a
+      change to its guards. Redefining a name that another thread has just
+      defined fails as it would have done in one thread.
+    - Names copied up from the base scope and cached dotted lookups (see
+      ripl.bases.Overlay) are filled in and forgotten under the same lock,
+      so a lookup can't undo a definition made while it was running.
+    - Call sites that cache methods (see ripl.nodes.MethodCall) replace
+      their cache in one step, and memoised Funcs lock their caches.
+
+A ThreadSafeEvaluator also keeps the things that describe a single
+evaluation per thread: a Budget only limits the thread that passed it to
+`eval` and only one thread compiles a hot Func. Stats (see ripl.stats)
+are shared and their counts are approximate while threads race.
+
+`(future expr)` evaluates expr on a thread pool shared by every evaluator
+in the process and gives back a concurrent.futures.Future. Anything expr
+defines goes in a scope of its own rather than the caller's. The pool is
+sized for waiting on I/O: CPU bound work only runs in parallel on a free
+threaded build of Python.
+'''
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads in the shared pool used by `future`
+WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    ''' :: -> ThreadPoolExecutor
+    The pool that `future` runs on, started when first needed
+    '''
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS)
+        return _executor
+
+
+def shutdown(wait=True):
+    '''Stop the shared pool (a new one is started if it is needed again)'''
+    global _executor
+    with _executor_lock:
+        pool, _executor = _executor, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
@@ -7,25 +7,67 @@ http://www.kylem.net/programming/tailcall.html
 http://stackoverflow.com/questions/13591970/does-python-optimize-tail-recursion
 '''
 from .bases import Symbol
+from .operators import add
 
 import functools
-import operator as op
 from importlib import import_module
+from importlib.util import find_spec
 
 
 def _ripl_add(*lst):
     '''
     Add an arbitrary number of numerics or cat
     an arbitrary number of strings together.
+    NOTE: This is `+` from ripl.operators.
     '''
-    return functools.reduce(op.add, lst)
+    return add(*lst)
 
 
-def pyimport(module, scope, _as=None, _from=None):
+class ModuleProxy:
+    '''
+    Stands in for a module in a scope. The module is only imported when
+    one of its attributes is first used and each attribute is cached on
+    the proxy, so `np.mean` costs a dict lookup after the first call.
+    '''
+    def __init__(self, name, module=None):
+        self.__name__ = name
+        self.__module = module
+
+    def __repr__(self):
+        state = '' if self.__module is not None else ' (not imported)'
+        return '<module proxy {}{}>'.format(self.__name__, state)
+
+    @property
+    def __wrapped__(self):
+        '''The module itself (imported if need be)'''
+        if self.__module is None:
+            self.__module = import_module(self.__name__)
+        return self.__module
+
+    def __reduce__(self):
+        return ModuleProxy, (self.__name__,)
+
+    def __getattr__(self, attr):
+        # Only called for attributes we don't have yet
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        value = getattr(self.__wrapped__, attr)
+        setattr(self, attr, value)
+        return value
+
+    def __dir__(self):
+        return dir(self.__wrapped__)
+
+
+def pyimport(module, scope, _as=None, _from=None, lazy=True):
     '''
     Import a module and insert it into the given environment.
     --> This will perform inports with local scope.
 
+    The module is bound (as a ModuleProxy) under its name or `_as` and its
+    attributes are found through dotted symbols: math.sin. Unless `lazy`
+    is False the module isn't imported until it is first used.
+
     Args:
         _as   :: str <Name to bind the module under>
         _form :: list[str] <List of submodules to import>
@@ -35,18 +77,20 @@ def pyimport(module, scope, _as=None, _from=None):
         # Can't do `from foo as bar import baz`
         raise SyntaxError('Invalid import')
 
-    # Grab the module from sys.modules
-    raw = import_module(module)
-    mod = vars(raw).items()
+    if _from:
+        # Grab the module from sys.modules
+        mod = vars(import_module(module)).items()
+        scope.update({Symbol(k): v for k, v in mod if k in _from})
+        return scope
 
-    if _as:
-        defs = {Symbol('{}.{}'.format(_as, k)): v for k, v in mod}
-    elif _from:
-        defs = {Symbol(k): v for k, v in mod if k in _from}
+    if lazy:
+        # Fail now rather than on first use if it doesn't exist
+        if find_spec(module) is None:
+            raise ImportError('No module named {!r}'.format(module))
+        proxy = ModuleProxy(module)
     else:
-        defs = {Symbol('{}.{}'.format(module, k)): v for k, v in mod}
-
-    scope.update(defs)
+        proxy = ModuleProxy(module, import_module(module))
+    scope[Symbol(_as or module)] = proxy
     return scope
 
 
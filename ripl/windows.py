@@ -0,0 +1,314 @@
+'''
+Windowed aggregations over streams of events.
+
+    (tumbling-window 60 ts :count events)         ; per minute counts
+    (sliding-window 300 ts (Mean latency) events) ; 5 minute moving mean
+    (session-window 1800 ts :count events user)   ; per user sessions
+
+Each takes a window size (or session gap) in the same units as the
+timestamps, a function to get the timestamp of an event, a reducer, the
+events and optionally a function to key the events by. Results are yielded
+as (start, end, result) or (key, start, end, result) once a window closes.
+
+Reducers are updated one event at a time rather than re-scanning the
+window: sums and counts keep running totals and min/max keep a monotonic
+deque, so every event costs O(1) amortised. A reducer is one of
+    - :sum :count :mean :min :max (or the string names) over the events
+    - Sum(f), Count(), Mean(f), Min(f), Max(f) over f(event)
+    - any binary function, used as a fold over the events in the window
+      NOTE: folds can't drop old events so sliding windows re-fold the
+            whole window for every event.
+
+Events must arrive in timestamp order (ValueError otherwise), which lets
+windows for every key be closed as soon as time has moved past them.
+'''
+from abc import ABC, abstractmethod
+from collections import deque, OrderedDict
+
+from .bases import Keyword
+
+
+class Aggregate(ABC):
+    '''
+    An incrementally updated reduction over the values of f(event).
+    Values are removed in the order they were added (sliding windows).
+    Aggregates that can't remove values set `removable` to False and are
+    rebuilt from the values still in the window instead.
+    '''
+    removable = True
+
+    def __init__(self, value=None):
+        self.value = value if value is not None else _identity
+
+    def fresh(self):
+        '''A new, empty aggregate of the same kind'''
+        return type(self)(self.value)
+
+    @abstractmethod
+    def add(self, val):
+        pass
+
+    @abstractmethod
+    def remove(self, val):
+        pass
+
+    @abstractmethod
+    def result(self):
+        pass
+
+
+class Sum(Aggregate):
+    def __init__(self, value=None):
+        Aggregate.__init__(self, value)
+        self.total = 0
+
+    def add(self, val):
+        self.total += val
+
+    def remove(self, val):
+        self.total -= val
+
+    def result(self):
+        return self.total
+
+
+class Count(Aggregate):
+    def __init__(self, value=None):
+        Aggregate.__init__(self, value)
+        self.count = 0
+
+    def add(self, val):
+        self.count += 1
+
+    def remove(self, val):
+        self.count -= 1
+
+    def result(self):
+        return self.count
+
+
+class Mean(Aggregate):
+    def __init__(self, value=None):
+        Aggregate.__init__(self, value)
+        self.total = 0
+        self.count = 0
+
+    def add(self, val):
+        self.total += val
+        self.count += 1
+
+    def remove(self, val):
+        self.total -= val
+        self.count -= 1
+
+    def result(self):
+        return self.total / self.count if self.count else None
+
+
+class Min(Aggregate):
+    '''
+    Monotonic deque of (position, value): values only ever increase from
+    the front so the front is the minimum of the window.
+    '''
+    def __init__(self, value=None):
+        Aggregate.__init__(self, value)
+        self.window = deque()
+        self.added = 0
+        self.removed = 0
+
+    def _beaten(self, old, new):
+        return old >= new
+
+    def add(self, val):
+        window = self.window
+        while window and self._beaten(window[-1][1], val):
+            window.pop()
+        self.added += 1
+        window.append((self.added, val))
+
+    def remove(self, val):
+        self.removed += 1
+        if self.window and self.window[0][0] == self.removed:
+            self.window.popleft()
+
+    def result(self):
+        return self.window[0][1] if self.window else None
+
+
+class Max(Min):
+    '''As Min but values only ever decrease from the front'''
+    def _beaten(self, old, new):
+        return old <= new
+
+
+class Fold(Aggregate):
+    '''A binary function folded over the events'''
+    removable = False
+    _EMPTY = object()
+
+    def __init__(self, func):
+        Aggregate.__init__(self)
+        self.func = func
+        self.acc = self._EMPTY
+
+    def fresh(self):
+        return Fold(self.func)
+
+    def add(self, val):
+        self.acc = val if self.acc is self._EMPTY else self.func(self.acc, val)
+
+    def remove(self, val):
+        raise TypeError('values can not be removed from a fold')
+
+    def result(self):
+        return None if self.acc is self._EMPTY else self.acc
+
+
+_NAMED = {'sum': Sum, 'count': Count, 'mean': Mean, 'min': Min, 'max': Max}
+
+
+def _identity(x):
+    return x
+
+
+def _aggregate(reducer):
+    ''' :: reducer -> Aggregate'''
+    if isinstance(reducer, Aggregate):
+        return reducer
+    elif isinstance(reducer, (str, Keyword)):
+        name = reducer.str if isinstance(reducer, Keyword) else reducer
+        try:
+            return _NAMED[name.lstrip(':')]()
+        except KeyError:
+            raise ValueError('unknown reducer: {}'.format(reducer))
+    elif callable(reducer):
+        return Fold(reducer)
+    raise TypeError('invalid reducer: {}'.format(reducer))
+
+
+class _Clock:
+    '''Check that timestamps never go backwards'''
+    def __init__(self):
+        self.now = None
+
+    def tick(self, t):
+        if self.now is not None and t < self.now:
+            raise ValueError(
+                'events must be in timestamp order: {} after {}'.format(
+                    t, self.now))
+        self.now = t
+
+
+def _emit(key, keyed, start, end, result):
+    return (key, start, end, result) if keyed else (start, end, result)
+
+
+def tumbling_window(size, timestamp, reducer, events, key=None):
+    ''' :: num, f(e) -> num, reducer, Itr[e], f(e) -> k -> Gen[tuple]
+    Fixed, non-overlapping windows: [0, size), [size, 2*size) ...
+    Windows with no events are skipped.
+    '''
+    template = _aggregate(reducer)
+    value = template.value
+    clock = _Clock()
+    # key -> [start, aggregate] in the order the windows were opened
+    open_windows = OrderedDict()
+    for event in events:
+        t = timestamp(event)
+        clock.tick(t)
+        # All windows are the same size so they close in the order they
+        # were opened.
+        while open_windows:
+            k, (start, agg) = next(iter(open_windows.items()))
+            if start + size > t:
+                break
+            del open_windows[k]
+            yield _emit(k, key, start, start + size, agg.result())
+
+        k = key(event) if key else None
+        window = open_windows.get(k)
+        if window is None:
+            start = t - t % size
+            window = open_windows[k] = [start, template.fresh()]
+        window[1].add(value(event))
+
+    for k, (start, agg) in open_windows.items():
+        yield _emit(k, key, start, start + size, agg.result())
+
+
+def sliding_window(size, timestamp, reducer, events, key=None):
+    ''' :: num, f(e) -> num, reducer, Itr[e], f(e) -> k -> Gen[tuple]
+    For every event at time t, the result over the events in (t - size, t]
+    (with the same key).
+    '''
+    template = _aggregate(reducer)
+    value = template.value
+    clock = _Clock()
+    # key -> (deque of (t, value), aggregate), least recently used first
+    windows = OrderedDict()
+    for event in events:
+        t = timestamp(event)
+        clock.tick(t)
+        horizon = t - size
+        # Drop keys that have gone quiet for a whole window
+        while windows:
+            k, (seen, _) = next(iter(windows.items()))
+            if seen[-1][0] > horizon:
+                break
+            del windows[k]
+
+        k = key(event) if key else None
+        state = windows.pop(k, None)
+        if state is None:
+            state = (deque(), template.fresh())
+        windows[k] = state
+        seen, agg = state
+
+        val = value(event)
+        seen.append((t, val))
+        agg.add(val)
+        expired = False
+        while seen[0][0] <= horizon:
+            old = seen.popleft()[1]
+            if agg.removable:
+                agg.remove(old)
+            expired = True
+        if expired and not agg.removable:
+            agg = template.fresh()
+            for _, val in seen:
+                agg.add(val)
+            windows[k] = (seen, agg)
+        yield _emit(k, key, horizon, t, agg.result())
+
+
+def session_window(gap, timestamp, reducer, events, key=None):
+    ''' :: num, f(e) -> num, reducer, Itr[e], f(e) -> k -> Gen[tuple]
+    Windows of activity: a session ends once there has been no event (with
+    the same key) for longer than `gap`. Yields (first event time, last
+    event time, result) for each session, in the order the sessions end.
+    '''
+    template = _aggregate(reducer)
+    value = template.value
+    clock = _Clock()
+    # key -> [start, last, aggregate], least recently active first
+    sessions = OrderedDict()
+    for event in events:
+        t = timestamp(event)
+        clock.tick(t)
+        while sessions:
+            k, (start, last, agg) = next(iter(sessions.items()))
+            if last + gap >= t:
+                break
+            del sessions[k]
+            yield _emit(k, key, start, last, agg.result())
+
+        k = key(event) if key else None
+        session = sessions.pop(k, None)
+        if session is None:
+            session = [t, t, template.fresh()]
+        sessions[k] = session
+        session[1] = t
+        session[2].add(value(event))
+
+    for k, (start, last, agg) in sessions.items():
+        yield _emit(k, key, start, last, agg.result())
@@ -18,6 +18,10 @@ setup(
         'coverage==4.0.1',
         'pyperclip==1.5.27',
     ],
+    extras_require={
+        # Typed vector literals: #f64[...]
+        'numpy': ['numpy'],
+    },
     packages=find_packages(),
     package_dir={'ripl': 'ripl'},
     zip_safe=False,
@@ -0,0 +1,136 @@
+import operator as op
+from unittest import TestCase, skipIf
+
+import ripl.prelude as pr
+from ripl import operators
+from ripl.arrays import numpy, typed_vector, to_lisp_str
+from ripl.evaluators import Evaluator
+
+np = numpy()
+
+
+@skipIf(np is None, 'numpy is not installed')
+class TypedVectorTest(TestCase):
+    evaluator = Evaluator()
+
+    def _eval(self, string):
+        '''Helper for evals'''
+        tokens = self.evaluator.reader.lex(string)
+        exp = next(self.evaluator.reader.parse(tokens))
+        return self.evaluator.eval(exp, self.evaluator.global_scope)
+
+    def assertArrayEqual(self, arr, expected, dtype):
+        self.assertIsInstance(arr, np.ndarray)
+        self.assertEqual(arr.dtype, np.dtype(dtype))
+        self.assertEqual(arr.tolist(), expected)
+
+    def test_literals(self):
+        '''#f64[...] and friends read as numpy arrays'''
+        self.assertArrayEqual(self._eval('#f64[1 2.5 3]'),
+                              [1.0, 2.5, 3.0], 'float64')
+        self.assertArrayEqual(self._eval('#i64[1 2 3]'), [1, 2, 3], 'int64')
+        self.assertArrayEqual(self._eval('#i32[]'), [], 'int32')
+
+    def test_non_numeric_literal(self):
+        '''Only numbers can go in a typed vector'''
+        with self.assertRaises(SyntaxError):
+            self._eval('#f64[1 x 3]')
+        with self.assertRaises(SyntaxError):
+            typed_vector('i64', [1, '2'])
+
+    def test_arithmetic(self):
+        '''std_ops arithmetic is element-wise and broadcasts'''
+        self.assertArrayEqual(self._eval('(+ #i64[1 2 3] #i64[1 1 1] 10)'),
+                              [12, 13, 14], 'int64')
+        self.assertArrayEqual(self._eval('(* 2 #f64[1 2])'),
+                              [2.0, 4.0], 'float64')
+        self.assertArrayEqual(self._eval('(- #i64[5 5] 1 2)'),
+                              [2, 2], 'int64')
+
+    def test_chained_comparison(self):
+        '''Chained comparisons combine element-wise'''
+        arr = np.array([0, 5, 10])
+        self.assertEqual(operators.lt(1, arr, 8).tolist(),
+                         [False, True, False])
+        self.assertEqual(self._eval('(< 0 #i64[1 5] 3)').tolist(),
+                         [True, False])
+
+    def test_folds(self):
+        '''foldl and product reduce with ufuncs'''
+        arr = np.arange(1, 6)
+        self.assertEqual(pr.foldl(operators.add, 10, arr), 25)
+        self.assertEqual(pr.foldl(op.sub, 0, arr), -15)
+        self.assertEqual(pr.foldl(max, 0, arr), 5)
+        self.assertEqual(pr.foldl(operators.add, 7, arr[:0]), 7)
+        self.assertEqual(pr.foldl(lambda a, b: a * 10 + b, 0, arr), 12345)
+        self.assertEqual(pr.product(arr), 120)
+
+    def test_take_drop(self):
+        '''take and drop slice arrays'''
+        arr = np.arange(5)
+        self.assertArrayEqual(pr.take(2, arr), [0, 1], arr.dtype)
+        self.assertArrayEqual(pr.drop(2, arr), [2, 3, 4], arr.dtype)
+
+    def test_print(self):
+        '''Arrays print as their literal'''
+        arr = self._eval('#f64[1 2]')
+        self.assertEqual(self.evaluator.py_to_lisp_str(arr), '#f64[1.0 2.0]')
+        self.assertEqual(to_lisp_str(np.array([1, 2], dtype='i4')),
+                         '#i32[1 2]')
+
+
+@skipIf(np is None, 'numpy is not installed')
+class VmapTest(TestCase):
+    def setUp(self):
+        self.evaluator = Evaluator()
+
+    def _eval(self, string):
+        '''Helper for evals'''
+        tokens = self.evaluator.reader.lex(string)
+        exp = next(self.evaluator.reader.parse(tokens))
+        return self.evaluator.eval(exp, self.evaluator.global_scope)
+
+    def test_vectorised(self):
+        '''Arithmetic bodies run as one numpy expression'''
+        self._eval('(define xs #f64[1 2 3])')
+        res = self._eval('(vmap (lambda (x) (+ (* x x) 1)) xs)')
+        self.assertEqual(res.tolist(), [2.0, 5.0, 10.0])
+        self.assertEqual(list(self.evaluator.jit_events), [])
+
+    def test_branches(self):
+        '''if becomes np.where and chained comparisons combine'''
+        self._eval('(defn f (x) (if (< 1 x 4) (- x) (/ x)))')
+        res = self._eval('(vmap f #f64[1 2 3 4])')
+        self.assertEqual(res.tolist(), [1.0, -2.0, -3.0, 0.25])
+        kernel = self._eval('f').vectorised[1]
+        self.assertIn('_where(', kernel.source)
+
+    def test_several_arrays(self):
+        '''One array per parameter, plus captured values'''
+        self._eval('(define offset 10)')
+        res = self._eval(
+            '(vmap (lambda (x y) (+ (% x y) offset)) #i64[5 7] #i64[3 4])')
+        self.assertEqual(res.tolist(), [12, 13])
+
+    def test_constant_body(self):
+        '''Constant results are broadcast'''
+        res = self._eval('(vmap (lambda (x) 7) #f64[1 2 3])')
+        self.assertEqual(res.tolist(), [7, 7, 7])
+
+    def test_fallback(self):
+        '''Anything else is evaluated element by element'''
+        res = self._eval('(vmap (lambda (x) (str x)) #i64[1 2])')
+        self.assertEqual(res.tolist(), ['1', '2'])
+        self.assertEqual(self.evaluator.jit_events[0][0], 'scalar')
+        res = self._eval('(vmap abs #i64[-1 2])')
+        self.assertEqual(res.tolist(), [1, 2])
+
+    def test_retrace(self):
+        '''Kernels are re-traced when a captured binding changes'''
+        self._eval('(define scale 2)')
+        self._eval('(defn scaled (x) (* x scale))')
+        self.assertEqual(self._eval('(vmap scaled #i64[1 2])').tolist(),
+                         [2, 4])
+        self._eval('(set scale 3)')
+        self.assertEqual(self._eval('(vmap scaled #i64[1 2])').tolist(),
+                         [3, 6])
@@ -3,6 +3,7 @@ from unittest import TestCase
 
 from ripl.bases import Symbol, RList
 from ripl.backend import Reader, Token, make_atom
+from ripl.nodes import Call, If, Literal, SymRef, Quote
 
 
 class LexerTest(TestCase):
@@ -41,11 +42,17 @@ class LexerTest(TestCase):
             self.assertEqual(match.lastgroup, expected_tag)
         actual_tkns = self.reader.lex(string)
         token = next(actual_tkns)
-        self.assertEqual(token, Token('SYMBOL', 'kept', 1, 45))
+        self.assertEqual(token, Token('SYMBOL', 'kept', 3, 0))
         # Confirm that that was the only token
         with self.assertRaises(StopIteration):
             token = next(actual_tkns)
 
+    def test_dotted_symbols(self):
+        '''Dotted names are single symbols as are .methods'''
+        tokens = [(t.tag, t.val) for t in self.reader.lex('np.linalg.norm .x')]
+        self.assertEqual(tokens, [('SYMBOL', 'np.linalg.norm'),
+                                  ('METHOD', '.x')])
+
     def test_quoting(self):
         '''quote notation works'''
         s = "'(i should be quoted!)"
@@ -76,7 +83,7 @@ class ParserTest(TestCase):
         '''The empty list gets parsed correctly and is equal to None'''
         string = '()'
         tokens = self.reader.lex(string)
-        parsed = next(self.reader.parse(tokens))
+        parsed = next(self.reader.read(tokens))
         self.assertEqual(parsed, None)
         self.assertEqual(parsed, RList())
 
@@ -84,7 +91,7 @@ class ParserTest(TestCase):
         '''A simple s-expression gets parsed correctly'''
         string = '(print "foo" 1 3.14)'
         tokens = self.reader.lex(string)
-        parsed = next(self.reader.parse(tokens))
+        parsed = next(self.reader.read(tokens))
         self.assertEqual(
                 parsed,
                 RList([Symbol('print'), 'foo', 1, 3.14])
@@ -96,7 +103,7 @@ class ParserTest(TestCase):
         _print = Symbol('print')
         _add = Symbol('+')
         tokens = self.reader.lex(string)
-        parsed = next(self.reader.parse(tokens))
+        parsed = next(self.reader.read(tokens))
         self.assertEqual(
                 parsed,
                 RList([_print, RList([_add, 'spam', ' and eggs'])])
@@ -113,7 +120,7 @@ class ParserTest(TestCase):
         '''Vector literals are correctly parsed'''
         string = '["this" "is" "a" "vector" "of" "strings"]'
         tokens = self.reader.lex(string)
-        parsed = next(self.reader.parse(tokens))
+        parsed = next(self.reader.read(tokens))
         expected = ['this', 'is', 'a', 'vector', 'of', 'strings']
         self.assertEquals(parsed, expected)
 
@@ -128,10 +135,47 @@ class ParserTest(TestCase):
         '''Dict literals are correctly parsed'''
         string = '{"a" 1, "b" 2, "c" 3}'
         tokens = self.reader.lex(string)
-        parsed = next(self.reader.parse(tokens))
+        parsed = next(self.reader.read(tokens))
         expected = {"a": 1, "b": 2, "c": 3}
         self.assertEquals(parsed, expected)
 
+    def test_parse_nested_vector(self):
+        '''Vector literals can be nested'''
+        string = '[1 [2 3] 4]'
+        tokens = self.reader.lex(string)
+        parsed = next(self.reader.read(tokens))
+        self.assertEqual(parsed, [1, [2, 3], 4])
+
+    def test_parse_nodes(self):
+        '''parse produces typed syntax tree nodes'''
+        string = '(if (< x 2) "small" (quote (a b)))'
+        tokens = self.reader.lex(string)
+        node = next(self.reader.parse(tokens))
+        self.assertIsInstance(node, If)
+        self.assertIsInstance(node.test, Call)
+        self.assertIsInstance(node.test.func, SymRef)
+        self.assertEqual(node.test.func.sym, Symbol('<'))
+        self.assertEqual([type(a) for a in node.test.args],
+                         [SymRef, Literal])
+        self.assertEqual(node.then.value, 'small')
+        self.assertIsInstance(node.orelse, Quote)
+        self.assertEqual(node.orelse.datum, RList([Symbol('a'), Symbol('b')]))
+
+    def test_parse_spans(self):
+        '''Nodes carry the line and column of their first token'''
+        string = '(print\n  (+ 1 x))'
+        tokens = self.reader.lex(string)
+        node = next(self.reader.parse(tokens))
+        self.assertEqual((node.line, node.col), (1, 0))
+        inner = node.args[0]
+        self.assertEqual((inner.line, inner.col), (2, 2))
+        self.assertEqual((inner.args[1].line, inner.args[1].col), (2, 7))
+
+    def test_parse_malformed_special_form(self):
+        '''Malformed special forms are syntax errors'''
+        with self.assertRaises(SyntaxError):
+            next(self.reader.parse(self.reader.lex('(if)')))
+
     def test_parse_unclosed_dict(self):
         '''An unclosed dict raises a syntax error'''
         with self.assertRaises(SyntaxError):
@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+from ripl.bases import Symbol
+from ripl.budget import Budget, BudgetExceeded
+from ripl.evaluators import Evaluator
+
+
+class BudgetTest(TestCase):
+    def _eval(self, string, evaluator, budget=None):
+        reader = evaluator.reader
+        result = None
+        for exp in reader.parse(reader.lex(string)):
+            result = evaluator.eval(exp, evaluator.global_scope, budget)
+        return result
+
+    def _loop(self, evaluator):
+        self._eval('(defn spin (n) (spin (+ n 1)))', evaluator)
+
+    def test_steps(self):
+        '''An infinite tail loop is stopped after `steps` steps'''
+        for evaluator in [Evaluator(), Evaluator(stackless=True)]:
+            self._loop(evaluator)
+            with self.assertRaises(BudgetExceeded) as ctx:
+                self._eval('(spin 0)', evaluator, Budget(steps=10000))
+            err = ctx.exception
+            self.assertEqual(err.reason, 'steps')
+            self.assertEqual(err.profile['steps'], 10001)
+            self.assertEqual(err.profile['calls'][0][0], Symbol('spin'))
+            # The evaluator is fine afterwards
+            self.assertIsNone(evaluator.budget)
+            self.assertEqual(self._eval('(+ 1 2)', evaluator), 3)
+
+    def test_seconds(self):
+        evaluator = Evaluator()
+        self._loop(evaluator)
+        with self.assertRaises(BudgetExceeded) as ctx:
+            self._eval('(spin 0)', evaluator, Budget(seconds=0.05))
+        self.assertEqual(ctx.exception.reason, 'seconds')
+        self.assertGreaterEqual(ctx.exception.profile['seconds'], 0.05)
+
+    def test_memory(self):
+        '''Evaluations that hold on to too much memory are stopped'''
+        evaluator = Evaluator()
+        self._eval('(defn grow (acc) (grow (tuple acc 1)))', evaluator)
+        with self.assertRaises(BudgetExceeded) as ctx:
+            self._eval('(grow 0)', evaluator, Budget(memory=2**20))
+        self.assertEqual(ctx.exception.reason, 'memory')
+        self.assertGreater(ctx.exception.profile['memory'], 2**20)
+
+    def test_within_budget(self):
+        evaluator = Evaluator()
+        budget = Budget(steps=1000, seconds=10, memory=2**20)
+        self.assertEqual(self._eval('(+ 1 2)', evaluator, budget), 3)
+        self.assertLess(budget.profile()['steps'], 10)
+
+    def test_compiled(self):
+        '''Compiled Funcs are interpreted while a budget is in force'''
+        evaluator = Evaluator(hot_threshold=5)
+        self._eval('(defn count (n) (if (< n 1) 0 (count (- n 1))))',
+                   evaluator)
+        count = evaluator.global_scope[Symbol('count')]
+        for _ in range(10):
+            count(3)
+        self.assertIsNotNone(count.compiled)
+        with self.assertRaises(BudgetExceeded):
+            self._eval('(sum (map count [100000]))', evaluator,
+                       Budget(steps=1000))
+        self.assertIsNotNone(count.compiled)
+        self.assertEqual(count(100000), 0)
@@ -1,9 +1,39 @@
+import os
 import sys
+import tempfile
 import unittest
+import threading
+import subprocess
 
 from io import StringIO
+from unittest import mock
 
 import ripl.cli as cli
+import ripl.diskcache
+from ripl.diskcache import DiskCache
+from ripl.server import Server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(code):
+    ''' :: str -> (str, dict)
+    Run `code` in a fresh interpreter with -X importtime and return its
+    output and the cumulative import time of each module in microseconds.
+    '''
+    path = [ROOT] + [p for p in [os.environ.get('PYTHONPATH')] if p]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path))
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+        universal_newlines=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return proc.stdout, times
 
 
 # Solution for capturing stdout from http://goo.gl/oKF2jV
@@ -36,3 +66,77 @@ class CLITest(unittest.TestCase):
 
         output = '\n'.join(l for l in output)
         self.assertEqual(output, "Yay! This all works!")
+
+    def test_stats(self):
+        '''--stats prints the interpreter's counters on exit'''
+        with mock.patch('sys.stderr', new_callable=StringIO) as err:
+            with Capturing() as output:
+                cli.main(['--stats', '-s', '(+ 1 2)'])
+        self.assertEqual(output[0], '> 3')
+        self.assertIn('steps        1', err.getvalue())
+
+    def test_cache_info(self):
+        '''--cache info summarises the defn/cached results'''
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = DiskCache(os.path.join(tmp, 'cache.sqlite3'))
+            cache.put('a', 'total', 1)
+            with mock.patch.object(ripl.diskcache, '_default', cache):
+                with Capturing() as output:
+                    cli.main('--cache=info')
+                self.assertEqual(output[1].split()[0], '1')
+                self.assertEqual(output[2].split()[:2], ['total', '1'])
+                with Capturing() as output:
+                    cli.main('--cache=clear')
+            self.assertEqual(cache.info()['entries'], 0)
+            cache.close()
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'needs -X importtime')
+    def test_script_startup(self):
+        '''Running a script doesn't import the interactive UI'''
+        out, times = import_times(
+            'import ripl.cli; ripl.cli.main("-s (+ 1 2)")')
+        self.assertEqual(out.strip(), '> 3')
+        self.assertIn('ripl.prelude', times)
+        ui = [name for name in times
+              if name.split('.')[0] in ('prompt_toolkit', 'pygments')]
+        self.assertEqual(ui, [])
+        # Nor the parts of the prelude that it doesn't use
+        heavy = ['ripl.table', 'ripl.mapped', 'ripl.relational',
+                 'ripl.windows', 'ripl.dag', 'ripl.memo', 'ripl.diskcache',
+                 'ripl.image', 'sqlite3', 'hashlib', 'csv', 'mmap',
+                 'concurrent.futures', 'numpy', 'socket', 'tempfile']
+        show = 'print(" ".join(sorted(sys.modules)))'
+        # (discounting anything the interpreter starts with here)
+        out, _ = import_times('import sys; ' + show)
+        heavy = [name for name in heavy if name not in out.split()]
+        out, _ = import_times(
+            'import sys, ripl.cli; ripl.cli.main("-s (+ 1 2)"); ' + show)
+        modules = out.split()
+        self.assertEqual([name for name in heavy if name in modules], [])
+        # They are imported as soon as they are used
+        out, _ = import_times(
+            'import ripl.cli; ripl.cli.main("-s (sum (sort-by abs [3 -1]))")')
+        self.assertEqual(out.strip(), '> 2')
+
+    def test_client(self):
+        '''-c sends code to a running server'''
+        with tempfile.TemporaryDirectory() as tmp:
+            address = os.path.join(tmp, 'ripl.sock')
+            server = Server(address)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                server.ready.wait(5)
+                with Capturing() as output:
+                    cli.main(['--socket', address, '-c', '(* 6 7)'])
+                self.assertEqual(output[0], '> 42')
+            finally:
+                server.stop()
+                thread.join()
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'needs -X importtime')
+    def test_client_startup(self):
+        '''The client doesn't import the interpreter'''
+        _, times = import_times('import ripl.cli, ripl.client')
+        self.assertIn('ripl.client', times)
+        self.assertNotIn('ripl.evaluators', times)
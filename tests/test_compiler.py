@@ -0,0 +1,105 @@
+from unittest import TestCase
+
+from ripl.evaluators import Evaluator
+
+
+class HotFuncTest(TestCase):
+    '''Funcs called from Python get promoted to compiled functions'''
+    def setUp(self):
+        self.evaluator = Evaluator(hot_threshold=3)
+
+    def _eval(self, string):
+        '''Helper for evals'''
+        tokens = self.evaluator.reader.lex(string)
+        exp = next(self.evaluator.reader.parse(tokens))
+        return self.evaluator.eval(exp, self.evaluator.global_scope)
+
+    def _events(self, kind):
+        return [e for e in self.evaluator.jit_events if e[0] == kind]
+
+    def test_promotion(self):
+        '''Past the threshold a Func is compiled and gives the same results'''
+        self._eval('(defn sq-inc (x) (+ (* x x) 1))')
+        result = self._eval("(drain (map sq-inc '(1 2 3 4 5 6)))")
+        self.assertEqual(result, [2, 5, 10, 17, 26, 37])
+        self.assertIsNotNone(self._eval('sq-inc').compiled)
+        self.assertEqual(len(self._events('promote')), 1)
+
+    def test_if_and_self_tail_call(self):
+        '''Self tail calls compile to a loop'''
+        self._eval(
+            '(defn loop (n acc) (if (== n 0) acc (loop (- n 1) (+ acc n))))')
+        func = self._eval('loop')
+        for _ in range(3):
+            func(10, 0)
+        self.assertIsNotNone(func.compiled)
+        self.assertEqual(func(100000, 0), 100000 * 100001 // 2)
+
+    def test_mutual_tail_calls(self):
+        '''Compiled tail calls to other Funcs run in constant stack'''
+        self._eval('(defn ev? (n) (if (== n 0) True (od? (- n 1))))')
+        self._eval('(defn od? (n) (if (== n 0) False (ev? (- n 1))))')
+        ev, od = self._eval('ev?'), self._eval('od?')
+        for _ in range(3):
+            ev(2)
+            od(2)
+        self.assertIsNotNone(ev.compiled)
+        self.assertTrue(ev(50001 - 1))
+
+    def test_reject(self):
+        '''Uncompilable bodies stay interpreted'''
+        self._eval('(defn make-adder (n) (lambda (x) (+ x n)))')
+        func = self._eval('make-adder')
+        for _ in range(4):
+            self.assertEqual(func(1)(2), 3)
+        self.assertIsNone(func.compiled)
+        self.assertEqual(self._events('reject')[0][1], func.name)
+
+    def test_deopt(self):
+        '''Redefining a captured symbol deoptimises'''
+        self._eval('(define scale 2)')
+        self._eval('(defn scaled (x) (* x scale))')
+        func = self._eval('scaled')
+        for _ in range(3):
+            self.assertEqual(func(5), 10)
+        self.assertIsNotNone(func.compiled)
+        self._eval('(set scale 3)')
+        self.assertEqual(func(5), 15)
+        self.assertIsNone(func.compiled)
+        self.assertEqual(len(self._events('deopt')), 1)
+
+    def test_arity_errors(self):
+        '''Compiled Funcs raise the same errors as interpreted ones'''
+        self._eval('(defn ident (x) x)')
+        func = self._eval('ident')
+        for _ in range(3):
+            func(1)
+        with self.assertRaises(SyntaxError):
+            func(1, 2)
+
+    def test_inline_operators(self):
+        '''Two argument operators compile to the Python operator'''
+        self._eval('(defn clamp (x) (if (> x 10) 10 (+ x 1 0)))')
+        func = self._eval('clamp')
+        for _ in range(3):
+            func(1)
+        self.assertIn('(_a0 > 10)', func.compiled.source)
+        self.assertEqual([func(5), func(20)], [6, 10])
+        self._eval('(set > <)')
+        self.assertEqual(func(20), 21)
+        self.assertIsNone(func.compiled)
+
+    def test_methods_and_attributes(self):
+        '''Method calls and attributes compile to Python's own'''
+        self._eval('(defn fmt (x) (.format "{}!" x.real))')
+        fmt = self._eval('fmt')
+        for _ in range(3):
+            fmt(1)
+        self.assertIn('.format(_a0.real)', fmt.compiled.source)
+        self.assertEqual(fmt(2.5), '2.5!')
+        self._eval('(defn odd-name (s) (.no-such-method s))')
+        func = self._eval('odd-name')
+        for _ in range(3):
+            with self.assertRaises(AttributeError):
+                func('x')
+        self.assertIsNone(func.compiled)
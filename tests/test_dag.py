@@ -0,0 +1,124 @@
+import threading
+import tempfile
+from unittest import TestCase
+
+from ripl.bases import Symbol
+from ripl.dag import Stage, run_dag
+from ripl.evaluators import Evaluator
+
+
+class DagTest(TestCase):
+    def setUp(self):
+        self.evaluator = Evaluator()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _eval(self, string):
+        reader = self.evaluator.reader
+        result = None
+        for exp in reader.parse(reader.lex(string)):
+            result = self.evaluator.eval(exp, self.evaluator.global_scope)
+        return result
+
+    def _run(self, *names):
+        stages = [self._eval(name) for name in names]
+        self.evaluator.dag_events.clear()
+        return run_dag(*stages, cache_dir=self.tmp.name)
+
+    def _events(self, kind):
+        return sorted(name.str for event, name, _ in
+                      self.evaluator.dag_events if event == kind)
+
+    def _pipeline(self):
+        self._eval('''
+            (defstage raw () (list 1 2 3 4))
+            (defstage doubled (raw) (map (lambda (x) (* x 2)) raw))
+            (defstage total (doubled) (sum doubled))
+            (defstage biggest (raw) (max raw))
+            (defstage report (total biggest) (tuple total biggest))''')
+
+    def test_defstage(self):
+        '''defstage binds a Stage'''
+        self._eval('(defstage raw """the data""" () (list 1 2))')
+        stage = self._eval('raw')
+        self.assertIsInstance(stage, Stage)
+        self.assertEqual(stage.__doc__, 'the data')
+        with self.assertRaises(SyntaxError):
+            self._eval('(defstage bad (1) 2)')
+
+    def test_run(self):
+        '''Targets are computed from their inputs'''
+        self._pipeline()
+        self.assertEqual(self._run('report'), (20, 4))
+        self.assertEqual(self._run('total', 'biggest'), (20, 4))
+        # Iterator outputs are drained so they can be cached
+        self.assertEqual(self._run('doubled'), [2, 4, 6, 8])
+
+    def test_cached(self):
+        '''Unchanged stages aren't run again and neither are their inputs'''
+        self._pipeline()
+        self._run('report')
+        self.assertEqual(self._events('run'),
+                         ['biggest', 'doubled', 'raw', 'report', 'total'])
+        self.assertEqual(self._run('report'), (20, 4))
+        self.assertEqual(self._events('run'), [])
+        self.assertEqual(self._events('cached'), ['report'])
+
+    def test_invalidate(self):
+        '''Changing a stage re-runs it and everything downstream'''
+        self._pipeline()
+        self._run('report')
+        self._eval('(defstage doubled (raw) (map (lambda (x) (* x 3)) raw))')
+        self.assertEqual(self._run('report'), (30, 4))
+        self.assertEqual(self._events('run'), ['doubled', 'report', 'total'])
+        self.assertEqual(self._events('cached'), ['biggest', 'raw'])
+
+    def test_references(self):
+        '''Functions and constants used by a stage are part of its key'''
+        self._eval('''
+            (define offset 1)
+            (defn bump (x) (+ x offset))
+            (defstage raw () (list 1 2 3))
+            (defstage bumped (raw) (sum (map bump raw)))''')
+        self.assertEqual(self._run('bumped'), 9)
+        self._eval('(set offset 10)')
+        self.assertEqual(self._run('bumped'), 36)
+        self.assertEqual(self._events('run'), ['bumped'])
+
+    def test_concurrent(self):
+        '''Independent stages run at the same time'''
+        barrier = threading.Barrier(2, timeout=5)
+        self.evaluator.global_scope[Symbol('meet')] = barrier.wait
+        self._eval('''
+            (defstage a () (begin (meet) 1))
+            (defstage b () (begin (meet) 2))
+            (defstage both (a b) (+ a b))''')
+        self.assertEqual(self._run('both'), 3)
+
+    def test_uncached(self):
+        '''Outputs that can't be pickled are still passed downstream'''
+        self._eval('''
+            (defstage func () (lambda (x) (+ x 1)))
+            (defstage applied (func) (func 1))''')
+        self.assertEqual(self._run('applied'), 2)
+        self.assertEqual(self._events('uncached'), ['func'])
+        self._run('applied')
+        self.assertEqual(self._events('cached'), ['applied'])
+
+    def test_errors(self):
+        '''Cycles and inputs that aren't stages are errors'''
+        self._eval('''
+            (defstage a (b) 1)
+            (defstage b (a) 2)
+            (define c 3)
+            (defstage d (c) 4)''')
+        with self.assertRaises(ValueError):
+            self._run('a')
+        with self.assertRaises(TypeError):
+            self._run('d')
+
+    def test_stackless(self):
+        '''Stages work with the stackless evaluator too'''
+        self.evaluator = Evaluator(stackless=True)
+        self._pipeline()
+        self.assertEqual(self._run('report'), (20, 4))
@@ -0,0 +1,122 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from ripl.diskcache import DiskCache, CachedFunc
+from ripl.evaluators import Evaluator
+import ripl.diskcache
+
+
+class DiskCacheTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'cache.sqlite3')
+        self.cache = DiskCache(self.path)
+        self.addCleanup(self.cache.close)
+
+    def test_get_put(self):
+        '''Results are stored and survive re-opening the database'''
+        with self.assertRaises(KeyError):
+            self.cache.get('a')
+        self.cache.put('a', 'f', [1, {'b': 2.5}])
+        self.cache.close()
+        self.assertEqual(DiskCache(self.path).get('a'), [1, {'b': 2.5}])
+
+    def test_evict(self):
+        '''The least recently used results go first when the cache is full'''
+        self.cache.max_bytes = 3000
+        for key in 'abc':
+            self.cache.put(key, 'f', b'x' * 900)
+        self.cache.get('a')
+        self.cache.put('d', 'f', b'x' * 900)
+        self.assertEqual(self.cache.get('a'), b'x' * 900)
+        with self.assertRaises(KeyError):
+            self.cache.get('b')
+        self.assertLessEqual(self.cache.info()['size'], 3000)
+
+    def test_batched_hits(self):
+        '''Hits only write their access times in batches'''
+        self.cache.put('a', 'f', 1)
+        writes = self.cache.db.total_changes
+        for _ in range(10):
+            self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.db.total_changes, writes)
+        with mock.patch.object(ripl.diskcache, 'TOUCH_BATCH', 2):
+            self.cache.put('b', 'f', 2)
+            self.cache.get('a')
+            self.cache.get('b')
+        self.assertGreater(self.cache.db.total_changes, writes + 1)
+
+    def test_replace_size(self):
+        '''Replacing a result doesn't count the old one's size'''
+        self.cache.put('a', 'f', b'x' * 900)
+        self.cache.put('a', 'f', b'x' * 100)
+        self.cache.put('b', 'f', b'x' * 100)
+        self.assertEqual(self.cache._size, self.cache.info()['size'])
+
+    def test_info_clear(self):
+        '''info counts results per function'''
+        self.cache.put('a', 'f', 1)
+        self.cache.put('b', 'f', 2)
+        self.cache.put('c', 'g', 3)
+        info = self.cache.info()
+        self.assertEqual(info['entries'], 3)
+        self.assertEqual(sorted((f, n) for f, n, _ in info['funcs']),
+                         [('f', 2), ('g', 1)])
+        self.cache.clear()
+        self.assertEqual(self.cache.info()['entries'], 0)
+
+
+class DefnCachedTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = DiskCache(os.path.join(tmp.name, 'cache.sqlite3'))
+        self.addCleanup(self.cache.close)
+        patch = mock.patch.object(ripl.diskcache, '_default', self.cache)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _eval(self, string, evaluator):
+        reader = evaluator.reader
+        result = None
+        for exp in reader.parse(reader.lex(string)):
+            result = evaluator.eval(exp, evaluator.global_scope)
+        return result
+
+    def _define(self, scale=2):
+        evaluator = Evaluator()
+        self._eval('''
+            (define scale {})
+            (defn double (x) (* x scale))
+            (defn/cached total (xs) (sum (map double xs)))'''.format(scale),
+                   evaluator)
+        return evaluator
+
+    def test_across_runs(self):
+        '''Results are reused by a new evaluator with the same source'''
+        first = self._define()
+        self.assertEqual(self._eval('(total [1 2 3])', first), 12)
+        second = self._define()
+        total = self._eval('total', second)
+        self.assertIsInstance(total, CachedFunc)
+        self.assertEqual(total([1, 2, 3]), 12)
+        self.assertEqual(total.stats(), {'hits': 1, 'misses': 0})
+
+    def test_source_changes(self):
+        '''Changing anything the function uses gives a new key'''
+        self._eval('(total [1 2 3])', self._define())
+        evaluator = self._define(scale=3)
+        self.assertEqual(self._eval('(total [1 2 3])', evaluator), 18)
+        self._eval('(set scale 4)', evaluator)
+        self.assertEqual(self._eval('(total [1 2 3])', evaluator), 24)
+        self.assertEqual(self.cache.info()['entries'], 3)
+
+    def test_uncacheable(self):
+        '''Arguments that aren't plain data go straight to the function'''
+        evaluator = Evaluator()
+        self._eval('(defn/cached call (f) (f 1))', evaluator)
+        self.assertEqual(self._eval('(call (lambda (x) (+ x 1)))',
+                                    evaluator), 2)
+        self.assertEqual(self.cache.info()['entries'], 0)
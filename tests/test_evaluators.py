@@ -1,7 +1,27 @@
 from unittest import TestCase
 
 from ripl.bases import RList, Symbol
-from ripl.evaluators import Evaluator
+from ripl.evaluators import Evaluator, base_scope
+from ripl.nodes import analyse
+
+
+class Point:
+    __slots__ = 'x', 'y'
+
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+    def norm(self):
+        return abs(self.x) + abs(self.y)
+
+
+class Point3(Point):
+    __slots__ = 'z',
+
+
+class Box:
+    def size(self):
+        return 1
 
 
 class EvaluatorTest(TestCase):
@@ -133,3 +153,139 @@ class EvaluatorTest(TestCase):
         for exp, expected in expressions:
             result = self._eval(exp)
             self.assertEqual(result, expected)
+
+    def test_shared_base_scope(self):
+        '''Evaluators share a read-only base and keep their own definitions'''
+        first, second = Evaluator(), Evaluator()
+        self.assertIs(first.global_scope.maps[0].base, base_scope())
+        with self.assertRaises(TypeError):
+            base_scope()[Symbol('x')] = 1
+
+        for exp in self.evaluator.reader.parse(self.evaluator.reader.lex(
+                '(define shared-x 1) (set len (lambda (x) 42))')):
+            first.eval(exp, first.global_scope)
+        self.assertEqual(first.global_scope[Symbol('shared-x')], 1)
+        self.assertNotIn(Symbol('shared-x'), second.global_scope)
+        self.assertNotIn(Symbol('shared-x'), base_scope())
+        self.assertIs(second.global_scope[Symbol('len')], len)
+
+    def test_overlay_holds_used_names(self):
+        '''A new evaluator only holds the names it has looked up'''
+        evaluator = Evaluator()
+        overlay = evaluator.global_scope.maps[0]
+        # apply etc are bound to each evaluator
+        builtins = len(overlay)
+        exp = next(evaluator.reader.parse(evaluator.reader.lex('(+ 1 2)')))
+        self.assertEqual(evaluator.eval(exp, evaluator.global_scope), 3)
+        self.assertIn(Symbol('+'), dict(overlay))
+        self.assertNotIn(Symbol('read-csv'), dict(overlay))
+        self.assertIn(Symbol('read-csv'), evaluator.global_scope)
+        self.assertEqual(len(overlay), builtins + 1)
+
+    def test_method_call(self):
+        '''(.method obj args...) and (obj.method args...) call methods'''
+        self.assertEqual(self._eval('(.upper "abc")'), 'ABC')
+        self.assertEqual(self._eval('(.join "-" (.split "a b c"))'), 'a-b-c')
+        self._eval('(define method-s "a,b")')
+        self.assertEqual(self._eval('(method-s.split ",")'), ['a', 'b'])
+        self._eval('(defn shout (s) (.upper s))')
+        self.assertEqual(self._eval('(shout "hi")'), 'HI')
+        with self.assertRaises(SyntaxError):
+            self._eval('(.upper)')
+
+    def test_attribute(self):
+        '''obj.attr looks up attributes'''
+        self._eval('(define attr-c (complex "3+4j"))')
+        self.assertEqual(self._eval('(+ attr-c.real attr-c.imag)'), 7.0)
+        self.assertEqual(self._eval('attr-c.real.imag'), 0.0)
+        with self.assertRaises(NameError):
+            self._eval('(+ attr-c.nope 1)')
+        # Attributes of local bindings are plain attribute lookups
+        self._eval('(defn attr-nope (c) c.nope)')
+        with self.assertRaises(AttributeError):
+            self._eval('(attr-nope attr-c)')
+
+    def test_bare_method(self):
+        '''A bare .method is a function calling it'''
+        result = self._eval('(drain (map .upper (list "a" "b")))')
+        self.assertEqual(result, ['A', 'B'])
+
+    def test_defgen(self):
+        '''defgen gives Python generators that work with the prelude'''
+        self._eval('(defgen naturals """0, 1, 2...""" (n) '
+                   '(yield n) (yield-from (naturals (+ n 1))))')
+        gen = self._eval('(naturals 0)')
+        self.assertEqual([next(gen), next(gen)], [0, 1])
+        self.assertEqual(self._eval('(take 3 (naturals 5))'), [5, 6, 7])
+        self._eval('(defgen odds (n) (if (% n 2) (yield n)) '
+                   '(yield-from (odds (+ n 1))))')
+        result = self._eval('(drain (takeWhile (lambda (x) (< x 8)) '
+                            '(odds 0)))')
+        self.assertEqual(result, [1, 3, 5, 7])
+        self._eval('(defgen both (a b) (yield-from a) (yield-from b))')
+        self.assertEqual(list(self._eval('(both "ab" "c")')), ['a', 'b', 'c'])
+        self.assertEqual(self._eval('naturals').__doc__, '0, 1, 2...')
+
+    def test_defgen_tail_yield_from(self):
+        '''Yielding from the generator itself last doesn't nest'''
+        self._eval('(defgen count-up (n) (yield n) '
+                   '(yield-from (count-up (+ n 1))))')
+        for n, x in zip(range(50000), self._eval('(count-up 0)')):
+            pass
+        self.assertEqual(x, 49999)
+
+    def test_yield_outside_defgen(self):
+        '''yield is only allowed as a statement in a defgen'''
+        with self.assertRaises(SyntaxError):
+            self._eval('(+ 1 (yield 2))')
+        with self.assertRaises(SyntaxError):
+            self._eval('(defgen no-body (n))')
+
+    def test_method_cache(self):
+        '''Call sites cache methods for types without instance dicts'''
+        node = next(self.evaluator.reader.parse(
+            self.evaluator.reader.lex('(.norm p)')))
+        scope = self.evaluator.global_scope.new_child(
+            {Symbol('p'): Point(1, -2)})
+        self.assertEqual(self.evaluator.eval(node, scope), 3)
+        self.assertEqual(node.cache, (Point, Point.norm))
+        # A different type replaces the cache
+        self.assertEqual(node(Point3(1, 1)), 2)
+        self.assertEqual(node.cache, (Point3, Point.norm))
+        # Instances with a __dict__ could shadow the method
+        box = Box()
+        box.size = lambda: 2
+        size = analyse(Symbol('.size')).value
+        self.assertEqual(size(box), 2)
+        self.assertEqual(size.cache, (Box, None))
+
+
+class StacklessEvaluatorTest(EvaluatorTest):
+    '''The explicit-stack evaluator passes the same tests and more'''
+    evaluator = Evaluator(stackless=True)
+
+    def test_deep_recursion(self):
+        '''Non-tail recursion is not limited by the Python stack'''
+        self._eval(
+            '(defn sum-to (n) (if (== n 0) 0 (+ n (sum-to (- n 1)))))')
+        result = self._eval('(sum-to 5000)')
+        self.assertEqual(result, 5000 * 5001 // 2)
+
+    def test_mutual_tail_calls(self):
+        '''Mutually recursive tail calls run in constant stack'''
+        self._eval('(defn even? (n) (if (== n 0) True (odd? (- n 1))))')
+        self._eval('(defn odd? (n) (if (== n 0) False (even? (- n 1))))')
+        self.assertTrue(self._eval('(even? 20000)'))
+        self.assertFalse(self._eval('(odd? 20000)'))
+
+    def test_define_and_set(self):
+        '''define and set evaluate their value expression'''
+        self._eval('(define stackless-x (+ 1 2))')
+        self.assertEqual(self._eval('stackless-x'), 3)
+        self._eval('(set stackless-x (* stackless-x 2))')
+        self.assertEqual(self._eval('stackless-x'), 6)
+
+    def test_lambda_callback(self):
+        '''Funcs can still be called from Python'''
+        result = self._eval("(drain (map (lambda (x) (* x x)) '(1 2 3)))")
+        self.assertEqual(result, [1, 4, 9])
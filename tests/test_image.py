@@ -0,0 +1,80 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from ripl.bases import Symbol
+from ripl.dag import Stage
+from ripl.memo import MemoFunc
+from ripl.image import save_image, load_image, ImageError
+from ripl.evaluators import Evaluator
+
+
+class ImageTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'test.img')
+
+    def _eval(self, string, evaluator):
+        reader = evaluator.reader
+        result = None
+        for exp in reader.parse(reader.lex(string)):
+            result = evaluator.eval(exp, evaluator.global_scope)
+        return result
+
+    def _saved(self):
+        evaluator = Evaluator()
+        self._eval('''
+            (define scale 3)
+            (define prices {"a" 1.5, "b" [1 2]})
+            (defn mul (x) (* x scale))
+            (defn adder (n) (lambda (x) (+ x n)))
+            (define add2 (adder 2))
+            (defn/memo fib (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+            (defstage raw () (list 1 2 3))''', evaluator)
+        self.assertEqual(save_image(evaluator, self.path), [])
+        return evaluator
+
+    def test_round_trip(self):
+        '''Functions, closures and data all come back'''
+        self._saved()
+        evaluator = load_image(self.path)
+        self.assertEqual(self._eval(
+            '(tuple (mul 2) (add2 5) (fib 60))', evaluator),
+            (6, 7, 1548008755920))
+        self.assertEqual(self._eval('prices', evaluator)['b'], [1, 2])
+        self.assertIsInstance(self._eval('fib', evaluator), MemoFunc)
+        self.assertIsInstance(self._eval('raw', evaluator), Stage)
+
+    def test_bound_to_new_evaluator(self):
+        '''Loaded functions use the globals of the evaluator they are in'''
+        original = self._saved()
+        evaluator = Evaluator()
+        self._eval('(load-image "{}")'.format(self.path), evaluator)
+        self._eval('(set scale 10)', evaluator)
+        self.assertEqual(self._eval('(mul 2)', evaluator), 20)
+        self.assertEqual(self._eval('(mul 2)', original), 6)
+        mul = self._eval('mul', evaluator)
+        self.assertIs(mul.evaluator, evaluator)
+        # Builtins are looked up rather than copied
+        self.assertIs(self._eval('map', evaluator),
+                      self._eval('map', original))
+
+    def test_unpicklable(self):
+        '''Values that can't be saved are skipped and reported'''
+        evaluator = Evaluator()
+        with open(os.devnull, 'w') as f:
+            evaluator.global_scope[Symbol('handle')] = f
+            self._eval('(define x 1)', evaluator)
+            skipped = self._eval('(save-image "{}")'.format(self.path),
+                                 evaluator)
+        self.assertEqual(list(skipped), [Symbol('handle')])
+        loaded = load_image(self.path)
+        self.assertEqual(self._eval('x', loaded), 1)
+        self.assertNotIn(Symbol('handle'), loaded.global_scope)
+
+    def test_bad_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'(defn f (x) x)')
+        with self.assertRaises(ImageError):
+            load_image(self.path)
@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+from unittest import TestCase, mock
+
+from ripl.backend import Reader
+from ripl.evaluators import Evaluator
+import ripl.importer
+
+SOURCE = '''
+(define scale {})
+(defn scale-by (x) (* x scale))
+(defn total (xs) (sum (map scale-by xs)))
+'''
+
+
+class ImporterTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        sys.path.insert(0, self.dir)
+        self.addCleanup(sys.path.remove, self.dir)
+        ripl.importer.install()
+        self.addCleanup(ripl.importer.uninstall)
+        self.addCleanup(sys.modules.pop, 'riplmod', None)
+        patch = mock.patch.object(sys, 'dont_write_bytecode', False)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _write(self, scale, mtime):
+        path = os.path.join(self.dir, 'riplmod.rpl')
+        with open(path, 'w') as f:
+            f.write(SOURCE.format(scale))
+        os.utime(path, (mtime, mtime))
+
+    def _import(self):
+        sys.modules.pop('riplmod', None)
+        import riplmod
+        return riplmod
+
+    def test_import(self):
+        '''Definitions become module attributes callable from Python'''
+        self._write(2, 1000)
+        module = self._import()
+        self.assertEqual(module.scale, 2)
+        self.assertEqual(module.scale_by(5), 10)
+        self.assertEqual(module.total([1, 2, 3]), 12)
+        self.assertIsInstance(module.__evaluator__, Evaluator)
+        self.assertTrue(module.__file__.endswith('riplmod.rpl'))
+
+    def test_cache(self):
+        '''The analysed forms are cached until the source changes'''
+        self._write(2, 1000)
+        self._import()
+        cached = os.listdir(os.path.join(self.dir, '__pycache__'))
+        self.assertEqual(len(cached), 1)
+        self.assertTrue(cached[0].endswith('.rplc'))
+        with mock.patch.object(Reader, 'lex', side_effect=AssertionError):
+            self.assertEqual(self._import().total([1]), 2)
+        self._write(3, 2000)
+        self.assertEqual(self._import().total([1]), 3)
+
+    def test_not_found(self):
+        with self.assertRaises(ImportError):
+            import no_such_riplmod  # noqa
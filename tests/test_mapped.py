@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import ripl.prelude as pr
+from ripl.mapped import Record, mmap_lines, mmap_records, mmap_bytes
+from ripl.evaluators import Evaluator
+
+
+class MappedTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, data, name='data'):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_lines(self):
+        '''Lines come back without their endings'''
+        path = self._write(b'one\r\ntwo\n\nthr\xc3\xa9e')
+        lines = list(mmap_lines(path))
+        self.assertTrue(all(isinstance(l, Record) for l in lines))
+        self.assertEqual([str(l) for l in lines], ['one', 'two', '', 'thrée'])
+        kept = [bytes(l) for l in mmap_lines(path, keepends=True)]
+        self.assertEqual(kept[:2], [b'one\r\n', b'two\n'])
+
+    def test_lazy_search(self):
+        '''Records can be searched and compared without decoding first'''
+        path = self._write(b'INFO ok\nERROR bad\nINFO fine\n')
+        errors = [l for l in mmap_lines(path) if 'ERROR' in l]
+        self.assertEqual(errors, ['ERROR bad'])
+        self.assertEqual(errors[0].view.tobytes(), b'ERROR bad')
+        self.assertEqual(len(errors[0]), 9)
+
+    def test_hash(self):
+        '''Records hash like the strings they are equal to'''
+        path = self._write(b'one\ntwo\none\n')
+        lines = list(mmap_lines(path))
+        self.assertEqual(hash(lines[0]), hash('one'))
+        self.assertEqual(set(lines), {'one', 'two'})
+        self.assertEqual({'two': 2}[lines[1]], 2)
+        self.assertNotEqual(lines[0], b'one')
+
+    def test_matching(self):
+        '''Only records containing `matching` are returned'''
+        path = self._write(b'ERROR first\r\nINFO ok\nnot an ERROR\nINFO')
+        self.assertEqual(list(mmap_lines(path, matching='ERROR')),
+                         ['ERROR first', 'not an ERROR'])
+        self.assertEqual(list(mmap_lines(path, matching=b'INFO')),
+                         ['INFO ok', 'INFO'])
+        self.assertEqual(list(mmap_lines(path, matching='nope')), [])
+        path = self._write(b'aaXbbbXXccc', 'fixed')
+        self.assertEqual(list(mmap_records(path, width=3, matching='X')),
+                         ['aaX', 'XXc'])
+        # Matches that span two records don't count
+        self.assertEqual(list(mmap_records(path, width=3, matching='bX')),
+                         [])
+        path = self._write(b'a|xb||cx|d', 'delimited')
+        self.assertEqual(
+            list(mmap_records(path, delimiter='|', matching='x')),
+            ['xb', 'cx'])
+
+    def test_records(self):
+        '''Fixed width and delimited records'''
+        path = self._write(b'aaabbbcc')
+        self.assertEqual([bytes(r) for r in mmap_records(path, width=3)],
+                         [b'aaa', b'bbb', b'cc'])
+        path = self._write(b'a|bb||c|', 'delimited')
+        self.assertEqual(list(mmap_records(path, delimiter='|')),
+                         ['a', 'bb', '', 'c'])
+        with self.assertRaises(ValueError):
+            mmap_records(path)
+        with self.assertRaises(ValueError):
+            mmap_records(path, width=0)
+
+    def test_bytes(self):
+        '''mmap_bytes is a zero copy view'''
+        path = self._write(b'0123456789')
+        view = mmap_bytes(path, 2, 5)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(view.tobytes(), b'234')
+
+    def test_empty_file(self):
+        '''Empty files give no records'''
+        path = self._write(b'')
+        self.assertEqual(list(mmap_lines(path)), [])
+        self.assertEqual(list(mmap_records(path, width=2)), [])
+        self.assertEqual(len(mmap_bytes(path)), 0)
+
+    def test_missing_file(self):
+        '''Missing files are an error straight away'''
+        with self.assertRaises(FileNotFoundError):
+            mmap_lines(os.path.join(self.dir, 'nope'))
+
+    def test_prelude(self):
+        '''The readers plug into the prelude generator functions'''
+        path = self._write(b''.join(b'line %d\n' % n for n in range(10)))
+        self.assertEqual(pr.take(2, mmap_lines(path)), ['line 0', 'line 1'])
+        evaluator = Evaluator()
+        string = '(drain (takeWhile (lambda (l) (not (in "3" l))) ' \
+                 '(mmap-lines "{}")))'.format(path)
+        exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+        result = evaluator.eval(exp, evaluator.global_scope)
+        self.assertEqual(len(result), 3)
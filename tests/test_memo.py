@@ -0,0 +1,118 @@
+from unittest import TestCase, mock
+
+from ripl.bases import RList, RDict, Keyword
+from ripl.memo import MemoFunc
+from ripl.evaluators import Evaluator
+import ripl.memo
+
+
+class MemoTest(TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def _func(self, *args):
+        self.calls.append(args)
+        return len(self.calls)
+
+    def test_memoize(self):
+        '''Results are cached by argument'''
+        func = MemoFunc(self._func)
+        self.assertEqual([func(1), func(2), func(1)], [1, 2, 1])
+        self.assertEqual(self.calls, [(1,), (2,)])
+        self.assertEqual(func.stats(), {'hits': 1, 'misses': 2, 'size': 2,
+                                        'evictions': 0, 'maxsize': 1024})
+        func.clear()
+        self.assertEqual(func(1), 3)
+        self.assertEqual(func.stats()['hits'], 0)
+
+    def test_structural(self):
+        '''Unhashable containers are keyed by their contents'''
+        func = MemoFunc(self._func)
+        func([1, 2], {'a': [3]})
+        func([1, 2], RDict({'a': [3]}))
+        func(RList([1, 2]), {'a': [3]})
+        func((1, 2), {'a': [3]})
+        self.assertEqual(len(self.calls), 3)
+        func({1, 2}, None)
+        func({2, 1}, None)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_unhashable(self):
+        '''Anything else that can't be hashed isn't cached'''
+        func = MemoFunc(self._func)
+        func(bytearray(b'a'))
+        func(bytearray(b'a'))
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(func.stats()['misses'], 2)
+
+    def test_lru(self):
+        '''The least recently used result is evicted'''
+        func = MemoFunc(self._func, maxsize=2)
+        func(1), func(2), func(1), func(3), func(1), func(2)
+        self.assertEqual(self.calls, [(1,), (2,), (3,), (2,)])
+        self.assertEqual(func.stats()['evictions'], 2)
+
+    def test_lfu(self):
+        '''The least frequently used result is evicted'''
+        func = MemoFunc(self._func, maxsize=2, policy=Keyword(':lfu'))
+        func(1), func(1), func(2), func(3), func(2), func(1)
+        self.assertEqual(self.calls, [(1,), (2,), (3,), (2,)])
+        with self.assertRaises(ValueError):
+            MemoFunc(self._func, policy='fifo')
+
+    def test_ttl(self):
+        '''Results expire after ttl seconds'''
+        now = [100.0]
+        func = MemoFunc(self._func, ttl=10)
+        with mock.patch.object(ripl.memo.time, 'monotonic', lambda: now[0]):
+            func(1)
+            now[0] = 105
+            func(1)
+            now[0] = 111
+            func(1)
+        self.assertEqual(self.calls, [(1,), (1,)])
+
+
+class DefnMemoTest(TestCase):
+    def _eval(self, string, evaluator=None):
+        evaluator = evaluator or Evaluator()
+        reader = evaluator.reader
+        result = None
+        for exp in reader.parse(reader.lex(string)):
+            result = evaluator.eval(exp, evaluator.global_scope)
+        return result
+
+    def test_defn_memo(self):
+        '''Recursive calls go through the cache'''
+        fib = '''
+            (defn/memo fib (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+            (fib 80)'''
+        self.assertEqual(self._eval(fib), 23416728348467685)
+        evaluator = Evaluator(stackless=True)
+        self.assertEqual(self._eval(fib, evaluator), 23416728348467685)
+        self.assertEqual(self._eval('(memo-stats fib "misses")', evaluator),
+                         81)
+
+    def test_tail_calls(self):
+        '''Memoised Funcs keep their tail calls'''
+        for evaluator in [Evaluator(), Evaluator(stackless=True)]:
+            self._eval('''
+                (defn/memo countdown (n)
+                  (if (== n 0) 0 (countdown (- n 1))))''', evaluator)
+            self.assertEqual(self._eval('(countdown 5000)', evaluator), 0)
+            # Every call in the chain was remembered
+            stats = self._eval('(memo-stats countdown)', evaluator)
+            self.assertEqual((stats['misses'], stats['size']),
+                             (5001, ripl.memo.DEFAULT_MAXSIZE))
+            self.assertEqual(self._eval('(countdown 4500)', evaluator), 0)
+            self.assertEqual(
+                self._eval('(memo-stats countdown "hits")', evaluator), 1)
+
+    def test_memoize_prelude(self):
+        '''memoize wraps any function'''
+        self.assertEqual(self._eval('''
+            (defn slow (x) (* x x))
+            (define fast (memoize slow 10 None :lfu))
+            (tuple (fast 3) (fast 3) (fast 4)
+                   (memo-stats fast "misses") (memo-stats fast "hits"))'''),
+            (9, 9, 16, 2, 1))
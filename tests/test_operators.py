@@ -0,0 +1,95 @@
+from unittest import TestCase
+
+from ripl.bases import RList, RVector
+from ripl.evaluators import Evaluator
+from ripl import operators
+
+
+class ArithmeticTest(TestCase):
+    def test_add_identity(self):
+        '''(+) and (+ x) work'''
+        self.assertEqual(operators.add(), 0)
+        self.assertEqual(operators.add(5), 5)
+
+    def test_add_ints(self):
+        '''Long runs of ints are summed exactly'''
+        self.assertEqual(operators.add(*range(1000)), 499500)
+
+    def test_add_floats(self):
+        '''Float sums don't accumulate rounding error'''
+        self.assertEqual(operators.add(*[0.1] * 10), 1.0)
+
+    def test_add_sequences(self):
+        '''Strings, lists, tuples, vectors and RLists concatenate'''
+        self.assertEqual(operators.add('a', 'b', 'c'), 'abc')
+        self.assertEqual(operators.add([1], [2], [3, 4]), [1, 2, 3, 4])
+        self.assertEqual(operators.add((1,), (2,), ()), (1, 2))
+        joined = operators.add(RList([1]), RList([2]), RList([3]))
+        self.assertIsInstance(joined, RList)
+        self.assertEqual(list(joined), [1, 2, 3])
+        joined = operators.add(RVector([1]), RVector([2]), RVector([3, 4]))
+        self.assertIsInstance(joined, RVector)
+        self.assertEqual(joined, [1, 2, 3, 4])
+
+    def test_add_mismatched(self):
+        '''Mixing types is still an error'''
+        with self.assertRaises(TypeError):
+            operators.add('a', 'b', 1)
+        with self.assertRaises(TypeError):
+            operators.add([1], [2], (3,))
+        with self.assertRaises(TypeError):
+            operators.add(1, 2, 'c')
+
+    def test_sub(self):
+        '''- negates and folds left'''
+        self.assertEqual(operators.sub(5), -5)
+        self.assertEqual(operators.sub(10, 3, 2, 1), 4)
+
+    def test_mul(self):
+        '''* folds left'''
+        self.assertEqual(operators.mul(), 1)
+        self.assertEqual(operators.mul(1, 2, 3, 4), 24)
+        self.assertEqual(operators.mul('ab', 2), 'abab')
+
+    def test_truediv(self):
+        '''/ inverts and folds left'''
+        self.assertEqual(operators.truediv(4), 0.25)
+        self.assertEqual(operators.truediv(12, 2, 3), 2)
+
+
+class ComparisonTest(TestCase):
+    def test_chained(self):
+        '''Comparisons hold between each adjacent pair'''
+        self.assertTrue(operators.lt(1, 2, 3))
+        self.assertFalse(operators.lt(1, 3, 2))
+        self.assertTrue(operators.le(1, 1, 2))
+        self.assertTrue(operators.gt(3, 2, 1))
+        self.assertTrue(operators.ge(3, 3, 1))
+        self.assertTrue(operators.eq(2, 2, 2))
+        self.assertFalse(operators.eq(2, 2, 3))
+        self.assertTrue(operators.ne(1, 2, 1))
+
+    def test_single(self):
+        '''A single argument is trivially ordered'''
+        self.assertTrue(operators.lt(1))
+
+    def test_short_circuit(self):
+        '''Stop comparing at the first failure'''
+        self.assertFalse(operators.lt(2, 1, 'a'))
+
+
+class OperatorScopeTest(TestCase):
+    evaluator = Evaluator(use_prelude=False)
+
+    def eval(self, string):
+        reader = self.evaluator.reader
+        exp = next(reader.parse(reader.lex(string)))
+        return self.evaluator.eval(exp, self.evaluator.global_scope)
+
+    def test_variadic_forms(self):
+        '''The global scope operators are variadic'''
+        self.assertEqual(self.eval('(* 1 2 3)'), 6)
+        self.assertEqual(self.eval('(- 10 1 2)'), 7)
+        self.assertEqual(self.eval('(+ "a" "b" "c")'), 'abc')
+        self.assertTrue(self.eval('(< 1 2 3)'))
+        self.assertFalse(self.eval('(>= 3 4 1)'))
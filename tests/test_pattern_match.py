@@ -0,0 +1,31 @@
+from unittest import TestCase
+from concurrent.futures import ThreadPoolExecutor
+
+from ripl.pattern_match import Template, Symbol, FailedMatch
+
+
+def pattern(string):
+    return [Symbol(s) for s in string.split()]
+
+
+class TemplateTest(TestCase):
+    def test_match(self):
+        '''match gives the bindings and leaves the template as it was'''
+        template = Template(pattern('a b *c d'))
+        self.assertEqual(template.match((1, 2, 3, 4, 5, 6, 7)),
+                         {'a': 1, 'b': 2, 'c': [3, 4, 5, 6], 'd': 7})
+        # Greedy variables are still greedy the second time round
+        self.assertEqual(template.match((5, 6, 7, 8, 9, 10)),
+                         {'a': 5, 'b': 6, 'c': [7, 8, 9], 'd': 10})
+        self.assertEqual(template.map, {})
+        with self.assertRaises(FailedMatch):
+            Template(pattern('a b c')).match((1, 2, 3, 4))
+
+    def test_shared_between_threads(self):
+        '''One template can be matched from many threads at once'''
+        template = Template(pattern('x *rest'))
+        targets = [tuple(range(n, n + 10)) for n in range(1, 2000)]
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(template.match, targets))
+        self.assertEqual(results, [{'x': t[0], 'rest': list(t[1:])}
+                                   for t in targets])
@@ -0,0 +1,114 @@
+import random
+from unittest import TestCase, mock
+
+import ripl.relational as rel
+from ripl.relational import sort_by, group_by, join
+from ripl.evaluators import Evaluator
+
+# Small enough that a few hundred items spill
+BUDGET = 2000
+
+
+class CountingSpill(rel._Spill):
+    created = 0
+
+    def __init__(self):
+        CountingSpill.created += 1
+        super().__init__()
+
+
+class RelationalTest(TestCase):
+    def setUp(self):
+        rng = random.Random(42)
+        self.items = [(rng.randrange(50), n) for n in range(2000)]
+        CountingSpill.created = 0
+        patcher = mock.patch.object(rel, '_Spill', CountingSpill)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def key(self, item):
+        return item[0]
+
+    def test_sort_in_memory(self):
+        '''Within budget nothing is spilled'''
+        result = list(sort_by(self.key, self.items))
+        self.assertEqual(result, sorted(self.items, key=self.key))
+        self.assertEqual(CountingSpill.created, 0)
+
+    def test_external_sort(self):
+        '''Past the budget runs are spilled and merged, stably'''
+        result = list(sort_by(self.key, iter(self.items), budget=BUDGET))
+        self.assertEqual(result, sorted(self.items, key=self.key))
+        self.assertGreater(CountingSpill.created, 1)
+        result = list(sort_by(self.key, self.items, BUDGET, reverse=True))
+        self.assertEqual(
+            result, sorted(self.items, key=self.key, reverse=True))
+
+    def test_group_by(self):
+        '''Groups match an in-memory grouping, spilled or not'''
+        expected = {}
+        for item in self.items:
+            expected.setdefault(item[0], []).append(item)
+        in_memory = list(group_by(self.key, self.items))
+        self.assertEqual([k for k, _ in in_memory],
+                         list(dict.fromkeys(i[0] for i in self.items)))
+        self.assertEqual(dict(in_memory), expected)
+        spilled = list(group_by(self.key, self.items, budget=BUDGET))
+        self.assertGreater(CountingSpill.created, 0)
+        self.assertEqual(len(spilled), len(expected))
+        self.assertEqual(dict(spilled), expected)
+
+    def _expected_join(self, left, right):
+        return sorted((l, r) for l in left for r in right if l[0] == r[0])
+
+    def test_hash_join(self):
+        '''In memory hash join'''
+        left, right = self.items[:300], self.items[300:600]
+        result = sorted(join(left, right, self.key))
+        self.assertEqual(result, self._expected_join(left, right))
+        self.assertEqual(CountingSpill.created, 0)
+
+    def test_grace_join(self):
+        '''Partitioned hash join once the right side is over budget'''
+        left, right = self.items[:300], self.items[300:600]
+        result = sorted(join(left, right, self.key, budget=BUDGET))
+        self.assertEqual(result, self._expected_join(left, right))
+        self.assertGreater(CountingSpill.created, 0)
+
+    def test_sort_merge_join(self):
+        '''Unhashable keys and unsplittable partitions sort-merge'''
+        left = [([n % 5], n) for n in range(40)]
+        right = [([n % 7], n) for n in range(30)]
+        result = sorted(join(left, right, self.key))
+        self.assertEqual(result, self._expected_join(left, right))
+        # A single key can't be hash partitioned
+        left = [(1, n) for n in range(50)]
+        right = [(1, n) for n in range(200)]
+        result = sorted(join(left, right, self.key, budget=BUDGET))
+        self.assertEqual(len(result), 50 * 200)
+
+    def test_unhashable_left_keys(self):
+        '''Unhashable keys on the left only are compared with each key'''
+        left = [([n % 5] if n % 2 else n % 5, n) for n in range(40)]
+        right = [(n % 7, n) for n in range(30)]
+        result = sorted(join(left, right, self.key), key=repr)
+        self.assertEqual(result, sorted(
+            [(l, r) for l in left for r in right if l[0] == r[0]], key=repr))
+        result = list(join(left, self.items[:600], self.key, budget=BUDGET))
+        self.assertEqual(len(result), len(
+            [1 for l in left for r in self.items[:600] if l[0] == r[0]]))
+
+    def test_prelude(self):
+        '''sort-by, group-by and join from ripl'''
+        evaluator = Evaluator()
+
+        def run(string):
+            exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+            return evaluator.eval(exp, evaluator.global_scope)
+
+        self.assertEqual(
+            run("(drain (sort-by (lambda (x) (- x)) '(3 1 2)))"), [3, 2, 1])
+        groups = run("(drain (group-by (lambda (x) (% x 2)) '(1 2 3 4)))")
+        self.assertEqual(groups, [(1, [1, 3]), (0, [2, 4])])
+        pairs = run("(drain (join '(1 2 3) '(2 3 4) (lambda (x) x)))")
+        self.assertEqual(pairs, [(2, 2), (3, 3)])
@@ -0,0 +1,81 @@
+import os
+import socket
+import tempfile
+import threading
+from unittest import TestCase
+
+from ripl.client import Client, RemoteError, parse_address
+from ripl.server import Server
+
+
+class ServerTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.address = os.path.join(tmp.name, 'ripl.sock')
+        self.server = Server(self.address, workers=2)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.stop)
+        self.server.ready.wait(5)
+
+    def test_eval(self):
+        '''Results are streamed back for each expression'''
+        with Client(self.address) as client:
+            results = client.results('(define x 20) (+ x 1) (tuple x 40)')
+            self.assertEqual(list(results), ['21', '(,20 40)'])
+            self.assertEqual(client.eval('(+ "a" "b")'), 'ab')
+
+    def test_sessions(self):
+        '''Definitions last for a connection and don't leak to others'''
+        with Client(self.address) as first, Client(self.address) as second:
+            first.eval('(defn f (x) (* x 2))')
+            second.eval('(define f 1)')
+            self.assertEqual(first.eval('(f 4)'), '8')
+            self.assertEqual(second.eval('f'), '1')
+
+    def test_error(self):
+        '''Errors are raised in the client and the session carries on'''
+        with Client(self.address) as client:
+            with self.assertRaises(RemoteError) as ctx:
+                client.eval('(define y 1) (undefined-function y) (+ 1 1)')
+            self.assertIn('undefined-function', str(ctx.exception))
+            self.assertEqual(client.eval('y'), '1')
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address('localhost:7000'),
+                         ('localhost', 7000))
+        self.assertEqual(parse_address(':7000'), ('127.0.0.1', 7000))
+        self.assertEqual(parse_address('/tmp/a:1'), '/tmp/a:1')
+
+
+class ServerSafetyTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'ripl.sock')
+
+    def test_not_a_socket(self):
+        '''Only a stale socket is removed from the socket path'''
+        with open(self.path, 'w') as f:
+            f.write('precious')
+        with self.assertRaises(FileExistsError):
+            Server(self.path)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), 'precious')
+
+    def test_stale_socket(self):
+        sock = socket.socket(socket.AF_UNIX)
+        sock.bind(self.path)
+        sock.close()
+        server = Server(self.path)
+        server.executor.shutdown()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_remote_host(self):
+        '''Non-loopback hosts have to be asked for explicitly'''
+        with self.assertRaises(ValueError):
+            Server('0.0.0.0:7000')
+        Server('localhost:7000').executor.shutdown()
+        Server('0.0.0.0:7000', allow_remote=True).executor.shutdown()
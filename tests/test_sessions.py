@@ -0,0 +1,93 @@
+import os
+import tempfile
+import threading
+import tracemalloc
+from unittest import TestCase, mock
+
+from ripl.bases import Symbol
+from ripl.sessions import SessionManager, SessionError
+import ripl.sessions
+
+
+class SessionManagerTest(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def test_isolated(self):
+        '''Sessions have their own definitions'''
+        manager = SessionManager(self.directory)
+        a, b = manager.create(), manager.create('b')
+        self.assertEqual(b, 'b')
+        manager.eval(a, '(define x 1)')
+        manager.eval(b, '(define x 2)')
+        self.assertEqual(manager.eval(a, '(+ x 10)'), 11)
+        self.assertEqual(manager.eval(b, '(+ x 10)'), 12)
+        manager.close(a)
+        with self.assertRaises(SessionError):
+            manager.eval(a, 'x')
+
+    def test_evict_idle(self):
+        '''Idle sessions are saved to disk and loaded again when used'''
+        now = [0.0]
+        manager = SessionManager(self.directory, idle=60)
+        with mock.patch.object(ripl.sessions.time, 'monotonic',
+                               lambda: now[0]):
+            old, new = manager.create(), manager.create()
+            manager.eval(old, '(defn f (x) (* x 3))')
+            now[0] = 50
+            manager.eval(new, '(define y 1)')
+            now[0] = 100
+            self.assertEqual(manager.evict_idle(), [old])
+            self.assertEqual(manager.stats(), {
+                'sessions': 2, 'resident': 1, 'evicted': 1})
+            self.assertTrue(os.listdir(self.directory))
+            self.assertEqual(manager.eval(old, '(f 4)'), 12)
+            self.assertEqual(os.listdir(self.directory), [])
+
+    def test_unsaveable(self):
+        '''Sessions holding things that can't be saved stay resident'''
+        manager = SessionManager(self.directory, idle=0)
+        sid = manager.create()
+        with open(os.devnull) as f:
+            manager.get(sid).global_scope[Symbol('handle')] = f
+            self.assertEqual(manager.evict_idle(), [])
+        self.assertEqual(manager.stats()['resident'], 1)
+
+    def test_evict_busy(self):
+        '''A session isn't evicted while it is being evaluated'''
+        manager = SessionManager(self.directory, idle=0)
+        sid = manager.create()
+        started, release = threading.Event(), threading.Event()
+
+        def wait():
+            started.set()
+            release.wait(5)
+        scope = manager.get(sid).global_scope
+        scope[Symbol('wait')] = wait
+        thread = threading.Thread(
+            target=manager.eval, args=(sid, '(define x 1) (wait)'))
+        thread.start()
+        started.wait(5)
+        self.assertEqual(manager.evict_idle(), [])
+        release.set()
+        thread.join()
+        del scope[Symbol('wait')]
+        self.assertEqual(manager.evict_idle(), [sid])
+        self.assertEqual(manager.eval(sid, 'x'), 1)
+
+    def test_memory(self):
+        '''Memory left allocated by each session is counted'''
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        manager = SessionManager(self.directory, track_memory=True)
+        small, big = manager.create(), manager.create()
+        manager.eval(small, '(define x 1)')
+        manager.eval(big, '(define xs (sorted (range 100000)))')
+        memory = manager.memory()
+        self.assertGreater(memory[big], 1000000)
+        self.assertLess(memory[small], 100000)
+        self.assertEqual(manager.stats()['retained'], sum(memory.values()))
+        with self.assertRaises(RuntimeError):
+            SessionManager(self.directory).memory()
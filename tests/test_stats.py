@@ -0,0 +1,67 @@
+from unittest import TestCase
+
+from ripl.bases import Symbol
+from ripl.budget import Budget
+from ripl.stats import Watchers
+from ripl.evaluators import Evaluator
+
+
+class InterpStatsTest(TestCase):
+    def _eval(self, string, evaluator, budget=None):
+        reader = evaluator.reader
+        result = None
+        for exp in reader.parse(reader.lex(string)):
+            result = evaluator.eval(exp, evaluator.global_scope, budget)
+        return result
+
+    def test_counts(self):
+        '''Steps, forms, calls and tail calls are counted'''
+        for evaluator in [Evaluator(), Evaluator(stackless=True)]:
+            stats = evaluator.enable_stats()
+            self._eval('''
+                (defn spin (n) (if (< n 10) (spin (+ n 1)) n))
+                (defn fib (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+                (spin 0)
+                (fib 5)''', evaluator)
+            self.assertEqual(stats.calls, {Symbol('spin'): 11,
+                                           Symbol('fib'): 15})
+            # Only spin calls itself from tail position
+            self.assertEqual(stats.tail_calls, 10)
+            self.assertEqual(stats.forms['defn'], 2)
+            self.assertEqual(stats.forms['if'], 26)
+            self.assertEqual(stats.steps, sum(stats.forms.values()))
+            # n is a parameter (depth 0), the rest are globals (depth 1)
+            self.assertEqual(sorted(stats.lookups), [0, 1])
+            self.assertGreater(stats.lex_seconds, 0)
+            self.assertGreater(stats.parse_seconds, 0)
+
+    def test_compiled_calls(self):
+        '''Calls to compiled Funcs are still counted'''
+        evaluator = Evaluator(hot_threshold=3)
+        stats = evaluator.enable_stats()
+        self._eval('(defn sq (x) (* x x))', evaluator)
+        self._eval("(drain (map sq '(1 2 3 4 5 6)))", evaluator)
+        self.assertIsNotNone(self._eval('sq', evaluator).compiled)
+        self.assertEqual(stats.calls, {Symbol('sq'): 6})
+
+    def test_interp_stats(self):
+        '''(interp-stats) is empty unless stats are enabled'''
+        evaluator = Evaluator()
+        self.assertEqual(self._eval('(interp-stats)', evaluator), {})
+        self.assertIsNone(evaluator.watch)
+        evaluator.enable_stats()
+        stats = self._eval('(interp-stats)', evaluator)
+        self.assertEqual(stats['steps'], 1)
+        self.assertIn('steps', evaluator.stats.report())
+        evaluator.disable_stats()
+        self.assertIsNone(evaluator.watch)
+
+    def test_with_budget(self):
+        '''Stats and a budget can watch the same evaluation'''
+        evaluator = Evaluator()
+        stats = evaluator.enable_stats()
+        budget = Budget(steps=1000)
+        self._eval('(+ 1 2)', evaluator, budget)
+        self.assertIs(evaluator.watch, stats)
+        self.assertEqual(budget.steps, stats.steps)
+        self.assertEqual(Watchers(stats, budget).watchers, (stats, budget))
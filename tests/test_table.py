@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+from array import array
+from unittest import TestCase, mock
+
+import ripl.table
+from ripl.table import Table, read_csv, read_jsonl
+from ripl.evaluators import Evaluator
+
+CSV = 'name,price,qty\na,1.5,3\nb,20,10\n\nc,7.25,2\n'
+JSONL = '''{"name": "a", "price": 1.5, "qty": 3}
+{"name": "b", "price": 20, "qty": 10}
+{"name": "c", "qty": 2}
+'''
+
+
+class TableTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.csv = self._write('t.csv', CSV)
+        self.jsonl = self._write('t.jsonl', JSONL)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def _values(self, table):
+        return {name: ripl.table._as_list(table[name])
+                for name in table.names}
+
+    def test_read_csv(self):
+        '''Numeric CSV columns are typed, the rest are strings'''
+        table = read_csv(self.csv)
+        self.assertEqual(table.names, ['name', 'price', 'qty'])
+        self.assertEqual(len(table), 3)
+        self.assertEqual(self._values(table), {
+            'name': ['a', 'b', 'c'],
+            'price': [1.5, 20.0, 7.25],
+            'qty': [3, 10, 2]})
+        self.assertIn('price:f64', repr(table.preview()))
+
+    def test_chunks(self):
+        '''Loading in chunks gives the same Table'''
+        self.assertEqual(read_csv(self.csv, chunk_size=1), read_csv(self.csv))
+        self.assertEqual(read_jsonl(self.jsonl, chunk_size=2),
+                         read_jsonl(self.jsonl))
+
+    def test_mixed_chunks(self):
+        '''A column that stops being numeric falls back to strings'''
+        path = self._write('mixed.csv', 'x\n1\n2.5\nn/a\n')
+        table = read_csv(path, chunk_size=1)
+        self.assertEqual(list(table['x']), ['1', '2.5', 'n/a'])
+
+    def test_projection(self):
+        '''Only the requested columns are loaded'''
+        table = read_csv(self.csv, columns=['qty'])
+        self.assertEqual(table.names, ['qty'])
+        with self.assertRaises(KeyError):
+            read_csv(self.csv, columns=['nope'])
+
+    def test_read_jsonl(self):
+        '''Missing keys become None'''
+        table = read_jsonl(self.jsonl)
+        self.assertEqual(self._values(table)['price'], [1.5, 20, None])
+        self.assertEqual(self._values(table)['qty'], [3, 10, 2])
+
+    def test_select_where(self):
+        '''Selection shares columns and filtering works on whole columns'''
+        table = read_csv(self.csv)
+        selected = table.select('qty')
+        self.assertIs(selected['qty'], table['qty'])
+        filtered = table.where([True, False, True])
+        self.assertEqual(self._values(filtered)['name'], ['a', 'c'])
+        with self.assertRaises(ValueError):
+            table.where([True])
+
+    def test_without_numpy(self):
+        '''Without numpy, numeric columns are stdlib arrays'''
+        with mock.patch.object(ripl.table, 'np', None):
+            table = read_csv(self.csv, chunk_size=2)
+            self.assertIsInstance(table['price'], array)
+            self.assertEqual(table['price'].tolist(), [1.5, 20.0, 7.25])
+            filtered = table.where([False, True, True])
+            self.assertEqual(filtered['qty'].tolist(), [10, 2])
+
+    def test_unequal_columns(self):
+        '''Columns must be the same length'''
+        with self.assertRaises(ValueError):
+            Table([('a', [1, 2]), ('b', [1])])
+
+    def test_prelude(self):
+        '''read-csv, select, filter-rows and with-column from ripl'''
+        evaluator = Evaluator()
+
+        def run(string):
+            exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+            return evaluator.eval(exp, evaluator.global_scope)
+
+        run('(define t (read-csv "{}"))'.format(self.csv))
+        self.assertEqual(list(run('(t "qty")')), [3, 10, 2])
+        table = run('(filter-rows t (lambda (p) (> p 5)) "price")')
+        self.assertEqual(self._values(table)['name'], ['b', 'c'])
+        table = run(
+            '(with-column t "total" (lambda (p q) (* p q)) "price" "qty")')
+        self.assertEqual(self._values(table)['total'], [4.5, 200.0, 14.5])
+        self.assertEqual(run('(select t "name")').names, ['name'])
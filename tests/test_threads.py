@@ -0,0 +1,184 @@
+import threading
+from unittest import TestCase
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from ripl import threads
+from ripl.bases import Symbol, Overlay
+from ripl.budget import Budget, BudgetExceeded
+from ripl.evaluators import ThreadSafeEvaluator
+
+THREADS = 8
+
+
+class ThreadTest(TestCase):
+    def setUp(self):
+        self.evaluator = ThreadSafeEvaluator(hot_threshold=5)
+
+    def _eval(self, string, budget=None):
+        '''Helper for evals: the value of the last expression'''
+        reader = self.evaluator.reader
+        result = None
+        for exp in reader.parse(reader.lex(string)):
+            result = self.evaluator.eval(exp, self.evaluator.global_scope,
+                                         budget=budget)
+        return result
+
+    def _run(self, func, jobs):
+        '''Run func(job) for each job across threads that start together'''
+        barrier = threading.Barrier(min(THREADS, len(jobs)))
+
+        def run(job):
+            barrier.wait(5)
+            return func(job)
+        with ThreadPoolExecutor(THREADS) as pool:
+            return list(pool.map(run, jobs))
+
+    def test_future_io_bound(self):
+        '''Futures run at the same time on the shared pool'''
+        # Every fetch waits for the others: they have to overlap
+        barrier = threading.Barrier(min(THREADS, threads.WORKERS), timeout=5)
+
+        def fetch(x):
+            if x < barrier.parties:
+                barrier.wait()
+            return x * 2
+        self.evaluator.global_scope[Symbol('fetch')] = fetch
+        futures = [self._eval('(future (fetch {}))'.format(n))
+                   for n in range(THREADS)]
+        self.assertIsInstance(futures[0], Future)
+        self.evaluator.global_scope[Symbol('pages')] = futures
+        results = self._eval('(drain (map deref pages))')
+        self.assertEqual(results, [n * 2 for n in range(THREADS)])
+        self.assertFalse(barrier.broken)
+
+    def test_future_scope(self):
+        '''Futures see their caller's scope and define in their own'''
+        self._eval('(define base 40)')
+        self.assertEqual(self._eval('(deref (future (+ base 2)))'), 42)
+        self._eval('(deref (future (define local 2)))')
+        self.assertNotIn(Symbol('local'), self.evaluator.global_scope)
+        self.assertEqual(self._eval('(deref 3)'), 3)
+
+    def test_future_error(self):
+        '''Errors in a future are raised by deref'''
+        future = self._eval('(future (undefined-function 1))')
+        self.evaluator.global_scope[Symbol('failed')] = future
+        with self.assertRaises(NameError):
+            self._eval('(deref failed)')
+
+    def test_concurrent_calls(self):
+        '''Funcs called from many threads get their own arguments'''
+        self._eval('(defn add-up (n acc) '
+                   '(if (== n 0) acc (add-up (- n 1) (+ acc n))))')
+        add_up = self._eval('add-up')
+
+        def work(n):
+            # Called from Python (so it is promoted while other threads
+            # use it) and from ripl
+            results = [add_up(n + i, 0) for i in range(20)]
+            results.append(self._eval('(add-up {} 0)'.format(n)))
+            return results
+        jobs = list(range(100, 100 + THREADS * 4))
+        for n, results in zip(jobs, self._run(work, jobs)):
+            expected = [(n + i) * (n + i + 1) // 2 for i in range(20)]
+            self.assertEqual(results, expected + [n * (n + 1) // 2])
+        self.assertIsNotNone(add_up.compiled)
+        promotions = [e for e in self.evaluator.jit_events
+                      if e[0] == 'promote']
+        self.assertEqual(len(promotions), 1)
+
+    def test_concurrent_definitions(self):
+        '''Every definition is published along with an epoch bump'''
+        epoch = self.evaluator.epoch
+
+        def define(n):
+            for i in range(50):
+                self._eval('(define thread-{}-{} {})'.format(n, i, i))
+                self._eval('(set shared {})'.format(n))
+        self._run(define, range(THREADS))
+        for n in range(THREADS):
+            self.assertEqual(self._eval('thread-{}-49'.format(n)), 49)
+        self.assertIn(self._eval('shared'), range(THREADS))
+        self.assertEqual(self.evaluator.epoch, epoch + THREADS * 100)
+
+    def test_define_race(self):
+        '''Only one thread gets to define a name'''
+        def define(n):
+            try:
+                self._eval('(define winner {})'.format(n + 1))
+                return True
+            except SyntaxError:
+                return False
+        self.assertEqual(sum(self._run(define, range(THREADS))), 1)
+
+    def test_copy_up_race(self):
+        '''A lookup copying up a base value doesn't undo a definition'''
+        key = Symbol('x')
+        started = []
+
+        class Base(dict):
+            def __getitem__(self, key):
+                # Another thread defines key in the middle of the lookup
+                define = threading.Thread(
+                    target=overlay.__setitem__, args=(key, 'new'))
+                define.start()
+                started.append(define)
+                define.join(0.1)
+                return dict.__getitem__(self, key)
+        overlay = Overlay(Base({key: 'old'}))
+        self.assertEqual(overlay[key], 'old')
+        started[0].join()
+        self.assertEqual(overlay[key], 'new')
+
+    def test_budget_per_thread(self):
+        '''A budget only limits the thread that asked for it'''
+        self._eval('(defn spin (n) (spin (+ n 1)))')
+        self._eval('(defn count-to (n acc) '
+                   '(if (== n acc) acc (count-to n (+ acc 1))))')
+
+        def work(job):
+            if job == 'spin':
+                with self.assertRaises(BudgetExceeded) as ctx:
+                    self._eval('(spin 0)', budget=Budget(steps=50000))
+                return ctx.exception.reason
+            return self._eval('(count-to 20000 0)')
+        self.assertEqual(self._run(work, ['spin', 'count']),
+                         ['steps', 20000])
+        self.assertIsNone(self.evaluator.budget)
+
+    def test_memo_funcs(self):
+        '''Memoised Funcs can be shared between threads'''
+        self._eval('(defn/memo fib (n) '
+                   '(if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))')
+        fib = self._eval('fib')
+        results = self._run(lambda n: [fib(i) for i in range(n)],
+                            [60] * THREADS)
+        self.assertEqual(results[0][-1], 956722026041)
+        self.assertTrue(all(r == results[0] for r in results))
+
+    def test_cpu_bound(self):
+        '''
+        CPU bound Funcs give the right answers from many threads: on a
+        free threaded build of Python they really do run in parallel.
+        '''
+        self._eval('(defn fib (n) '
+                   '(if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))')
+        self._eval('(defn collatz (n steps) (if (== n 1) steps '
+                   '(collatz (if (% n 2) (+ (* 3 n) 1) (int (/ n 2))) '
+                   '(+ steps 1))))')
+        fib, collatz = self._eval('fib'), self._eval('collatz')
+
+        def work(n):
+            return fib(15), [collatz(m, 0) for m in range(n, n + 50)]
+        jobs = [1000 * n + 1 for n in range(THREADS * 2)]
+        expected = [(610, [_collatz(m) for m in range(n, n + 50)])
+                    for n in jobs]
+        self.assertEqual(self._run(work, jobs), expected)
+
+
+def _collatz(n):
+    steps = 0
+    while n != 1:
+        n = 3 * n + 1 if n % 2 else n // 2
+        steps += 1
+    return steps
@@ -1,7 +1,11 @@
+import os
+import sys
+import math
 from unittest import TestCase
 
 from ripl.bases import Scope, Symbol, get_global_scope
-from ripl.utils import _ripl_add, curry, pyimport
+from ripl.utils import _ripl_add, curry, pyimport, ModuleProxy
+from ripl.evaluators import Evaluator
 
 
 class RiplAddTest(TestCase):
@@ -38,19 +42,20 @@ class PyimportTest(TestCase):
     def test_import_bare_scope(self):
         '''Importing to an empty Scope works'''
         updated_scope = pyimport('math', Scope())
-        self.assertTrue(Symbol('math.sin') in updated_scope)
+        self.assertTrue(Symbol('math') in updated_scope)
+        self.assertIs(updated_scope[Symbol('math')].sin, math.sin)
 
     def test_import_std_scope(self):
         '''Importing to the standard Scope works and doesn't clobber'''
         updated_scope = pyimport('math', get_global_scope())
-        self.assertTrue(Symbol('math.sin') in updated_scope)
+        self.assertTrue(Symbol('math') in updated_scope)
         self.assertTrue(Symbol('car') in updated_scope)
 
     def test_import_as(self):
         '''Importing foo as f works'''
         updated_scope = pyimport('math', Scope(), _as='foo')
-        self.assertTrue(Symbol('foo.sin') in updated_scope)
-        self.assertFalse(Symbol('math.sin') in updated_scope)
+        self.assertTrue(Symbol('foo') in updated_scope)
+        self.assertFalse(Symbol('math') in updated_scope)
 
     def test_import_from(self):
         '''From foo import bar works'''
@@ -58,6 +63,51 @@ class PyimportTest(TestCase):
         self.assertTrue(Symbol('sin') in updated_scope)
         self.assertFalse(Symbol('math.sin') in updated_scope)
 
+    def test_lazy(self):
+        '''Modules aren't imported until they are used'''
+        sys.modules.pop('colorsys', None)
+        proxy = pyimport('colorsys', Scope())[Symbol('colorsys')]
+        self.assertIsInstance(proxy, ModuleProxy)
+        self.assertNotIn('colorsys', sys.modules)
+        self.assertEqual(proxy.rgb_to_hsv(1, 0, 0), (0, 1, 1))
+        self.assertIn('colorsys', sys.modules)
+
+    def test_dotted_symbols(self):
+        '''Dotted symbols are looked up through the module'''
+        evaluator = Evaluator()
+        overlay = evaluator.global_scope.maps[0]
+
+        def run(string):
+            exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+            return evaluator.eval(exp, evaluator.global_scope)
+        run('(pyimport "math" "m")')
+        self.assertEqual(run('(m.sqrt 4)'), 2.0)
+        self.assertIs(overlay[Symbol('m.sqrt')], math.sqrt)
+        # Only what we used is in scope
+        self.assertNotIn(Symbol('m.sin'), dict(overlay))
+        run('(pyimport "cmath" "m")')
+        self.assertEqual(run('(m.sqrt -4)'), 2j)
+        with self.assertRaises(NameError):
+            run('m.not_there')
+
+    def test_dotted_modules(self):
+        '''Dotted module names are resolved through their longest prefix'''
+        evaluator = Evaluator()
+
+        def run(string):
+            exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+            return evaluator.eval(exp, evaluator.global_scope)
+        run('(pyimport "os.path")')
+        self.assertEqual(run('os.path.sep'), os.path.sep)
+        self.assertEqual(run('(os.path.join "a" "b")'),
+                         os.path.join('a', 'b'))
+        # Compiled Funcs resolve them the same way
+        run('(defn join-all (a b) (os.path.join a b))')
+        func = run('join-all')
+        for _ in range(evaluator.hot_threshold + 1):
+            self.assertEqual(func('a', 'b'), os.path.join('a', 'b'))
+        self.assertIsNotNone(func.compiled)
+
     def test_import_bad_module(self):
         '''Trying to import a non-existant module fails correctly'''
         with self.assertRaises(ImportError):
@@ -0,0 +1,100 @@
+import random
+from unittest import TestCase
+
+from ripl.windows import tumbling_window, sliding_window, session_window, \
+    Sum, Count, Mean, Min, Max
+from ripl.evaluators import Evaluator
+
+
+def ts(event):
+    return event[0]
+
+
+def val(event):
+    return event[1]
+
+
+def user(event):
+    return event[2]
+
+
+class WindowTest(TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        t = 0
+        self.events = []
+        for n in range(500):
+            t += rng.choice([0, 1, 1, 2, 5, 30])
+            self.events.append((t, rng.randrange(-50, 50), rng.choice('ab')))
+
+    def test_tumbling(self):
+        '''Fixed windows, skipping empty ones'''
+        events = [(0, 1), (3, 2), (9, 3), (10, 4), (25, 5)]
+        self.assertEqual(list(tumbling_window(10, ts, Sum(val), events)),
+                         [(0, 10, 6), (10, 20, 4), (20, 30, 5)])
+        self.assertEqual(list(tumbling_window(10, ts, 'count', events)),
+                         [(0, 10, 3), (10, 20, 1), (20, 30, 1)])
+
+    def test_tumbling_keyed(self):
+        '''Each key gets its own windows'''
+        events = [(0, 1, 'a'), (1, 2, 'b'), (2, 3, 'a'), (11, 4, 'b')]
+        self.assertEqual(
+            list(tumbling_window(10, ts, Max(val), events, user)),
+            [('a', 0, 10, 3), ('b', 0, 10, 2), ('b', 10, 20, 4)])
+
+    def test_sliding_matches_rescan(self):
+        '''Incremental aggregates agree with re-scanning each window'''
+        size = 20
+        for reducer, check in [(Sum(val), sum), (Count(), len),
+                               (Min(val), min), (Max(val), max),
+                               (Mean(val), lambda v: sum(v) / len(v)),
+                               (lambda a, b: a if a > b else b, None)]:
+            results = list(sliding_window(size, ts, reducer, self.events))
+            self.assertEqual(len(results), len(self.events))
+            for n, (start, end, result) in enumerate(results):
+                t = self.events[n][0]
+                window = [e for e in self.events[:n + 1] if t - size < e[0]]
+                if check is None:
+                    # Fold over whole events: the latest, biggest tuple
+                    self.assertEqual(result, max(window))
+                elif check is len:
+                    self.assertEqual(result, len(window))
+                else:
+                    self.assertAlmostEqual(
+                        result, check([val(e) for e in window]))
+
+    def test_sliding_keyed(self):
+        '''Sliding windows per key'''
+        results = list(sliding_window(20, ts, Sum(val), self.events, user))
+        for n, (k, _, t, result) in enumerate(results):
+            self.assertEqual(k, user(self.events[n]))
+            window = [e for e in self.events[:n + 1]
+                      if user(e) == k and t - 20 < e[0]]
+            self.assertEqual(result, sum(map(val, window)))
+
+    def test_session(self):
+        '''Sessions end after a gap with no events, in the order they end'''
+        events = [(0, 1, 'a'), (3, 1, 'b'), (5, 1, 'a'), (20, 1, 'a'),
+                  (21, 1, 'b')]
+        self.assertEqual(
+            list(session_window(10, ts, 'count', events, user)),
+            [('b', 3, 3, 1), ('a', 0, 5, 2), ('a', 20, 20, 1),
+             ('b', 21, 21, 1)])
+        self.assertEqual(list(session_window(10, ts, ':count', events)),
+                         [(0, 5, 3), (20, 21, 2)])
+
+    def test_out_of_order(self):
+        '''Timestamps must not go backwards'''
+        with self.assertRaises(ValueError):
+            list(tumbling_window(10, ts, Sum(val), [(5, 1), (4, 1)]))
+        with self.assertRaises(ValueError):
+            list(tumbling_window(10, ts, 'median', []))
+
+    def test_prelude(self):
+        '''Windows and keyword reducers from ripl'''
+        evaluator = Evaluator()
+        string = ("(drain (tumbling-window 10 (lambda (e) e) :count "
+                  "'(1 2 11 12 13)))")
+        exp = next(evaluator.reader.parse(evaluator.reader.lex(string)))
+        result = evaluator.eval(exp, evaluator.global_scope)
+        self.assertEqual(result, [(0, 10, 2), (10, 20, 3)])